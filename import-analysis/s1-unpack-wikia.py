@@ -29,14 +29,17 @@
 #   ...
 # The output files contain only the INSERT statements.  All the files
 # are read from and written to the current working directory.
-# The script requires exactly one argument: the infix appearing in the
+# The script requires one argument: the infix appearing in the
 # input files.  For the example above, the argument should be: somename
+# An optional second argument selects the compressor: gzip (default)
+# or pigz.
 
-import gzip, os, re
+import os, re, wikitools.compression
 
 class WikiaUnpacker:
-	def __init__(self, wiki = None):
+	def __init__(self, wiki = None, compressor = 'gzip'):
 		self.wiki = wiki
+		self.compressor = wikitools.compression.getBackend(compressor)
 
 	def getLangs(self):
 		langs = []
@@ -57,7 +60,7 @@ class WikiaUnpacker:
 				if match:
 					if dst: dst.close()
 					table = match.group('table')
-					dst = gzip.open(lang.replace('-', '_') + 'wiki-00000000-' + table + '.sql.gz', 'w')
+					dst = self.compressor.create(lang.replace('-', '_') + 'wiki-00000000-' + table + '.sql.gz')
 				if line.startswith('INSERT INTO'):
 					dst.write(line)
 			if dst: dst.close()
@@ -67,9 +70,10 @@ class WikiaUnpacker:
 if __name__ == "__main__":
 	import sys
 	if len(sys.argv) < 2:
-		print 'Usage: ' + sys.argv[0] + ' <wiki-name>'
+		print 'Usage: ' + sys.argv[0] + ' <wiki-name> [gzip|pigz]'
 		sys.exit(1)
 	wiki = sys.argv[1]
-	unpacker = WikiaUnpacker(wiki)
+	compressor = sys.argv[2] if len(sys.argv) > 2 else 'gzip'
+	unpacker = WikiaUnpacker(wiki, compressor)
 	unpacker.unpack()
 
@@ -39,6 +39,12 @@ class Analysis:
 		parser.add_option('-c', '--components', dest='components', default=[], metavar='COMPS', help='set the components to process')
 		parser.add_option('-s', '--switches', dest='switches', default=[], help='set additional switches')
 		parser.add_option('-r', '--run', dest='commands', default=[], help='run the specified commands')
+		parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1, metavar='N', help='set the number of worker processes')
+		parser.add_option('-x', '--index-dir', dest='indexDir', default=None, metavar='DIR', help='set the directory of the page title indexes')
+		parser.add_option('-m', '--memory', dest='memory', type='int', default=256, metavar='MB', help='set the sort buffer size of the external component finder')
+		parser.add_option('-b', '--backend', dest='backend', type='choice', choices=['postgresql', 'sqlite'], default='postgresql', help='set the repository backend (postgresql or sqlite)')
+		parser.add_option('-f', '--file', dest='file', default=None, help='set the SQLite database file')
+		parser.add_option('-g', '--graph-dir', dest='graphDir', default=None, metavar='DIR', help='set the directory of the graph store read by the analysis')
 
 		(self.opts, _) = parser.parse_args()
 
@@ -57,18 +63,50 @@ class Analysis:
 		else:
 			self.opts.commands = self.opts.commands.split(',')
 
-		if not self.opts.database or not self.opts.user or not self.opts.commands:
+		needsServer = self.opts.backend == 'postgresql' or 'export-sqlite' in self.opts.commands
+		if (needsServer and (not self.opts.database or not self.opts.user)) or (not needsServer and not self.opts.file) or not self.opts.commands:
 			parser.print_help()
 			sys.exit(0)
 
+	def getRepositoryClass(self):
+		import wikitools.repo.embedded, wikitools.repo.repository
+		if self.opts.backend == 'sqlite':
+			return wikitools.repo.embedded.SqliteRepository
+		if 'int-keys' in self.opts.switches:
+			return wikitools.repo.repository.IntKeyPostgresqlRepository
+		return wikitools.repo.repository.PostgresqlRepository
+
+	def getRepositoryArgs(self):
+		if self.opts.backend == 'sqlite':
+			return {'path': self.opts.file, 'indexDir': self.opts.indexDir}
+		return {'host': self.opts.host, 'port': self.opts.port, 'database': self.opts.database, 'user': self.opts.user, 'password': self.opts.password,
+			'indexDir': self.opts.indexDir}
+
+	def createRepository(self, **args):
+		return self.getRepositoryClass()(**dict(self.getRepositoryArgs(), **args))
+
+	def createAnalysisRepository(self):
+		import wikitools.repo.graphstore
+		if self.opts.graphDir:
+			return wikitools.repo.graphstore.GraphStoreRepository(self.opts.graphDir, self.createRepository())
+		return self.createRepository()
+
 	def executeCommands(self):
 		self.log.info('Task(s): ' + ' '.join(self.opts.commands))
 		self.doBatch, self.batch = 'batch' in self.opts.switches, []
 		for command in self.opts.commands:
 			if command == 'import':
 				self.execImport()
+				if 'fast-load' in self.opts.switches and not 'build-indexes' in self.opts.commands:
+					self.execBuildIndexes()
+			if command == 'build-indexes':
+				self.execBuildIndexes()
 			if command == 'find-comps':
 				self.execFindComps()
+			if command == 'export-sqlite':
+				self.execExportSqlite()
+			if command == 'build-graph-store':
+				self.execBuildGraphStore()
 			if command == 'positions':
 				self.execPositions()
 			if command == 'cliques':
@@ -96,46 +134,117 @@ class Analysis:
 		self.log.info('Done.')
 
 	def execBatch(self):
-		import wikitools.analysis.batch, wikitools.repo.repository
-		dataRepository = wikitools.repo.repository.PostgresqlRepository(host = self.opts.host, port = self.opts.port, database = self.opts.database, user = self.opts.user, password = self.opts.password)
+		import wikitools.analysis.batch
+		dataRepository = self.createAnalysisRepository()
 		engine = wikitools.analysis.batch.BatchCalculator(dataRepository, self.opts, self.batch)
 		if not self.opts.components:
 			engine.processAll()
 		else:
-			for compKey in self.opts.components:
-				engine.processComponent(compKey)
+			engine.processComponents(self.opts.components)
 		pass
 
 	def execFindComps(self):
-		import wikitools.compfinder2, wikitools.repo.repository
-		dataRepository = wikitools.repo.repository.PostgresqlRepository(host = self.opts.host, port = self.opts.port, database = self.opts.database, user = self.opts.user, password = self.opts.password, cache = False)
-		compFinder = wikitools.compfinder2.ComponentFinder(dataRepository)
+		import wikitools.compfinder2, wikitools.compfinder3, wikitools.extcompfinder
+		dataRepository = self.createRepository(cache = False)
+		if 'external' in self.opts.switches:
+			compFinder = wikitools.extcompfinder.ComponentFinder(dataRepository, memory = self.opts.memory)
+		elif 'union-find' in self.opts.switches:
+			compFinder = wikitools.compfinder3.ComponentFinder(dataRepository)
+		else:
+			compFinder = wikitools.compfinder2.ComponentFinder(dataRepository)
 		compFinder.doFindComponents()
 
+	def execExportSqlite(self):
+		import wikitools.repo.embedded
+		if self.opts.backend == 'sqlite':
+			self.log.error('The export reads from PostgreSQL, run it with the postgresql backend')
+			return
+		sourceRepository = self.createRepository()
+		targetRepository = wikitools.repo.embedded.SqliteRepository(self.opts.file or self.opts.database + '.sqlite')
+		sourceRepository.connect()
+		targetRepository.connect()
+		targetRepository.importFrom(sourceRepository)
+		targetRepository.disconnect()
+		sourceRepository.disconnect()
+
+	def execBuildGraphStore(self):
+		import wikitools.repo.graphstore
+		if not self.opts.graphDir:
+			self.log.error('The graph store needs a directory, set it with -g')
+			return
+		dataRepository = self.createRepository()
+		dataRepository.connect()
+		writer = wikitools.repo.graphstore.GraphStoreWriter(self.opts.graphDir)
+		writer.writeRepository(dataRepository)
+		dataRepository.disconnect()
+
+	def execBuildIndexes(self):
+		dataRepository = self.createRepository()
+		dataRepository.connect()
+		dataRepository.buildIndexes()
+		dataRepository.disconnect()
+
 	def execImport(self):
-		import wikitools.importer, wikitools.repo.bigmemory, wikitools.repo.repository
+		import wikitools.importer, wikitools.repo.bigmemory
 		doBigMemory = 'big-memory' in self.opts.switches
 		doMemoryProfile = 'mem-profile' in self.opts.switches
-		dataSource = wikitools.importer.DumpsDataSource(self.opts.inputDir)
+		doBulkLoad = 'bulk-load' in self.opts.switches
+		doResume = 'resume' in self.opts.switches
+		parser = 'classic' if 'classic-parser' in self.opts.switches else 'regex'
+		doSplitDumps = 'split-dumps' in self.opts.switches
+		decompressor = 'pigz' if 'pigz' in self.opts.switches else 'zcat' if 'zcat' in self.opts.switches else 'gzip'
+		if self.opts.backend == 'sqlite' and (doBigMemory or 'fast-load' in self.opts.switches or 'elt' in self.opts.switches):
+			self.log.error('The big-memory, fast-load and elt imports need the postgresql backend')
+			return
+		doParallel = self.opts.jobs > 1 and not doSplitDumps
+		if doBigMemory and 'elt' in self.opts.switches:
+			self.log.error('The big-memory repository cannot be used with the elt import')
+			return
+		if doParallel and 'elt' in self.opts.switches:
+			self.log.error('The elt import cannot be used with multiple jobs')
+			return
+		if doBigMemory and doParallel:
+			self.log.error('The big-memory repository cannot be used with multiple jobs')
+			return
+		if doBigMemory and doResume:
+			self.log.error('The big-memory repository cannot resume an import')
+			return
+		if doBigMemory and 'int-keys' in self.opts.switches:
+			self.log.error('The big-memory repository writes \'lang:id\' keys and cannot be used with int-keys')
+			return
+		dataSource = wikitools.importer.DumpsDataSource(self.opts.inputDir, parser, self.opts.jobs if doSplitDumps else 1, decompressor)
+		if 'fast-load' in self.opts.switches:
+			schemaRepository = self.createRepository()
+			schemaRepository.connect()
+			schemaRepository.deferIndexes('unlogged' in self.opts.switches)
+			schemaRepository.disconnect()
+		if 'elt' in self.opts.switches:
+			dataRepository = self.createRepository(bulk = True)
+			importer = wikitools.importer.StagingImporter(dataSource, dataRepository, resume = doResume)
+			importer.doImport()
+			return
+		if doParallel:
+			repositoryArgs = dict(self.getRepositoryArgs(), bulk = doBulkLoad)
+			scheduler = wikitools.importer.ImportScheduler(dataSource, self.getRepositoryClass(), repositoryArgs, self.opts.jobs, doResume)
+			scheduler.doImport()
+			return
 		if doBigMemory:
 			dataRepository = wikitools.repo.bigmemory.BigMemoryPostgresqlRepository(host = self.opts.host, port = self.opts.port, database = self.opts.database, user = self.opts.user, password = self.opts.password)
 		else:
-			dataRepository = wikitools.repo.repository.PostgresqlRepository(host = self.opts.host, port = self.opts.port, database = self.opts.database, user = self.opts.user, password = self.opts.password, cache = True)
-		importer = wikitools.importer.Importer(dataSource, dataRepository, doMemoryProfile)
+			dataRepository = self.createRepository(cache = True, bulk = doBulkLoad)
+		importer = wikitools.importer.Importer(dataSource, dataRepository, doMemoryProfile, doResume)
 		importer.doImport()
 
 	def execCommon(self, engineClass):
 		if self.doBatch:
 			self.batch += [engineClass]
 			return
-		import wikitools.repo.repository
-		dataRepository = wikitools.repo.repository.PostgresqlRepository(host = self.opts.host, port = self.opts.port, database = self.opts.database, user = self.opts.user, password = self.opts.password)
+		dataRepository = self.createAnalysisRepository()
 		engine = engineClass(dataRepository, self.opts)
 		if not self.opts.components:
 			engine.processAll()
 		else:
-			for compKey in self.opts.components:
-				engine.processComponent(compKey)
+			engine.processComponents(self.opts.components)
 
 	def execPositions(self):
 		import wikitools.analysis.positions
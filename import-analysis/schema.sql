@@ -7,6 +7,7 @@ DROP TABLE IF EXISTS "network_categorylink" CASCADE;
 DROP TABLE IF EXISTS "network_path" CASCADE;
 DROP TABLE IF EXISTS "network_pageposition" CASCADE;
 DROP TABLE IF EXISTS "network_pagemeaning" CASCADE;
+DROP TABLE IF EXISTS "network_import_progress" CASCADE;
 
 CREATE TABLE "network_comp" (
     "key" varchar(36) NOT NULL PRIMARY KEY,
@@ -70,6 +71,16 @@ CREATE TABLE "network_pagemeaning" (
     "comp_id" varchar(36) NOT NULL REFERENCES "network_comp" ("key") DEFERRABLE INITIALLY DEFERRED
 )
 ;
+CREATE TABLE "network_import_progress" (
+    "tbl" varchar(32) NOT NULL,
+    "lang" varchar(16) NOT NULL,
+    "status" varchar(16) NOT NULL,
+    "statements" integer NOT NULL,
+    "started" timestamp NULL,
+    "finished" timestamp NULL,
+    PRIMARY KEY ("tbl", "lang")
+)
+;
 CREATE INDEX "network_page_redirect_id" ON "network_page" ("redirect_id");
 CREATE INDEX "network_page_comp_id" ON "network_page" ("comp_id");
 CREATE INDEX "network_langlink_src_id" ON "network_langlink" ("src_id");
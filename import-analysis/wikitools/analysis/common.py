@@ -14,7 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import logging, math, random, uuid
+import logging, math, random, time, uuid
 
 class Component:
     def __init__(self, key, pages, links):
@@ -126,6 +126,11 @@ class AbstractComponentProcessor:
     SMALL = 300
     MEDIUM = 1000
     BIG = 10000
+
+    # Attempts to process a component again on a new connection, and
+    # the delay before the first one, doubled before every next one.
+    RECONNECTS = 3
+    RECONNECT_DELAY = 1.0
     
     def processAll(self):
         self.dataRepository.connect()
@@ -139,9 +144,46 @@ class AbstractComponentProcessor:
             incoherent = self.dataRepository.getIncoherent(self.BIG + 1)
         else:
             incoherent = self.dataRepository.getIncoherent()
+        self.processComponents(incoherent, True)
+
+    def processComponents(self, compKeys, connected = False):
+        """Processes the given components on one connection, committing
+        the results of every component.  A component is processed again
+        on a new connection if the old one is lost.  The time spent on
+        connecting and on the per-component queries is reported at the
+        end.
+        """
+        startTime = time.time()
+        self.reconnects = 0
+        if not connected:
+            self.dataRepository.connect()
+        for compKey in compKeys:
+            self.processConnected(compKey)
         self.dataRepository.disconnect()
-        for compKey in incoherent:
-            self.processComponent(compKey, True)
+        self.reportTimes(len(compKeys), time.time() - startTime)
+
+    def processConnected(self, compKey):
+        for attempt in xrange(self.RECONNECTS + 1):
+            try:
+                if attempt > 0:
+                    self.dataRepository.reconnect()
+                self.processComponent(compKey, False)
+                self.dataRepository.commit()
+                return
+            except Exception, e:
+                if attempt == self.RECONNECTS or not self.dataRepository.isConnectionError(e):
+                    raise
+                self.reconnects += 1
+                self.log.warning('Lost the connection while processing %s (%s), reconnecting' % (compKey, str(e).strip()))
+                time.sleep(self.RECONNECT_DELAY * 2 ** attempt)
+
+    def reportTimes(self, count, seconds):
+        stats = self.dataRepository.timeStats
+        if stats is None:
+            self.log.info('Processed %d components in %.1f s' % (count, seconds))
+            return
+        self.log.info('Processed %d components in %.1f s: %d connects took %.1f s, %d component queries %.1f s, %d reconnects'
+            % (count, seconds, stats['connect'][0], stats['connect'][1], stats['query'][0], stats['query'][1], self.reconnects))
 
     def processComponent(self, compKey, separate = True):
         if separate:
@@ -175,5 +217,5 @@ class AbstractComponentProcessor:
         self.dataRepository.deletePageMeanings(self.AUTH, comp.key)
         for idx in revClusters:
             meaningPages = revClusters[idx]
-            meaningKey = uuid.uuid5(uuid.NAMESPACE_URL, ' '.join(sorted(meaningPages)))
+            meaningKey = uuid.uuid5(uuid.NAMESPACE_URL, ' '.join(map(str, sorted(meaningPages))))
             self.dataRepository.insertPageMeanings(self.AUTH, str(meaningKey), comp.key, meaningPages)
@@ -30,6 +30,7 @@ class ComponentSerializer(wikitools.analysis.common.AbstractComponentProcessor):
         pages = comp.pages
         links = comp.links
         meanings = self.dataRepository.getComponentPageMeanings(compKey, self.AUTH)
+        formatKey = self.dataRepository.formatKey
 
         if not pages:
             return
@@ -94,18 +95,18 @@ class ComponentSerializer(wikitools.analysis.common.AbstractComponentProcessor):
                 ePage = doc.createElement('page')
                 eCluster.appendChild(ePage)
                 page = pages[pageKey]
-                ePage.setAttribute('id', page['key'])
+                ePage.setAttribute('id', formatKey(page['key']))
                 ePage.setAttribute('lang', page['lang'])
                 ePage.setAttribute('title', page['title'].decode('utf-8'))
                 if page['redirect'] != None:
-                    ePage.setAttribute('redirect', page['redirect'])
+                    ePage.setAttribute('redirect', formatKey(page['redirect']))
 
             if meaning in intraLinks:
                 for (fromKey, toKey) in intraLinks[meaning]:
                     eLink = doc.createElement('link')
                     eCluster.appendChild(eLink)
-                    eLink.setAttribute('from', fromKey)
-                    eLink.setAttribute('to', toKey)
+                    eLink.setAttribute('from', formatKey(fromKey))
+                    eLink.setAttribute('to', formatKey(toKey))
                     common = 0
                     if gotCommon and not pages[toKey]['redirect']:
                         if fromKey > toKey:
@@ -120,8 +121,8 @@ class ComponentSerializer(wikitools.analysis.common.AbstractComponentProcessor):
         for (fromKey, toKey) in cuts:
                     eLink = doc.createElement('link')
                     eIncoherent.appendChild(eLink)
-                    eLink.setAttribute('from', fromKey)
-                    eLink.setAttribute('to', toKey)
+                    eLink.setAttribute('from', formatKey(fromKey))
+                    eLink.setAttribute('to', formatKey(toKey))
                     common = 0
                     if gotCommon and not pages[toKey]['redirect']:
                         if fromKey > toKey:
@@ -0,0 +1,306 @@
+# Interwiki analysis tools
+# Copyright (C) 2007-2011  Lukasz Bolikowski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmarks for the performance-critical parts of the tools.  Run it
+# from the directory containing the 'wikitools' package, e.g.:
+#   python -m wikitools.benchmark -i dumps/ -r parse
+#   python -m wikitools.benchmark -r structures -n 100000,1000000 -f json
+
+import json, optparse, sys, time
+
+class Benchmark:
+	TABLES = ('page', 'redirect', 'langlinks', 'categorylinks', 'pagelinks')
+	FINDERLIMITS = {'bfs': 200000, 'linked-list': 20000}
+
+	def run(self):
+		self.parseCommands()
+		self.executeCommands()
+
+	def parseCommands(self):
+		parser = optparse.OptionParser()
+		parser.add_option('-i', '--input-dir', dest='inputDir', default='.', metavar='DIR', help='set the input directory')
+		parser.add_option('-l', '--langs', dest='langs', default=[], help='set the languages to use')
+		parser.add_option('-r', '--run', dest='commands', default=[], help='run the specified benchmarks')
+		parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1, metavar='N', help='set the number of worker processes')
+		parser.add_option('-n', '--count', dest='counts', default='1000000', metavar='N,...', help='set the numbers of elements for the data structure benchmarks')
+		parser.add_option('-f', '--format', dest='format', default='text', choices=('text', 'json'), help='print the results as text or as JSON lines')
+
+		(self.opts, _) = parser.parse_args()
+
+		if not self.opts.langs:
+			self.opts.langs = []
+		else:
+			self.opts.langs = self.opts.langs.split(',')
+
+		if not self.opts.commands:
+			parser.print_help()
+			sys.exit(0)
+		self.opts.commands = self.opts.commands.split(',')
+		self.opts.counts = [int(count) for count in self.opts.counts.split(',')]
+
+	def executeCommands(self):
+		for command in self.opts.commands:
+			if command == 'parse':
+				self.benchParse()
+			if command == 'decompress':
+				self.benchDecompress()
+			if command == 'maps':
+				for count in self.opts.counts:
+					self.benchMaps(count)
+			if command == 'structures':
+				for count in self.opts.counts:
+					self.benchStructures(count)
+			if command == 'finders':
+				for count in self.opts.counts:
+					self.benchFinders(count)
+
+	def report(self, name, count, unit, seconds, **fields):
+		rate = count / seconds if seconds > 0 else 0.0
+		if self.opts.format == 'json':
+			fields.update(name=name, count=count, unit=unit, seconds=seconds, rate=rate)
+			print json.dumps(fields, sort_keys=True)
+		else:
+			print '%-40s %12d %-5s %10.2f s %14.1f %s/s' % (name, count, unit, seconds, rate, unit)
+
+	def reportSize(self, name, count, unit, size, **fields):
+		perUnit = float(size) / count if count > 0 else 0.0
+		if self.opts.format == 'json':
+			fields.update(name=name, count=count, unit=unit, bytes=size, bytesPer=perUnit)
+			print json.dumps(fields, sort_keys=True)
+		else:
+			print '%-40s %12d %-5s %10.1f B/%s' % (name, count, unit, perUnit, unit)
+
+	def reportSkipped(self, name, reason, **fields):
+		if self.opts.format == 'json':
+			fields.update(name=name, skipped=reason)
+			print json.dumps(fields, sort_keys=True)
+		else:
+			print '%-40s %s' % (name, reason)
+
+	def benchParse(self):
+		"""Measures the parsing speed of all the dump parsers, per table
+		type.  Only the parsing is timed: the lines are decompressed
+		beforehand.
+		"""
+		import wikitools.importer
+		for table in self.TABLES:
+			for parser in wikitools.importer.DumpsDataSource.PARSERS:
+				self.benchParseTable(table, parser, None)
+				filter = wikitools.importer.Importer.FILTERS.get(table)
+				if filter:
+					self.benchParseTable(table, parser, filter)
+			if self.opts.jobs > 1:
+				self.benchSplitTable(table, wikitools.importer.Importer.FILTERS.get(table))
+
+	def benchSplitTable(self, table, filter):
+		"""Measures the speed of reading whole dumps with statements
+		tokenized by worker processes.  Decompression is included.
+		"""
+		import wikitools.importer
+		dataSource = wikitools.importer.DumpsDataSource(self.opts.inputDir, 'regex', self.opts.jobs)
+		counter = [0]
+		def count(records):
+			counter[0] += len(records)
+		startTime = time.time()
+		for lang in self.opts.langs or dataSource.getLangs():
+			try:
+				dataSource.openTable(lang, table).close()
+			except Exception:
+				continue
+			dataSource.importTable(lang, table, count, filter)
+		self.report('read %s (%d jobs)' % (table, self.opts.jobs), counter[0], 'rows', time.time() - startTime)
+
+	def benchParseTable(self, table, parser, filter):
+		import wikitools.importer
+		dataSource = wikitools.importer.DumpsDataSource(self.opts.inputDir, parser)
+		counter = [0]
+		def count(records):
+			for _ in records:
+				counter[0] += 1
+		seconds = 0.0
+		for lang in self.opts.langs or dataSource.getLangs():
+			try:
+				source = dataSource.openTable(lang, table)
+			except Exception:
+				continue
+			for line in source:
+				if not line.startswith('INSERT INTO'):
+					continue
+				startTime = time.time()
+				if parser == 'classic':
+					dataSource.importLine(line, lambda r : count([x for x in r if not filter or x[filter[0]] in filter[1]]))
+				else:
+					count(dataSource.iterLine(line, filter))
+				seconds += time.time() - startTime
+			source.close()
+		self.report('parse %s (%s%s)' % (table, parser, ', filtered' if filter else ''), counter[0], 'rows', seconds)
+
+	def benchDecompress(self):
+		"""Measures the speed of reading the dumps through each of the
+		decompression backends, in megabytes of output per second.
+		"""
+		import os, wikitools.compression
+		paths = []
+		for filename in sorted(os.listdir(self.opts.inputDir)):
+			if filename.endswith('.sql.gz') and (not self.opts.langs or filename.split('wiki-')[0].replace('_', '-') in self.opts.langs):
+				paths.append(self.opts.inputDir + os.sep + filename)
+		for name in sorted(wikitools.compression.BACKENDS):
+			backend = wikitools.compression.getBackend(name)
+			total = 0
+			startTime = time.time()
+			try:
+				for path in paths:
+					source = backend.open(path)
+					while True:
+						chunk = source.read(1 << 20)
+						if not chunk:
+							break
+						total += len(chunk)
+					source.close()
+			except OSError:
+				self.reportSkipped('decompress (%s)' % name, 'not available')
+				continue
+			self.report('decompress (%s)' % name, total / 1048576.0, 'MB', time.time() - startTime)
+
+	def sizeOf(self, container):
+		"""Estimates the number of bytes used by a container.  The
+		memoptpy structures report their own storage; for the builtin
+		ones the int objects they reference are counted as well, except
+		for the small ones shared by the interpreter.
+		"""
+		if not isinstance(container, (set, dict)):
+			return container.__sizeof__()
+		size = sys.getsizeof(container)
+		elems = container
+		if isinstance(container, dict):
+			elems = [elem for item in container.iteritems() for elem in item]
+		for elem in elems:
+			if not -5 <= elem < 257:
+				size += sys.getsizeof(elem)
+		return size
+
+	def benchStructures(self, n):
+		"""Measures the insert, build, lookup and iteration speed and the
+		memory per entry of the memoptpy sets against the builtin set,
+		then the maps, see benchMaps.  The keys are ids in order and
+		shuffled, and sparse ids drawn from the whole 31-bit range.
+		"""
+		import random, wikitools.memoptpy
+		random.seed(0)
+		ids = range(n)
+		shuffled = list(ids)
+		random.shuffle(shuffled)
+		sparse = random.sample(xrange(1 << 31), n)
+		sets = (('set', set), ('IntSet', wikitools.memoptpy.IntSet), ('IntBitmap', wikitools.memoptpy.IntBitmap))
+		for keysName, keys in (('sequential', ids), ('shuffled', shuffled), ('sparse', sparse)):
+			for name, setClass in sets:
+				fields = {'structure': name, 'distribution': keysName}
+				s = setClass()
+				startTime = time.time()
+				for key in keys:
+					s.add(key)
+				self.report('insert %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='insert', **fields)
+				startTime = time.time()
+				s = setClass(keys)
+				self.report('build %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='build', **fields)
+				startTime = time.time()
+				for key in keys:
+					key in s
+				self.report('lookup %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='lookup', **fields)
+				startTime = time.time()
+				for key in s:
+					pass
+				self.report('iterate %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='iterate', **fields)
+				self.reportSize('memory %s (%s)' % (keysName, name), n, 'key', self.sizeOf(s), operation='memory', **fields)
+				del s
+		self.benchMaps(n)
+
+	def benchMaps(self, n):
+		"""Compares the integer maps of memoptpy with a plain dict, on
+		the workloads of the importer's caches: page ids in order and
+		shuffled mapped to namespaces, and 64-bit title hashes mapped to
+		page ids.  The keys are inserted and looked up one by one, then
+		in bulk, and the memory per entry is estimated.
+		"""
+		import random, wikitools.memoptpy
+		random.seed(0)
+		ids = range(n)
+		shuffled = list(ids)
+		random.shuffle(shuffled)
+		titles = [hash('Title %d' % random.getrandbits(48)) for _ in xrange(n)]
+		maps = (('dict', dict), ('HashIntDict', wikitools.memoptpy.HashIntDict), ('OpenHashIntDict', wikitools.memoptpy.OpenHashIntDict))
+		for keysName, keys in (('sequential', ids), ('shuffled', shuffled), ('titles', titles)):
+			pairs = zip(keys, shuffled)
+			for name, mapClass in maps:
+				fields = {'structure': name, 'distribution': keysName}
+				m = mapClass()
+				startTime = time.time()
+				for key, value in pairs:
+					m[key] = value
+				self.report('insert %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='insert', **fields)
+				startTime = time.time()
+				m = mapClass(pairs)
+				self.report('build %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='build', **fields)
+				startTime = time.time()
+				for key in keys:
+					m.get(key)
+				self.report('lookup %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='lookup', **fields)
+				if hasattr(m, 'getmany'):
+					startTime = time.time()
+					m.getmany(keys)
+					self.report('getmany %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='getmany', **fields)
+				startTime = time.time()
+				for key, value in m.iteritems():
+					pass
+				self.report('iterate %s (%s)' % (keysName, name), n, 'keys', time.time() - startTime, operation='iterate', **fields)
+				self.reportSize('memory %s (%s)' % (keysName, name), n, 'key', self.sizeOf(m), operation='memory', **fields)
+				del m
+
+	def benchFinders(self, n):
+		"""Measures the component finders on a synthetic graph of n pages
+		in eight languages and n random links between them, which
+		leaves most of the pages in one giant component.  The unions
+		and the grouping of the pages into components are timed
+		separately.  The breadth-first and linked-list finders are
+		quadratic on the giant component, so they are skipped for
+		graphs larger than their FINDERLIMITS.
+		"""
+		import random, wikitools.compfinder, wikitools.compfinder2, wikitools.compfinder3
+		random.seed(0)
+		langs = ('de', 'en', 'es', 'fr', 'it', 'ja', 'nl', 'pl')
+		finders = (('bfs', wikitools.compfinder), ('linked-list', wikitools.compfinder2), ('union-find', wikitools.compfinder3))
+		links = [(random.randrange(n), random.randrange(n)) for _ in xrange(n)]
+		for name, module in finders:
+			if n > self.FINDERLIMITS.get(name, n):
+				self.reportSkipped('union (%s)' % name, 'skipped', finder=name, operation='union')
+				continue
+			pageIndex = module.PageIndex()
+			for i in xrange(n):
+				pageIndex.addPage('%s:%d' % (langs[i % len(langs)], i))
+			pageIndex.postAdd()
+			startTime = time.time()
+			for a, b in links:
+				pageIndex.connect(a, b)
+			self.report('union (%s)' % name, n, 'links', time.time() - startTime, finder=name, operation='union')
+			startTime, count = time.time(), 0
+			for component in pageIndex.doFindComponents():
+				count += 1
+			self.report('components (%s)' % name, n, 'pages', time.time() - startTime, finder=name, operation='components', components=count)
+			del pageIndex
+
+if __name__ == '__main__':
+	benchmark = Benchmark()
+	benchmark.run()
@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import array, bisect, logging, uuid
+from .memoptpy import IntBitmap
 
 class PageIndex:
 	def __init__(self):
@@ -35,9 +36,9 @@ class PageIndex:
 			self.offsets[lang] = self.size
 			self.size += len(self.pageKeys[lang])
 			self.pageKeys[lang].sort()
-		self.redirects = self.size * [False]
+		self.redirects = IntBitmap()
 		self.links = self.size * [None]
-		self.visited = self.size * [False]
+		self.visited = IntBitmap()
 
 	def getIndex(self, key):
 		lang, id = key.split(':')
@@ -65,7 +66,7 @@ class PageIndex:
 	def addRedirect(self, keyFrom, keyTo):
 		fi = self.getIndex(keyFrom)
 		ti = self.getIndex(keyTo)
-		self.redirects[fi] = True
+		self.redirects.add(fi)
 		self.connect(fi, ti)
 
 	def addLangLink(self, keyFrom, keyTo):
@@ -75,26 +76,26 @@ class PageIndex:
 
 	def doFindComponents(self):
 		for si in xrange(self.size):
-			if self.visited[si]:
+			if si in self.visited:
 				continue
 			nodes = [si]
 			queue = [si]
-			self.visited[si] = True
+			self.visited.add(si)
 			while queue:
 				node, queue = queue[0], queue[1:]
 				if not self.links[node]:
 					continue
 				for n in self.links[node]:
-					if not self.visited[n]:
+					if not n in self.visited:
 						nodes.append(n)
 						queue.append(n)
-						self.visited[n] = True
+						self.visited.add(n)
 	
 			pageKeys, langsVisited, totalCount, coherent = [], set(), 0, True
 			for node in nodes:
 				lang, key = self.getLangAndKey(node)
 				pageKeys.append(key)
-				if self.redirects[node]:
+				if node in self.redirects:
 					continue
 				if lang in langsVisited:
 					coherent = False
@@ -14,45 +14,84 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import array, bisect, logging, uuid
+import array, bisect, itertools, logging, uuid
+from .memoptpy import IntBitmap
 
 class PageIndex:
-	def __init__(self):
+	"""Numbers the pages by language and id and keeps everything per
+	page in typed arrays: the ids of each language in an array('l'),
+	the components as linked lists in array('i') columns, and the
+	redirects in an IntBitmap.
+	"""
+
+	NONE = -1
+
+	def __init__(self, makeKey = None):
 		self.log = logging.getLogger('PageIndex')
 		self.pageKeys = {}
+		if makeKey is not None:
+			self.makeKey = makeKey
+
+	def makeKey(self, lang, id):
+		"""Returns the key of a page in the 'lang:id' form.  The finder
+		replaces it with the one of the repository.
+		"""
+		return lang + ':' + str(id)
 
 	def addPage(self, key):
 		lang, id = key.split(':')
 		if lang not in self.pageKeys:
-			self.pageKeys[lang] = []
+			self.pageKeys[lang] = array.array('l')
 		self.pageKeys[lang].append(int(id))
 
+	def addPageColumns(self, columns, langs):
+		"""Adds the pages exported by the repository as columns of
+		language numbers and page ids.  The ids of a language in a row
+		are appended with a single array extend.
+		"""
+		numbers, ids = columns
+		start = 0
+		for number, run in itertools.groupby(numbers):
+			end = start + sum(1 for _ in run)
+			lang = langs[number]
+			if lang not in self.pageKeys:
+				self.pageKeys[lang] = array.array('l')
+			self.pageKeys[lang].extend(ids[start:end])
+			start = end
+
 	def postAdd(self):
 		self.langs = sorted(self.pageKeys)
 		self.offsets = {}
+		self.starts = array.array('l')
 		self.size = 0
 		for lang in self.langs:
 			self.offsets[lang] = self.size
+			self.starts.append(self.size)
 			self.size += len(self.pageKeys[lang])
-			self.pageKeys[lang].sort()
-		self.redirects = self.size * [False]
-		self.head = range(self.size)
-		self.next = self.size * [None]
+			self.pageKeys[lang] = array.array('l', sorted(self.pageKeys[lang]))
+		self.redirects = IntBitmap()
+		self.initComponents()
+
+	def initComponents(self):
+		self.head = array.array('i', xrange(self.size))
+		self.next = array.array('i', [self.NONE]) * self.size
 
 	def getIndex(self, key):
 		lang, id = key.split(':')
+		return self.findIndex(lang, int(id))
+
+	def findIndex(self, lang, id):
 		ids = self.pageKeys[lang]
-		idx = bisect.bisect_left(ids, int(id))
-		if idx != len(ids) and ids[idx] == int(id):
+		idx = bisect.bisect_left(ids, id)
+		if idx != len(ids) and ids[idx] == id:
 			return self.offsets[lang] + idx
 		raise Exception
 
 	def getLangAndKey(self, index):
-		for lang in self.langs:
-			off, siz = self.offsets[lang], len(self.pageKeys[lang])
-			if off <= index and index < off + siz:
-				return lang, lang + ':' + str(self.pageKeys[lang][index - off])
-		raise Exception
+		if index < 0 or index >= self.size:
+			raise Exception
+		lang = self.langs[bisect.bisect_right(self.starts, index) - 1]
+		return lang, self.makeKey(lang, self.pageKeys[lang][index - self.offsets[lang]])
 
 	def connect(self, a, b):
 		if self.head[a] == self.head[b]:
@@ -61,18 +100,18 @@ class PageIndex:
 			a, b = b, a
 		headA, headB = self.head[a], self.head[b]
 		lastA = a
-		while self.next[lastA] is not None:
+		while self.next[lastA] <> self.NONE:
 			lastA = self.next[lastA]
 		self.next[lastA] = headB
 		tmpB = headB
-		while tmpB is not None:
+		while tmpB <> self.NONE:
 			self.head[tmpB] = headA
 			tmpB = self.next[tmpB]
 
 	def addRedirect(self, keyFrom, keyTo):
 		fi = self.getIndex(keyFrom)
 		ti = self.getIndex(keyTo)
-		self.redirects[fi] = True
+		self.redirects.add(fi)
 		self.connect(fi, ti)
 
 	def addLangLink(self, keyFrom, keyTo):
@@ -80,63 +119,84 @@ class PageIndex:
 		ti = self.getIndex(keyTo)
 		self.connect(fi, ti)
 
+	def findIndexPairs(self, columns, langs):
+		langsFrom, idsFrom, langsTo, idsTo = columns
+		findIndex = self.findIndex
+		for i in xrange(len(idsFrom)):
+			yield findIndex(langs[langsFrom[i]], idsFrom[i]), findIndex(langs[langsTo[i]], idsTo[i])
+
+	def addRedirectColumns(self, columns, langs):
+		"""Adds the redirects exported by the repository as columns of
+		source and target languages and ids.
+		"""
+		for fi, ti in self.findIndexPairs(columns, langs):
+			self.redirects.add(fi)
+			self.connect(fi, ti)
+
+	def addLangLinkColumns(self, columns, langs):
+		for fi, ti in self.findIndexPairs(columns, langs):
+			self.connect(fi, ti)
+
 	def doFindComponents(self):
 		for si in xrange(self.size):
 			if self.head[si] <> si:
 				continue
 			nodes = []
 			tmp = si
-			while tmp is not None:
+			while tmp <> self.NONE:
 				nodes.append(tmp)
 				tmp = self.next[tmp]
-	
-			pageKeys, langsVisited, totalCount, coherent = [], set(), 0, True
-			for node in nodes:
-				lang, key = self.getLangAndKey(node)
-				pageKeys.append(key)
-				if self.redirects[node]:
-					continue
-				if lang in langsVisited:
-					coherent = False
-				else:
-					langsVisited |= set([lang])
-				totalCount += 1
-			
-			if totalCount == 1:
+			component = self.describeComponent(nodes)
+			if component:
+				yield component
+
+	def describeComponent(self, nodes):
+		pageKeys, langsVisited, totalCount, coherent = [], set(), 0, True
+		for node in nodes:
+			lang, key = self.getLangAndKey(node)
+			pageKeys.append(key)
+			if node in self.redirects:
 				continue
+			if lang in langsVisited:
+				coherent = False
+			else:
+				langsVisited |= set([lang])
+			totalCount += 1
+		
+		if totalCount == 1:
+			return None
 
-			pageKeys.sort()
-			compKey = str(uuid.uuid5(uuid.NAMESPACE_OID, '#'.join(pageKeys)))
+		pageKeys.sort()
+		compKey = str(uuid.uuid5(uuid.NAMESPACE_OID, '#'.join(map(str, pageKeys))))
 
-			yield compKey, pageKeys, coherent, totalCount
+		return compKey, pageKeys, coherent, totalCount
 
 class ComponentFinder:
 	def __init__(self, repo):
 		self.log = logging.getLogger('ComponentFinder')
 		self.repo = repo
-		self.pageIndex = PageIndex()
+		self.pageIndex = PageIndex(repo.makeKey)
 
 	def doFindComponents(self):
 		self.repo.connect()
 
 		self.log.info('Loading pages')
-		for key in self.repo.getAllPageKeys():
-			self.pageIndex.addPage(key)
+		self.repo.exportPageKeys(self.pageIndex.addPageColumns)
 
 		self.log.info('Indexing pages')
 		self.pageIndex.postAdd()
 
 		self.log.info('Loading redirects')
-		for keyFrom, keyTo in self.repo.getAllRedirects():
-			self.pageIndex.addRedirect(keyFrom, keyTo)
+		self.repo.exportRedirects(self.pageIndex.addRedirectColumns)
 
 		self.log.info('Loading language links')
-		for keyFrom, keyTo in self.repo.getAllLangLinks():
-			self.pageIndex.addLangLink(keyFrom, keyTo)
+		self.repo.exportLangLinks(self.pageIndex.addLangLinkColumns)
 
 		self.log.info('Finding components')
+		self.repo.beginComponents()
 		for compKey, pageKeys, coherent, size in self.pageIndex.doFindComponents():
 			self.repo.saveComponent(compKey, pageKeys, coherent, size)
+		self.repo.finishComponents()
 
 		self.repo.disconnect()
 
@@ -0,0 +1,87 @@
+# Interwiki analysis tools
+# Copyright (C) 2007-2011  Lukasz Bolikowski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import array
+from . import compfinder2
+
+class PageIndex(compfinder2.PageIndex):
+	"""Keeps the components in a disjoint-set forest with union by size
+	and path compression, so that every union is close to constant time
+	even inside the giant components.
+	"""
+
+	def initComponents(self):
+		self.parent = array.array('i', xrange(self.size))
+		self.sizes = array.array('i', [1]) * self.size
+
+	def find(self, node):
+		parent = self.parent
+		root = node
+		while parent[root] <> root:
+			root = parent[root]
+		while parent[node] <> root:
+			parent[node], node = root, parent[node]
+		return root
+
+	def connect(self, a, b):
+		a, b = self.find(a), self.find(b)
+		if a == b:
+			return
+		if self.sizes[a] < self.sizes[b]:
+			a, b = b, a
+		self.parent[b] = a
+		self.sizes[a] += self.sizes[b]
+
+	def doFindComponents(self):
+		"""Groups the nodes by their roots in one linear pass (a counting
+		sort on the roots) and yields the components in the order of
+		their smallest nodes, the same order as with compfinder2.  A
+		component is yielded when the pass over the nodes reaches its
+		smallest one, which is the first member of its group.
+		"""
+		parent, sizes, size, redirects = self.parent, self.sizes, self.size, self.redirects
+		for node in xrange(size):
+			self.find(node)
+		starts, total = array.array('i', [0]) * size, 0
+		for node in xrange(size):
+			if parent[node] == node:
+				starts[node] = total
+				total += sizes[node]
+		members = array.array('i', [0]) * size
+		for node in xrange(size):
+			root = parent[node]
+			if sizes[root] > 1:
+				members[starts[root]] = node
+				starts[root] += 1
+		for node in xrange(size):
+			root = parent[node]
+			if sizes[root] == 1:
+				if node in redirects:
+					component = self.describeComponent([node])
+				else:
+					continue
+			else:
+				first = starts[root] - sizes[root]
+				if members[first] <> node:
+					continue
+				component = self.describeComponent(members[first:starts[root]])
+			if component:
+				yield component
+
+class ComponentFinder(compfinder2.ComponentFinder):
+	def __init__(self, repo):
+		compfinder2.ComponentFinder.__init__(self, repo)
+		self.pageIndex = PageIndex(repo.makeKey)
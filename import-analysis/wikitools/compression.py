@@ -0,0 +1,88 @@
+# Interwiki analysis tools
+# Copyright (C) 2007-2011  Lukasz Bolikowski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip, subprocess
+
+class GzipBackend:
+	"""Compresses and decompresses in-process, with the gzip module."""
+
+	NAME = 'gzip'
+
+	def open(self, path):
+		if not path.endswith('.gz'):
+			return open(path)
+		return gzip.open(path)
+
+	def create(self, path):
+		return gzip.open(path, 'w')
+
+class PipeFile:
+	"""A file object reading from or writing to an external process."""
+
+	def __init__(self, process, stream):
+		self.process = process
+		self.stream = stream
+
+	def __iter__(self):
+		return iter(self.stream)
+
+	def read(self, size = -1):
+		return self.stream.read(size)
+
+	def write(self, data):
+		self.stream.write(data)
+
+	def close(self):
+		self.stream.close()
+		status = self.process.wait()
+		if status > 0:
+			raise IOError, 'External (de)compressor failed with status %d' % status
+
+class PipeBackend:
+	"""Compresses and decompresses with external programs, e.g. pigz,
+	which can use more than one core and leaves this process with
+	parsing only.
+	"""
+
+	BUFSIZE = 1 << 20
+
+	def __init__(self, name, decompress, compress = None):
+		self.NAME = name
+		self.decompress = decompress
+		self.compress = compress
+
+	def open(self, path):
+		if not path.endswith('.gz'):
+			return open(path, 'r', self.BUFSIZE)
+		process = subprocess.Popen(self.decompress + [path], stdout = subprocess.PIPE, bufsize = self.BUFSIZE)
+		return PipeFile(process, process.stdout)
+
+	def create(self, path):
+		if not self.compress:
+			return gzip.open(path, 'w')
+		target = open(path, 'wb')
+		process = subprocess.Popen(self.compress, stdin = subprocess.PIPE, stdout = target, bufsize = self.BUFSIZE)
+		target.close()
+		return PipeFile(process, process.stdin)
+
+BACKENDS = {
+	'gzip': GzipBackend(),
+	'zcat': PipeBackend('zcat', ['zcat']),
+	'pigz': PipeBackend('pigz', ['pigz', '-dc'], ['pigz', '-c']),
+}
+
+def getBackend(name = 'gzip'):
+	return BACKENDS[name]
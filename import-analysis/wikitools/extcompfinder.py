@@ -0,0 +1,230 @@
+# Interwiki analysis tools
+# Copyright (C) 2007-2011  Lukasz Bolikowski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import array, bisect, heapq, itertools, logging, mmap, os, shutil, tempfile
+from . import compfinder2, compfinder3
+from .memoptpy import IntBitmap
+
+class ExternalSorter:
+	"""Sorts a stream of integers in bounded memory: they are buffered,
+	spilled to sorted run files and merged back from the disk.
+	"""
+
+	BLOCK = 8192
+
+	def __init__(self, workDir, name, runLength):
+		self.log = logging.getLogger('ExternalSorter')
+		self.prefix = os.path.join(workDir, name)
+		self.runLength = runLength
+		self.buffer = array.array('l')
+		self.runs = []
+
+	def add(self, value):
+		self.buffer.append(value)
+		if len(self.buffer) >= self.runLength:
+			self.spill()
+
+	def spill(self):
+		if not self.buffer:
+			return
+		path = '%s.%d.run' % (self.prefix, len(self.runs))
+		self.log.debug('Spilling %d values to %s' % (len(self.buffer), path))
+		target = open(path, 'wb')
+		array.array('l', sorted(self.buffer)).tofile(target)
+		target.close()
+		self.runs.append(path)
+		self.buffer = array.array('l')
+
+	def readRun(self, path):
+		source = open(path, 'rb')
+		while True:
+			block = array.array('l')
+			block.fromstring(source.read(self.BLOCK * block.itemsize))
+			if not block:
+				break
+			for value in block:
+				yield value
+		source.close()
+
+	def merge(self):
+		"""Returns an iterator over all the values added, in ascending
+		order.
+		"""
+		self.spill()
+		return heapq.merge(*[self.readRun(path) for path in self.runs])
+
+	def close(self):
+		for path in self.runs:
+			os.remove(path)
+		self.runs = []
+
+class PageIndex(compfinder3.PageIndex):
+	"""A page index for graphs larger than the memory.  The page keys
+	are sorted externally into a memory-mapped file of 64-bit values
+	(language number << IDBITS | page id), whose positions are the page
+	indices; only every FENCE-th value is kept in memory.  The unions
+	are done in a semi-external disjoint-set forest: a parent array and
+	a byte of rank per page are the only per-page structures in memory.
+	The components are found by sorting (root, page) labels externally,
+	so only the pages of one component are held at a time.
+	"""
+
+	IDBITS = 40
+	FENCE = 128
+	RECORDBYTES = 48
+
+	def __init__(self, workDir = None, memory = 256, makeKey = None):
+		compfinder3.PageIndex.__init__(self, makeKey)
+		self.workDir = tempfile.mkdtemp(prefix = 'compfinder-', dir = workDir)
+		self.runLength = max(self.FENCE, memory * 2**20 / self.RECORDBYTES)
+		self.langs = []
+		self.langNumbers = {}
+		self.pages = ExternalSorter(self.workDir, 'pages', self.runLength)
+		self.pagesFile = self.pagesMap = None
+
+	def addPageId(self, lang, id):
+		number = self.langNumbers.get(lang)
+		if number is None:
+			number = self.langNumbers[lang] = len(self.langs)
+			self.langs.append(lang)
+		self.pages.add(number << self.IDBITS | id)
+
+	def addPageColumns(self, columns, langs):
+		for number, id in itertools.izip(*columns):
+			self.addPageId(langs[number], id)
+
+	def postAdd(self):
+		path = os.path.join(self.workDir, 'pages.idx')
+		target = open(path, 'wb')
+		self.fences, block, previous, self.size = array.array('l'), array.array('l'), None, 0
+		for value in self.pages.merge():
+			if value == previous:
+				continue
+			if self.size % self.FENCE == 0:
+				self.fences.append(value)
+			block.append(value)
+			previous, self.size = value, self.size + 1
+			if len(block) == ExternalSorter.BLOCK:
+				block.tofile(target)
+				block = array.array('l')
+		block.tofile(target)
+		target.close()
+		self.pages.close()
+		self.log.info('Indexed %d pages in %s' % (self.size, self.workDir))
+		if self.size:
+			self.pagesFile = open(path, 'rb')
+			self.pagesMap = mmap.mmap(self.pagesFile.fileno(), 0, access = mmap.ACCESS_READ)
+		self.itemSize = block.itemsize
+		self.redirects = IntBitmap()
+		self.initComponents()
+
+	def initComponents(self):
+		self.parent = array.array('i', xrange(self.size))
+		self.ranks = bytearray(self.size)
+
+	def findIndex(self, lang, id):
+		number = self.langNumbers.get(lang)
+		if number is None:
+			raise Exception
+		value = number << self.IDBITS | id
+		p = bisect.bisect_right(self.fences, value) - 1
+		if p < 0:
+			raise Exception
+		block = array.array('l')
+		block.fromstring(self.pagesMap[p * self.FENCE * self.itemSize:(p + 1) * self.FENCE * self.itemSize])
+		idx = bisect.bisect_left(block, value)
+		if idx == len(block) or block[idx] <> value:
+			raise Exception
+		return p * self.FENCE + idx
+
+	def getLangAndKey(self, index):
+		if index < 0 or index >= self.size:
+			raise Exception
+		block = array.array('l')
+		block.fromstring(self.pagesMap[index * self.itemSize:(index + 1) * self.itemSize])
+		lang = self.langs[block[0] >> self.IDBITS]
+		return lang, self.makeKey(lang, block[0] & ((1 << self.IDBITS) - 1))
+
+	def connect(self, a, b):
+		a, b = self.find(a), self.find(b)
+		if a == b:
+			return
+		if self.ranks[a] < self.ranks[b]:
+			a, b = b, a
+		self.parent[b] = a
+		if self.ranks[a] == self.ranks[b]:
+			self.ranks[a] += 1
+
+	def doFindComponents(self):
+		"""Yields the components ordered by their roots, with the nodes
+		of each one in ascending order.  The components are the same as
+		with the other finders; a single page is described only if it
+		is a redirect, since describeComponent drops the other ones.
+
+		>>> def find(index):
+		...     index.addPageColumns(([0, 0, 0, 1], [1, 2, 3, 1]), ['de', 'en'])
+		...     index.postAdd()
+		...     index.addRedirectColumns(([0], [3], [0], [3]), ['de'])
+		...     index.addLangLinkColumns(([0], [1], [1], [1]), ['de', 'en'])
+		...     return sorted(index.doFindComponents())
+		>>> index = PageIndex()
+		>>> components = find(index)
+		>>> index.close()
+		>>> components == find(compfinder3.PageIndex())
+		True
+		>>> [(pageKeys, size) for _, pageKeys, _, size in components]
+		[(['de:1', 'en:1'], 2), (['de:3'], 0)]
+		"""
+		labels = ExternalSorter(self.workDir, 'labels', self.runLength)
+		for node in xrange(self.size):
+			labels.add(self.find(node) << 32 | node)
+		self.parent = self.ranks = None
+		nodes, root = [], None
+		for value in labels.merge():
+			if value >> 32 <> root:
+				if len(nodes) > 1 or (nodes and nodes[0] in self.redirects):
+					component = self.describeComponent(nodes)
+					if component:
+						yield component
+				nodes, root = [], value >> 32
+			nodes.append(value & 0xFFFFFFFF)
+		if len(nodes) > 1 or (nodes and nodes[0] in self.redirects):
+			component = self.describeComponent(nodes)
+			if component:
+				yield component
+		labels.close()
+
+	def close(self):
+		if self.pagesMap:
+			self.pagesMap.close()
+			self.pagesFile.close()
+		self.pagesFile = self.pagesMap = None
+		shutil.rmtree(self.workDir, True)
+
+class ComponentFinder(compfinder2.ComponentFinder):
+	def __init__(self, repo, workDir = None, memory = 256):
+		compfinder2.ComponentFinder.__init__(self, repo)
+		self.pageIndex = PageIndex(workDir, memory, repo.makeKey)
+
+	def doFindComponents(self):
+		try:
+			compfinder2.ComponentFinder.doFindComponents(self)
+		finally:
+			self.pageIndex.close()
+
+if __name__ == '__main__':
+	import doctest
+	doctest.testmod()
@@ -14,17 +14,39 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import gzip, logging, os, re, sys
+import logging, multiprocessing, os, Queue, re, sys, time, traceback
+from .compression import getBackend
 
 class Importer:
 	NAMESPACES = (0, 14)
 
-	def __init__(self, dataSource = None, dataRepository = None, memProfile = False):
+	# Rows rejected by the data source itself, before any string processing:
+	# table -> (column, accepted raw values)
+	FILTERS = {
+		'page': (1, frozenset(map(str, NAMESPACES))),
+		'redirect': (1, frozenset(map(str, NAMESPACES))),
+		'pagelinks': (1, frozenset(map(str, NAMESPACES))),
+	}
+
+	PROCESSORS = {
+		'page': 'processPages',
+		'redirect': 'processRedirects',
+		'langlinks': 'processLanglinks',
+		'categorylinks': 'processCategorylinks',
+		'pagelinks': 'processPagelinks',
+	}
+
+	# The import unit removing double redirects, for all the languages.
+	DOUBLE_REDIRECTS = 'double-redirects'
+
+	def __init__(self, dataSource = None, dataRepository = None, memProfile = False, resume = False):
 		self.log = logging.getLogger('Importer')
 		self.logValidator = logging.getLogger('DataValidator')
 		self.dataSource = dataSource
 		self.dataRepository = dataRepository
 		self.memProfile = memProfile
+		self.resume = resume
+		self.finishedUnits = set()
 
 	def processPages(self, lang, records):
 		for record in records:
@@ -45,7 +67,8 @@ class Importer:
 			if not int(toNamespace) in self.NAMESPACES:
 				continue
 
-			page = self.dataRepository.getPage(lang + ':' + fromId)
+			fromKey = self.dataRepository.makeKey(lang, fromId)
+			page = self.dataRepository.getPage(fromKey)
 			if page == None:
 				self.logValidator.warn('Nonexistent redirect source [%s] (language %s)' % (fromId, lang))
 				continue
@@ -60,7 +83,7 @@ class Importer:
 				self.logValidator.warn('Nonexistent redirect target %s:%s (namespace %s)' % (lang, toTitle, toNamespace))
 				continue
 
-			self.dataRepository.insertRedirect(lang + ':' + fromId, toKey)
+			self.dataRepository.insertRedirect(fromKey, toKey)
 
 	def processLanglinks(self, fromLang, records):
 		for record in records:
@@ -72,7 +95,8 @@ class Importer:
 				self.logValidator.warn('Langlink to the same language to %s:%s' % (toLang, toTitle))
 				continue
 
-			page = self.dataRepository.getPage(fromLang + ':' + fromId)
+			fromKey = self.dataRepository.makeKey(fromLang, fromId)
+			page = self.dataRepository.getPage(fromKey)
 			if page == None:
 				continue
 			if page['redirect'] != None:
@@ -88,7 +112,7 @@ class Importer:
 				self.logValidator.warn('Nonexistent langlink target %s:%s (namespace %s)' % (toLang, toTitle, namespace))
 				continue
 
-			self.dataRepository.insertLanglink(fromLang + ':' + fromId, toKey)
+			self.dataRepository.insertLanglink(fromKey, toKey)
 
 	def processPagelinks(self, lang, records):
 		for record in records:
@@ -96,7 +120,8 @@ class Importer:
 			toNamespace = record[1]
 			toTitle = record[2]
 
-			fromPage = self.dataRepository.getPage(lang + ':' + fromId)
+			fromKey = self.dataRepository.makeKey(lang, fromId)
+			fromPage = self.dataRepository.getPage(fromKey)
 			if fromPage == None:
 				continue
 			fromNamespace = fromPage['namespace']
@@ -106,14 +131,15 @@ class Importer:
 				self.logValidator.warn('Nonexistent pagelink target %s:%s (namespace %s)' % (lang, toTitle, toNamespace))
 				continue
 
-			self.dataRepository.insertPagelink(lang + ':' + fromId, toKey)
+			self.dataRepository.insertPagelink(fromKey, toKey)
 
 	def processCategorylinks(self, lang, records):
 		for record in records:
 			fromId = record[0]
 			toTitle = record[1]
 
-			fromPage = self.dataRepository.getPage(lang + ':' + fromId)
+			fromKey = self.dataRepository.makeKey(lang, fromId)
+			fromPage = self.dataRepository.getPage(fromKey)
 			if fromPage == None:
 				continue
 			fromNamespace = fromPage['namespace']
@@ -124,7 +150,47 @@ class Importer:
 				self.logValidator.warn('Nonexistent categorylink target %s:%s (namespace %s)' % (lang, toTitle, toNamespace))
 				continue
 
-			self.dataRepository.insertCategorylink(lang + ':' + fromId, toKey)
+			self.dataRepository.insertCategorylink(fromKey, toKey)
+
+	def importUnit(self, lang, table):
+		"""Imports one table of one language and returns the number of
+		dump statements read.
+		"""
+		process = getattr(self, self.PROCESSORS[table])
+		statements = [0]
+		def callback(records):
+			statements[0] += 1
+			process(lang, records)
+		self.dataSource.importTable(lang, table, callback, self.FILTERS.get(table))
+		self.dataRepository.flush()
+		return statements[0]
+
+	def runUnit(self, lang, table):
+		"""Runs one unit of the import, recording it in the repository's
+		journal.  When resuming, the units finished by a previous run are
+		skipped (only the caches of their pages are reloaded); unfinished
+		ones are cleaned up by the repository and repeated.
+		"""
+		if (table, lang) in self.finishedUnits:
+			self.log.info('Skipping the finished %s %s' % (table, lang or ''))
+			if table == 'page':
+				self.dataRepository.loadCache(lang)
+			return
+		self.dataRepository.beginUnit(table, lang)
+		if table == self.DOUBLE_REDIRECTS:
+			self.dataRepository.removeDoubleRedirects()
+			statements = 0
+		else:
+			statements = self.importUnit(lang, table)
+		self.dataRepository.finishUnit(table, lang, statements)
+
+	def loadFinishedUnits(self):
+		if not self.resume:
+			return
+		self.dataRepository.connect()
+		self.finishedUnits = self.dataRepository.getFinishedUnits()
+		self.dataRepository.disconnect()
+		self.log.info('Resuming the import, %d unit(s) already finished' % len(self.finishedUnits))
 
 	def doImport(self):
 		langs = self.dataSource.getLangs()
@@ -133,6 +199,7 @@ class Importer:
 		else:
 			self.log.error('No languages found')
 			return
+		self.loadFinishedUnits()
 
 		if self.memProfile:
 			import code
@@ -143,7 +210,7 @@ class Importer:
 		for lang in langs:
 			self.log.info('Importing pages from ' + lang)
 			self.dataRepository.connect()
-			self.dataSource.importTable(lang, 'page', lambda r : self.processPages(lang, r))
+			self.runUnit(lang, 'page')
 			self.dataRepository.disconnect()
 
 		if self.memProfile:
@@ -152,7 +219,7 @@ class Importer:
 		for lang in langs:
 			self.log.info('Importing redirects from ' + lang)
 			self.dataRepository.connect()
-			self.dataSource.importTable(lang, 'redirect', lambda r : self.processRedirects(lang, r))
+			self.runUnit(lang, 'redirect')
 			self.dataRepository.disconnect()
 
 		if self.memProfile:
@@ -160,67 +227,344 @@ class Importer:
 
 		self.log.info('Removing double redirects')
 		self.dataRepository.connect()
-		self.dataRepository.removeDoubleRedirects()
+		self.runUnit(None, self.DOUBLE_REDIRECTS)
 		self.dataRepository.disconnect()
 
 		for lang in langs:
 			self.log.info('Importing langlinks from ' + lang)
 			self.dataRepository.connect()
-			self.dataSource.importTable(lang, 'langlinks', lambda r : self.processLanglinks(lang, r))
+			self.runUnit(lang, 'langlinks')
 			self.dataRepository.disconnect()
 
 		for lang in langs:
 			self.log.info('Importing categorylinks from ' + lang)
 			self.dataRepository.connect()
-			self.dataSource.importTable(lang, 'categorylinks', lambda r : self.processCategorylinks(lang, r))
+			self.runUnit(lang, 'categorylinks')
 			self.dataRepository.disconnect()
 
 #		for lang in langs:
 #			self.log.info('Importing pagelinks from ' + lang)
 #			self.dataRepository.connect()
-#			self.dataSource.importTable(lang, 'pagelinks', lambda r : self.processPagelinks(lang, r))
+#			self.runUnit(lang, 'pagelinks')
 #			self.dataRepository.disconnect()
 
 		if self.memProfile:
 			code.interact(local = {'hp': hp})
 
+		self.dataRepository.connect()
+		self.dataRepository.finishImport()
+		self.dataRepository.disconnect()
+
 		self.log.info('Done')
 
+class StagingImporter(Importer):
+	"""Imports the dumps in the extract-load-transform fashion: pages
+	are loaded as usual, but redirects, langlinks and categorylinks are
+	copied raw into staging tables and resolved with a few set-based
+	joins against the pages.  No title-to-key mapping is kept in memory.
+
+	Since the staging tables are not kept between runs, the staged
+	tables are journaled as single units covering all the languages,
+	finished once they are resolved.
+	"""
+
+	def processRedirects(self, lang, records):
+		for record in records:
+			self.dataRepository.stageRedirect(lang, self.dataRepository.makeKey(lang, record[0]), record[1], record[2])
+
+	def processLanglinks(self, lang, records):
+		for record in records:
+			self.dataRepository.stageLanglink(lang, self.dataRepository.makeKey(lang, record[0]), record[1], record[2])
+
+	def processCategorylinks(self, lang, records):
+		for record in records:
+			self.dataRepository.stageCategorylink(lang, self.dataRepository.makeKey(lang, record[0]), record[1])
+
+	def stageUnit(self, langs, table, resolve):
+		if (table, None) in self.finishedUnits:
+			self.log.info('Skipping the finished %s' % table)
+			return
+		self.dataRepository.beginUnit(table, None)
+		statements = 0
+		for lang in langs:
+			self.log.info('Staging %s from %s' % (table, lang))
+			statements += self.importUnit(lang, table)
+		self.log.info('Resolving ' + table)
+		resolve()
+		self.dataRepository.finishUnit(table, None, statements)
+
+	def doImport(self):
+		langs = self.dataSource.getLangs()
+		if len(langs) > 0:
+			self.log.info('Processing %d language(s): %s' % (len(langs), ' '.join(langs)))
+		else:
+			self.log.error('No languages found')
+			return
+
+		self.loadFinishedUnits()
+		self.dataRepository.connect()
+		self.dataRepository.createStagingTables()
+
+		for lang in langs:
+			self.log.info('Importing pages from ' + lang)
+			self.runUnit(lang, 'page')
+
+		self.stageUnit(langs, 'redirect', self.dataRepository.resolveRedirects)
+
+		self.log.info('Removing double redirects')
+		self.runUnit(None, self.DOUBLE_REDIRECTS)
+
+		self.stageUnit(langs, 'langlinks', self.dataRepository.resolveLanglinks)
+		self.stageUnit(langs, 'categorylinks', self.dataRepository.resolveCategorylinks)
+
+		self.dataRepository.dropStagingTables()
+		self.dataRepository.disconnect()
+		self.log.info('Done')
+
+_worker = None
+_workerError = None
+
+def _initWorker(dataSource, repositoryClass, repositoryArgs):
+	"""Sets up the importer of a pool worker.  A failure is recorded
+	and reported by the first task instead of being raised, since the
+	pool would silently replace the worker.
+	"""
+	global _worker, _workerError
+	try:
+		_worker = Importer(dataSource, repositoryClass(**repositoryArgs))
+		_worker.dataRepository.connect()
+	except Exception:
+		_workerError = traceback.format_exc()
+
+def _runTask(task):
+	table, lang = task
+	startTime = time.time()
+	if _workerError:
+		return task, None, 'Worker initialization failed:\n' + _workerError
+	try:
+		_worker.runUnit(lang, table)
+		_worker.dataRepository.commit()
+	except Exception:
+		return task, None, traceback.format_exc()
+	return task, time.time() - startTime, None
+
+class ImportScheduler:
+	"""Runs the import on a pool of worker processes.
+
+	The import is split into (table, language) tasks which are started
+	as soon as the tasks they depend on are finished: redirects and
+	categorylinks of a language need its pages, double redirects are
+	removed once all the redirects are in, and langlinks need the
+	pages of all the languages and the final redirects.
+
+	Each worker keeps a single database connection and commits after
+	every task.  The workers share no memory, so the repository must
+	not use in-process caches.  Every task is an import unit journaled
+	by the repository, so an interrupted import can be resumed.
+	"""
+
+	DOUBLE_REDIRECTS = Importer.DOUBLE_REDIRECTS
+
+	# Seconds between the checks for finished tasks.  Waiting without a
+	# timeout cannot be interrupted with Ctrl-C.
+	POLL = 1
+
+	def __init__(self, dataSource, repositoryClass, repositoryArgs = {}, workers = None, resume = False):
+		self.log = logging.getLogger('ImportScheduler')
+		self.dataSource = dataSource
+		self.repositoryClass = repositoryClass
+		self.repositoryArgs = dict(repositoryArgs, cache = False)
+		self.workers = workers or multiprocessing.cpu_count()
+		self.resume = resume
+
+	def getDependencies(self, langs):
+		deps = {(self.DOUBLE_REDIRECTS, None): [('redirect', lang) for lang in langs]}
+		for lang in langs:
+			deps[('page', lang)] = []
+			deps[('redirect', lang)] = [('page', lang)]
+			deps[('langlinks', lang)] = [(self.DOUBLE_REDIRECTS, None)] + [('page', l) for l in langs]
+			deps[('categorylinks', lang)] = [('page', lang)]
+		return deps
+
+	def doImport(self):
+		langs = self.dataSource.getLangs()
+		if len(langs) > 0:
+			self.log.info('Processing %d language(s) with %d worker(s): %s' % (len(langs), self.workers, ' '.join(langs)))
+		else:
+			self.log.error('No languages found')
+			return
+
+		deps = self.getDependencies(langs)
+		order = [('page', lang) for lang in langs] + [('redirect', lang) for lang in langs] \
+			+ [(self.DOUBLE_REDIRECTS, None)] \
+			+ [('categorylinks', lang) for lang in langs] + [('langlinks', lang) for lang in langs]
+		waiting, running, done = list(order), 0, set()
+		if self.resume:
+			repository = self.repositoryClass(**self.repositoryArgs)
+			repository.connect()
+			done = repository.getFinishedUnits() & set(order)
+			repository.disconnect()
+			waiting = [task for task in order if not task in done]
+			self.log.info('Resuming the import, %d of %d tasks already done' % (len(done), len(order)))
+		finished = Queue.Queue()
+		pool = multiprocessing.Pool(self.workers, _initWorker, (self.dataSource, self.repositoryClass, self.repositoryArgs))
+		startTime = time.time()
+		try:
+			while waiting or running:
+				for task in [t for t in waiting if all(d in done for d in deps[t])]:
+					waiting.remove(task)
+					running += 1
+					self.log.info('Starting %s %s' % (task[0], task[1] or ''))
+					pool.apply_async(_runTask, (task,), callback = finished.put)
+				while True:
+					try:
+						task, seconds, error = finished.get(True, self.POLL)
+						break
+					except Queue.Empty:
+						pass
+				running -= 1
+				if error:
+					raise Exception, 'Task %s %s failed:\n%s' % (task[0], task[1] or '', error)
+				done.add(task)
+				self.log.info('Finished %s %s in %.1f s (%d/%d tasks done)' % (task[0], task[1] or '', seconds, len(done), len(order)))
+		except:
+			pool.terminate()
+			raise
+		pool.close()
+		pool.join()
+		self.log.info('Done in %.1f s' % (time.time() - startTime))
+
+def _tokenizeLine(dataSource, line, filter):
+	return list(dataSource.iterLine(line, filter))
+
 class DummyDataSource:
 	def getLangs(self):
 		return []
-	def importTable(self, lang, type, callback):
+	def importTable(self, lang, type, callback, filter = None):
 		pass
 
 class DumpsDataSource:
-	def __init__(self, dumpsDir = None):
+	PARSERS = ('regex', 'classic')
+
+	ROW = re.compile(r"\(((?:[^'()]|'[^'\\]*(?:\\.[^'\\]*)*')*)\)")
+	FIELD = re.compile(r"(')([^'\\]*(?:\\.[^'\\]*)*)'|([^,']+)")
+	ESCAPE = re.compile(r'\\(.)')
+	UNESCAPED = {'0': '\0', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+
+	def __init__(self, dumpsDir = None, parser = 'regex', workers = 1, decompressor = 'gzip'):
 		self.dumpsDir = dumpsDir
+		self.parser = parser
+		self.workers = workers
+		self.decompressor = getBackend(decompressor)
 
 	def getLangs(self):
-		langs = []
+		langs = set()
 		for filename in os.listdir(self.dumpsDir):
-			match = re.match(r'(?P<lang>[a-z]+(_[a-z]+(_[a-z]+)?)?)wiki-\d{8}-page.sql.gz', filename)
+			match = re.match(r'(?P<lang>[a-z]+(_[a-z]+(_[a-z]+)?)?)wiki-\d{8}-page\.sql(\.gz)?$', filename)
 			if not match:
 				continue
-			langs += [match.group('lang').replace('_', '-')]
+			langs.add(match.group('lang').replace('_', '-'))
 		return sorted(langs)
 
-	def importTable(self, lang, type, callback):
-		source = None
+	def openTable(self, lang, type):
 		for filename in os.listdir(self.dumpsDir):
-			match = re.match(r'(?P<lang>[a-z]+(_[a-z]+(_[a-z]+)?)?)wiki-(?P<date>\d{8})-(?P<type>[a-z]+).sql.gz', filename)
+			match = re.match(r'(?P<lang>[a-z]+(_[a-z]+(_[a-z]+)?)?)wiki-(?P<date>\d{8})-(?P<type>[a-z]+)\.sql(\.gz)?$', filename)
 			if not match or lang != match.group('lang').replace('_', '-') or type != match.group('type'):
 				continue
-			source = gzip.open(self.dumpsDir + os.sep + filename)
-			break
-		if not source:
-			raise Exception, 'No such file'
+			return self.decompressor.open(self.dumpsDir + os.sep + filename)
+		raise Exception, 'No such file'
+
+	def importTable(self, lang, type, callback, filter = None):
+		"""Passes the records of the given table to the callback.
+
+		The optional filter is a (column, values) pair: records whose
+		raw value in the given column is not among the values are
+		rejected before their strings are unescaped and decoded.
+		"""
+		if self.parser == 'classic' and filter:
+			column, values = filter
+			unfiltered = callback
+			callback = lambda records : unfiltered([r for r in records if r[column] in values])
+		source = self.openTable(lang, type)
+		if self.workers > 1 and self.parser != 'classic':
+			self.importParallel(source, callback, filter)
+			source.close()
+			return
 		for line in source:
 			if not line.startswith('INSERT INTO'):
 				continue
-			self.importLine(line, callback)
+			if self.parser == 'classic':
+				self.importLine(line, callback)
+			else:
+				callback(self.iterLine(line, filter))
 		source.close()
 
+	def importParallel(self, source, callback, filter):
+		"""Tokenizes the INSERT statements of a single dump on a pool of
+		worker processes.  The statements are read here, and the records
+		are passed to the callback in the order of the statements.  At most
+		a few statements per worker are in flight at any time.
+		"""
+		pool = multiprocessing.Pool(self.workers)
+		pending = []
+		try:
+			for line in source:
+				if not line.startswith('INSERT INTO'):
+					continue
+				pending.append(pool.apply_async(_tokenizeLine, (self, line, filter)))
+				if len(pending) >= 2 * self.workers:
+					callback(pending.pop(0).get())
+			while pending:
+				callback(pending.pop(0).get())
+		except:
+			pool.terminate()
+			raise
+		pool.close()
+		pool.join()
+
+	def unescape(self, match):
+		char = match.group(1)
+		return self.UNESCAPED.get(char, char)
+
+	def iterLine(self, line, filter = None):
+		"""Yields the records of a single INSERT statement as tuples.
+
+		Rows and fields are located with regular expressions instead of
+		walking the line one character at a time, and records are produced
+		lazily, so no list of all the records in the line is built.
+		Only single-quoted strings (as written by mysqldump) are recognized.
+		See importTable for the meaning of the filter; with a filter,
+		a row is tokenized only up to the filtered column before it is
+		rejected.
+		"""
+		column, values = filter or (None, None)
+		for row in self.ROW.finditer(line):
+			if column is None:
+				fields = self.FIELD.findall(row.group(1))
+			else:
+				fields = []
+				for match in self.FIELD.finditer(row.group(1)):
+					fields.append(match.groups(''))
+					if len(fields) > column:
+						break
+				quote, text, plain = fields[column]
+				if (text if quote else plain) not in values:
+					continue
+				fields.extend(self.FIELD.findall(row.group(1), match.end()))
+			record = []
+			for quote, text, plain in fields:
+				if not quote:
+					record.append(plain.replace('_', ' '))
+					continue
+				if '\\' in text:
+					text = self.ESCAPE.sub(self.unescape, text)
+				try:
+					record.append(text.replace('_', ' ').decode('utf-8'))
+				except UnicodeDecodeError:
+					break
+			else:
+				yield tuple(record)
+
 	def importLine(self, line, callback):
 		cur = 0
 		records = []
@@ -24,7 +24,7 @@
 
 """This module contains various memory-optimized data structures."""
 
-import array
+import array, binascii, bisect, itertools, mmap, operator, os, struct, sys
 
 class CollisionError(Exception):
 	pass
@@ -35,14 +35,44 @@ class IntSet:
 	BLOCKBITS = 16
 
 	def __init__(self, iterable = []):
-		"""Initializes the set.  Examples:
+		"""Initializes the set.  The elements are sorted once and
+		the blocks are laid out directly.  Examples:
 		>>> s = IntSet()
 		>>> s = IntSet([0, 1, 8])
 		>>> s = IntSet(set([0, 1, 8]))
+		>>> s = IntSet(array.array('i', [8, 1, 0, 1]))
+		>>> len(s)
+		3
 		"""
 		self.__blocks = {}
-		for item in iterable:
-			self.add(item)
+		self.__size = 0
+		self.__build(iterable)
+
+	def __build(self, iterable):
+		elems = sorted(set(iterable))
+		blocks = {}
+		i, n = 0, len(elems)
+		while i < n:
+			high = elems[i] >> self.BLOCKBITS
+			j = bisect.bisect_left(elems, (high + 1) << self.BLOCKBITS, i)
+			blocks[high] = array.array('i', elems[i:j])
+			i = j
+		self.__blocks, self.__size = blocks, n
+
+	def update(self, iterable):
+		"""Adds all the elements of an iterable to the set.  Unless
+		there are few of them, the blocks are rebuilt at once.  Examples:
+		>>> s = IntSet([0, 1, 8])
+		>>> s.update([8, 27, 1 << 20])
+		>>> sorted(s)
+		[0, 1, 8, 27, 1048576]
+		"""
+		elems = list(iterable)
+		if 16 * len(elems) < self.__size:
+			for elem in elems:
+				self.add(elem)
+		else:
+			self.__build(itertools.chain(self, elems))
 
 	def __getpos(self, elem):
 		high, low = elem >> self.BLOCKBITS, elem % (1 << self.BLOCKBITS)
@@ -83,6 +113,9 @@ class IntSet:
 			block.append(elem)
 		elif block[p] <> elem:
 			block.insert(p, elem)
+		else:
+			return
+		self.__size += 1
 
 	def remove(self, elem):
 		"""Removes an element from the set.  Examples:
@@ -103,6 +136,7 @@ class IntSet:
 		if p == n or block[p] <> elem:
 			raise KeyError, elem
 		block.pop(p)
+		self.__size -= 1
 
 	def __contains__(self, elem):
 		"""Tests whether an element is in the set.  Examples:
@@ -119,6 +153,24 @@ class IntSet:
 			return False
 		return block[p] == elem
 
+	def containsmany(self, elems):
+		"""Tests which of the given elements are in the set.  Returns
+		a list of booleans.  Examples:
+		>>> s = IntSet([0, 1, 8])
+		>>> s.containsmany(array.array('i', [8, 2, 0, 1 << 20]))
+		[True, False, True, False]
+		"""
+		blocks, bits = self.__blocks, self.BLOCKBITS
+		result = []
+		for elem in elems:
+			block = blocks.get(elem >> bits)
+			if not block:
+				result.append(False)
+				continue
+			p = bisect.bisect_left(block, elem)
+			result.append(p < len(block) and block[p] == elem)
+		return result
+
 	def __iter__(self):
 		"""Iterates over the elements of the set.  Examples:
 		>>> s = IntSet([0, 1, 8])
@@ -145,10 +197,15 @@ class IntSet:
 		>>> len(s)
 		3
 		"""
-		result = 0
-		for b in self.__blocks:
-			result += len(self.__blocks[b])
-		return result
+		return self.__size
+
+	def __sizeof__(self):
+		"""Returns the approximate number of bytes used by the set.
+		Examples:
+		>>> IntSet(xrange(100000)).__sizeof__() < 100000 * 5
+		True
+		"""
+		return sys.getsizeof(self.__blocks) + sum([sys.getsizeof(block) for block in self.__blocks.itervalues()])
 
 	def __repr__(self):
 		"""Returns the "official" string representation of the set."""
@@ -167,6 +224,290 @@ class IntSet:
 			count += 1
 		return '[' + result + ']'
 
+class IntBitmap:
+	"""A compressed set of integers, in the fashion of roaring bitmaps.
+	The integers are split into chunks of 2**16 by their high bits.
+	A chunk with few integers is stored as a sorted array of their low
+	16 bits, a dense one as a bitmap of 2**16 bits.  Unions,
+	intersections and differences work chunk by chunk, on Python sets
+	or long integers, so most of the work is done in C.
+	"""
+
+	CHUNKBITS = 16
+	ARRAYMAX = 4096
+	BITMAPBYTES = 8192
+	MAGIC = 'IBM1'
+	BYTEBITS = tuple([tuple([b for b in xrange(8) if v >> b & 1]) for v in xrange(256)])
+
+	def __init__(self, iterable = []):
+		"""Initializes the set.  Examples:
+		>>> b = IntBitmap()
+		>>> b = IntBitmap([0, 1, 8, 1 << 20])
+		>>> b = IntBitmap(xrange(100000))
+		>>> len(b)
+		100000
+		"""
+		self.__chunks = {}
+		elems = sorted(set(iterable))
+		i, n = 0, len(elems)
+		while i < n:
+			high = elems[i] >> self.CHUNKBITS
+			j = bisect.bisect_left(elems, (high + 1) << self.CHUNKBITS, i)
+			self.__chunks[high] = self.__container([elem & 0xFFFF for elem in elems[i:j]])
+			i = j
+		self.__size = n
+
+	def __container(self, lows):
+		if len(lows) <= self.ARRAYMAX:
+			return array.array('H', lows)
+		bits = bytearray(self.BITMAPBYTES)
+		for low in lows:
+			bits[low >> 3] |= 1 << (low & 7)
+		return bits
+
+	def __lows(self, container):
+		if not isinstance(container, bytearray):
+			return container
+		lows, byteBits = [], self.BYTEBITS
+		for i, byte in enumerate(container):
+			if byte:
+				base = i << 3
+				lows.extend([base | b for b in byteBits[byte]])
+		return lows
+
+	def __tolong(self, container):
+		if not isinstance(container, bytearray):
+			bits = bytearray(self.BITMAPBYTES)
+			for low in container:
+				bits[low >> 3] |= 1 << (low & 7)
+			container = bits
+		return int(binascii.hexlify(container), 16)
+
+	def __fromlong(self, value):
+		"""Returns the container for the given long integer and its
+		cardinality.
+		"""
+		bits = bytearray(binascii.unhexlify('%0*x' % (2 * self.BITMAPBYTES, value)))
+		count = bin(value).count('1')
+		if count > self.ARRAYMAX:
+			return bits, count
+		return array.array('H', self.__lows(bits)), count
+
+	def __combine(self, other, setOp, longOp, keys):
+		result = IntBitmap()
+		for high in keys:
+			a, b = self.__chunks.get(high), other.__chunks.get(high)
+			if b is None:
+				container, count = self.__copy(a)
+			elif a is None:
+				container, count = other.__copy(b)
+			elif isinstance(a, bytearray) or isinstance(b, bytearray):
+				container, count = self.__fromlong(longOp(self.__tolong(a), self.__tolong(b)))
+			else:
+				lows = sorted(setOp(set(a), set(b)))
+				container, count = self.__container(lows), len(lows)
+			if count:
+				result.__chunks[high] = container
+				result.__size += count
+		return result
+
+	def __copy(self, container):
+		if isinstance(container, bytearray):
+			return bytearray(container), bin(self.__tolong(container)).count('1')
+		return array.array('H', container), len(container)
+
+	def __or__(self, other):
+		"""Returns the union of two sets.  Examples:
+		>>> list(IntBitmap([0, 1, 8]) | IntBitmap([8, 27, 1 << 20]))
+		[0, 1, 8, 27, 1048576]
+		>>> len(IntBitmap(xrange(0, 100000, 2)) | IntBitmap(xrange(1, 100000, 2)))
+		100000
+		"""
+		return self.__combine(other, operator.or_, operator.or_, set(self.__chunks) | set(other.__chunks))
+
+	def __and__(self, other):
+		"""Returns the intersection of two sets.  Examples:
+		>>> list(IntBitmap([0, 1, 8]) & IntBitmap([8, 27, 1]))
+		[1, 8]
+		>>> len(IntBitmap(xrange(0, 100000, 2)) & IntBitmap(xrange(0, 100000, 3)))
+		16667
+		"""
+		return self.__combine(other, operator.and_, operator.and_, set(self.__chunks) & set(other.__chunks))
+
+	def __sub__(self, other):
+		"""Returns the difference of two sets.  Examples:
+		>>> list(IntBitmap([0, 1, 8]) - IntBitmap([8, 27]))
+		[0, 1]
+		>>> len(IntBitmap(xrange(100000)) - IntBitmap(xrange(0, 100000, 2)))
+		50000
+		"""
+		return self.__combine(other, operator.sub, lambda x, y : x & ~y, self.__chunks.keys())
+
+	def __ior__(self, other):
+		union = self | other
+		self.__chunks, self.__size = union.__chunks, union.__size
+		return self
+
+	def update(self, iterable):
+		"""Adds all the elements of an iterable to the set.  Examples:
+		>>> b = IntBitmap([1])
+		>>> b.update(xrange(5000))
+		>>> len(b)
+		5000
+		"""
+		self |= IntBitmap(iterable)
+
+	def add(self, elem):
+		"""Adds an element to the set.  Examples:
+		>>> b = IntBitmap()
+		>>> for i in xrange(0, 20000, 3): b.add(i)
+		>>> b.add(3)
+		>>> len(b), 3 in b, 4 in b
+		(6667, True, False)
+		"""
+		high, low = elem >> self.CHUNKBITS, elem & 0xFFFF
+		container = self.__chunks.get(high)
+		if container is None:
+			self.__chunks[high] = array.array('H', [low])
+		elif isinstance(container, bytearray):
+			i, bit = low >> 3, 1 << (low & 7)
+			if container[i] & bit:
+				return
+			container[i] |= bit
+		else:
+			p = bisect.bisect_left(container, low)
+			if p < len(container) and container[p] == low:
+				return
+			container.insert(p, low)
+			if len(container) > self.ARRAYMAX:
+				self.__chunks[high] = self.__container(container)
+		self.__size += 1
+
+	def discard(self, elem):
+		"""Removes an element from the set if it is present."""
+		high, low = elem >> self.CHUNKBITS, elem & 0xFFFF
+		container = self.__chunks.get(high)
+		if container is None:
+			return
+		if isinstance(container, bytearray):
+			i, bit = low >> 3, 1 << (low & 7)
+			if not container[i] & bit:
+				return
+			container[i] &= ~bit
+		else:
+			p = bisect.bisect_left(container, low)
+			if p == len(container) or container[p] <> low:
+				return
+			container.pop(p)
+			if not container:
+				del self.__chunks[high]
+		self.__size -= 1
+
+	def remove(self, elem):
+		"""Removes an element from the set.  Examples:
+		>>> b = IntBitmap([0, 1, 8])
+		>>> b.remove(0)
+		>>> list(b)
+		[1, 8]
+		>>> b.remove(-1)
+		Traceback (most recent call last):
+			...
+		KeyError: -1
+		"""
+		if not elem in self:
+			raise KeyError, elem
+		self.discard(elem)
+
+	def __contains__(self, elem):
+		container = self.__chunks.get(elem >> self.CHUNKBITS)
+		if container is None:
+			return False
+		low = elem & 0xFFFF
+		if isinstance(container, bytearray):
+			return bool(container[low >> 3] & (1 << (low & 7)))
+		p = bisect.bisect_left(container, low)
+		return p < len(container) and container[p] == low
+
+	def __iter__(self):
+		"""Iterates over the elements of the set in ascending order."""
+		for high in sorted(self.__chunks):
+			base = high << self.CHUNKBITS
+			for low in self.__lows(self.__chunks[high]):
+				yield base | low
+
+	def __len__(self):
+		return self.__size
+
+	def __sizeof__(self):
+		"""Returns the approximate number of bytes used by the set.
+		Examples:
+		>>> IntBitmap(xrange(100000)).__sizeof__() < 100000 / 4
+		True
+		"""
+		return sys.getsizeof(self.__chunks) + sum([sys.getsizeof(container) for container in self.__chunks.itervalues()])
+
+	def tobytes(self):
+		"""Serializes the set to a string.  Examples:
+		>>> b = IntBitmap(range(10000) + [1 << 20, 5 << 20])
+		>>> c = IntBitmap.frombytes(b.tobytes())
+		>>> len(c), list(c) == list(b)
+		(10002, True)
+		"""
+		parts = [struct.pack('<4sI', self.MAGIC, len(self.__chunks))]
+		for high in sorted(self.__chunks):
+			container = self.__chunks[high]
+			if isinstance(container, bytearray):
+				parts.append(struct.pack('<iBI', high, 1, len(container)))
+				parts.append(str(container))
+			else:
+				lows = array.array('H', container)
+				if sys.byteorder == 'big':
+					lows.byteswap()
+				parts.append(struct.pack('<iBI', high, 0, len(lows)))
+				parts.append(lows.tostring())
+		return ''.join(parts)
+
+	@staticmethod
+	def frombytes(data):
+		"""Deserializes a set serialized with tobytes."""
+		result = IntBitmap()
+		magic, count = struct.unpack_from('<4sI', data)
+		if magic <> IntBitmap.MAGIC:
+			raise Exception, 'Not a serialized IntBitmap'
+		offset = struct.calcsize('<4sI')
+		for _ in xrange(count):
+			high, kind, length = struct.unpack_from('<iBI', data, offset)
+			offset += struct.calcsize('<iBI')
+			if kind == 1:
+				container = bytearray(data[offset:offset + length])
+				offset += length
+				result.__size += bin(result.__tolong(container)).count('1')
+			else:
+				container = array.array('H', data[offset:offset + 2 * length])
+				if sys.byteorder == 'big':
+					container.byteswap()
+				offset += 2 * length
+				result.__size += length
+			result.__chunks[high] = container
+		return result
+
+	def __repr__(self):
+		"""Returns the "official" string representation of the set."""
+		return 'IntBitmap(' + str(self) + ')'
+
+	def __str__(self):
+		"""Returns an "informal" string representation of the set."""
+		result, count = '', 0
+		for elem in self:
+			if count > 0:
+				result += ', '
+			if count == 100:
+				result += '...'
+				break
+			result += str(elem)
+			count += 1
+		return '[' + result + ']'
+
 class HashIntDict:
 	"""A dictionary-like structure with object hashes as keys
 	and integers as values.
@@ -179,28 +520,131 @@ class HashIntDict:
 	CHK_SHOUTING = 2
 
 	def __init__(self, dictionary = {}, checking = 0):
-		"""Initializes the dictionary.  Examples:
+		"""Initializes the dictionary from a mapping or an iterable
+		of key-value pairs.  The pairs are sorted once and the blocks
+		are laid out directly.  Examples:
 		>>> d = HashIntDict()
 		>>> d = HashIntDict({0: 0, 1: -1, 8: -2})
 		>>> d = HashIntDict({0: 0, 1: -1, 8: -2}, HashIntDict.CHK_DELETING)
 		>>> d = HashIntDict({0: 0, 1: -1, 8: -2}, HashIntDict.CHK_SHOUTING)
+		>>> d = HashIntDict([(8, -2), (1, -1), (1, 1)], HashIntDict.CHK_DELETING)
+		>>> len(d), 1 in d
+		(1, False)
 		"""
 		bits = 8 * array.array('i').itemsize
 		self.__masks = ((1 << bits) - 1, (1 << (bits - 1)) - 1)
 		self.__blocks = {}
+		self.__size = 0
 		self.__checking = checking
 		if checking <> self.CHK_IGNORING:
 			self.__collisions = IntSet()
-		for key in dictionary:
-			self[key] = dictionary[key]
+		self.__build(self.__pairs(dictionary))
 
-	def __prepkey(self, key):
+	def __pairs(self, items):
+		if hasattr(items, 'iteritems'):
+			return items.iteritems()
+		return items
+
+	def __build(self, pairs):
+		"""Replaces the blocks with ones laid out from the given pairs.
+		Pairs with equal keys are treated as consecutive assignments,
+		and the keys that already collided are skipped.  With
+		CHK_SHOUTING, CollisionError is raised once the new blocks are
+		in place.
+		"""
+		prepared, collided = [], False
+		for key, value in pairs:
+			key = self.__convert(key)
+			if self.__checking <> self.CHK_IGNORING and key in self.__collisions:
+				collided = True
+				continue
+			prepared.append((key, value))
+		prepared.sort(key = operator.itemgetter(0))
+		keys = map(operator.itemgetter(0), prepared)
+		values = map(operator.itemgetter(1), prepared)
+		repeated = list(itertools.compress(xrange(1, len(keys)), itertools.imap(operator.eq, keys, itertools.islice(keys, 1, None))))
+		if repeated:
+			keys, values, repeatCollided = self.__dedup(keys, values, repeated)
+			collided = collided or repeatCollided
+		blocks = {}
+		i, n = 0, len(keys)
+		while i < n:
+			high = keys[i] >> self.BLOCKBITS
+			j = bisect.bisect_left(keys, (high + 1) << self.BLOCKBITS, i)
+			block = array.array('i', keys[i:j]) * 2
+			block[0::2] = array.array('i', keys[i:j])
+			block[1::2] = array.array('i', values[i:j])
+			blocks[high] = block
+			i = j
+		self.__blocks, self.__size = blocks, n
+		if collided and self.__checking == self.CHK_SHOUTING:
+			raise CollisionError
+
+	def __dedup(self, keys, values, repeated):
+		"""Resolves the runs of equal keys in the sorted lists, given
+		the positions repeating their predecessors: either the last
+		value is kept, or the key is dropped as a collision.
+		"""
+		drops, collided = [], False
+		for _, run in itertools.groupby(enumerate(repeated), lambda (i, p) : p - i):
+			run = [p for _, p in run]
+			first, last = run[0] - 1, run[-1]
+			if self.__checking <> self.CHK_IGNORING and len(set(values[first:last + 1])) > 1:
+				self.__collisions.add(keys[first])
+				collided = True
+				drops.append((first, last + 1))
+			else:
+				drops.append((first, last))
+		newKeys, newValues, start = [], [], 0
+		for first, end in drops:
+			newKeys.extend(keys[start:first])
+			newValues.extend(values[start:first])
+			start = end
+		newKeys.extend(keys[start:])
+		newValues.extend(values[start:])
+		return newKeys, newValues, collided
+
+	def update(self, other):
+		"""Adds the pairs from a mapping or an iterable of pairs, as if
+		they were assigned one by one.  Unless there are few of them,
+		the blocks are rebuilt at once.  With CHK_SHOUTING,
+		CollisionError is raised after all the pairs are added.
+		Examples:
+		>>> d = HashIntDict({0: 0, 1: -1})
+		>>> d.update({8: -2, 1: 1})
+		>>> sorted(d.iteritems())
+		[(0, 0), (1, 1), (8, -2)]
+
+		The other pairs are kept when a collided key is updated:
+		>>> d = HashIntDict({1: 1}, HashIntDict.CHK_SHOUTING)
+		>>> d[1] = 2
+		Traceback (most recent call last):
+			...
+		CollisionError
+		>>> d.update([(i, i) for i in range(2, 100)] + [(1, 5)])
+		Traceback (most recent call last):
+			...
+		CollisionError
+		>>> len(d), 50 in d, d.collisions()
+		(98, True, [1])
+		"""
+		pairs = list(self.__pairs(other))
+		if 16 * len(pairs) < self.__size:
+			for key, value in pairs:
+				self[key] = value
+		else:
+			self.__build(itertools.chain(self.iteritems(), pairs))
+
+	def __convert(self, key):
 		if type(key) <> type(1):
 			key = hash(key)
 		key = key & self.__masks[0]
 		if key > self.__masks[1]:
 			key = key - self.__masks[0] - 1
-		key = int(key)
+		return int(key)
+
+	def __prepkey(self, key):
+		key = self.__convert(key)
 		if self.__checking <> self.CHK_IGNORING and key in self.__collisions:
 			if self.__checking == self.CHK_DELETING:
 				return key, True
@@ -208,6 +652,12 @@ class HashIntDict:
 				raise CollisionError
 		return key, False
 
+	def collisions(self):
+		"""Returns the internal keys found to collide, as a list."""
+		if self.__checking == self.CHK_IGNORING:
+			return []
+		return list(self.__collisions)
+
 	def intkey(self, key):
 		"""Converts the given key to internal key representation
 		and checks for collision.
@@ -281,17 +731,63 @@ class HashIntDict:
 		except KeyError:
 			return default
 
+	def __findmany(self, keys):
+		"""Yields the indices of the given keys together with their
+		blocks and positions, for the keys present in the dictionary.
+		The keys are grouped by block and searched with bisection.
+		"""
+		byBlock = {}
+		for i, key in enumerate(keys):
+			key, collision = self.__prepkey(key)
+			if not collision:
+				byBlock.setdefault(key >> self.BLOCKBITS, []).append((key, i))
+		for high, queries in byBlock.iteritems():
+			block = self.__blocks.get(high)
+			if not block:
+				continue
+			blockKeys = block[::2]
+			for key, i in queries:
+				p = bisect.bisect_left(blockKeys, key)
+				if p < len(blockKeys) and blockKeys[p] == key:
+					yield i, block, p
+
+	def containsmany(self, keys):
+		"""Tests which of the given keys are in the dictionary.
+		Returns a list of booleans.  Examples:
+		>>> d = HashIntDict({0: 0, 1: -1, 8: -2})
+		>>> d.containsmany([8, 2, 0, 1 << 20])
+		[True, False, True, False]
+		"""
+		result = [False] * len(keys)
+		for i, _, _ in self.__findmany(keys):
+			result[i] = True
+		return result
+
+	def getmany(self, keys, default = None):
+		"""Gets the values of the given keys, or the default for the
+		missing ones.  Returns a list.  Examples:
+		>>> d = HashIntDict({0: 0, 1: -1, 8: -2})
+		>>> d.getmany(array.array('i', [8, 2, 0]))
+		[-2, None, 0]
+		"""
+		result = [default] * len(keys)
+		for i, block, p in self.__findmany(keys):
+			result[i] = block[2*p + 1]
+		return result
+
 	def iteritems(self):
-		for key in self:
-			yield key, self[key]
+		for block in self.__blocks.values():
+			for p in xrange(0, len(block), 2):
+				yield block[p], block[p + 1]
 
 	def iterkeys(self):
 		for key in self:
 			yield key
 
 	def itervalues(self):
-		for key in self:
-			yield self[key]
+		for block in self.__blocks.values():
+			for p in xrange(1, len(block), 2):
+				yield block[p]
 
 	def __contains__(self, key):
 		"""Tests whether a key is in the dictionary.  Examples:
@@ -332,6 +828,7 @@ class HashIntDict:
 			raise KeyError, key
 		block.pop(2*p)
 		block.pop(2*p)
+		self.__size -= 1
 
 	def __getitem__(self, key):
 		"""Gets a value from the dictionary.  Examples:
@@ -381,10 +878,18 @@ class HashIntDict:
 		>>> len(d)
 		3
 		"""
-		result = 0
-		for b in self.__blocks:
-			result += len(self.__blocks[b]) // 2
-		return result
+		return self.__size
+
+	def __sizeof__(self):
+		"""Returns the approximate number of bytes used by the
+		dictionary.  Examples:
+		>>> HashIntDict(zip(xrange(100000), xrange(100000))).__sizeof__() < 100000 * 10
+		True
+		"""
+		size = sys.getsizeof(self.__blocks) + sum([sys.getsizeof(block) for block in self.__blocks.itervalues()])
+		if self.__checking:
+			size += self.__collisions.__sizeof__()
+		return size
 
 	def __repr__(self):
 		"""Returns the "official" string representation of the dictionary."""
@@ -442,31 +947,536 @@ class HashIntDict:
 		if p == n:
 			block.append(key)
 			block.append(value)
+			self.__size += 1
 		elif block[2*p] == key:
 			if self.__checking == self.CHK_IGNORING:
 				block[2*p + 1] = value
 			elif block[2*p + 1] <> value:
-				self.__collisions.add(key)
 				del self[key]
+				self.__collisions.add(key)
 				if self.__checking == self.CHK_SHOUTING:
 					raise CollisionError
 		else:
 			block.insert(2*p, value)
 			block.insert(2*p, key)
+			self.__size += 1
+
+	def __str__(self):
+		"""Returns an "informal" string representation of the dictionary."""
+		result, count = '', 0
+		for k, v in self.iteritems():
+			if count > 0:
+				result += ', '
+			if count == 100:
+				result += '...'
+				break
+			result += str(k) + ': ' + str(v)
+			count += 1
+		return '{' + result + '}'
+
+class OpenHashIntDict:
+	"""A dictionary-like structure with object hashes as keys
+	and integers as values, like HashIntDict.  Implemented as
+	an open-addressing hash table with linear probing over two
+	integer arrays, so that insertions take amortized constant
+	time instead of shifting a sorted block.
+	"""
+
+	TYPECODE = 'l'
+	MINBITS = 3
+	FIBONACCI = 0x9E3779B97F4A7C15
+
+	CHK_IGNORING = HashIntDict.CHK_IGNORING
+	CHK_DELETING = HashIntDict.CHK_DELETING
+	CHK_SHOUTING = HashIntDict.CHK_SHOUTING
+
+	def __init__(self, dictionary = {}, checking = 0):
+		"""Initializes the dictionary.  Examples:
+		>>> d = OpenHashIntDict()
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2})
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2}, OpenHashIntDict.CHK_DELETING)
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2}, OpenHashIntDict.CHK_SHOUTING)
+		"""
+		# Keys are Python integers or hashes, which fit in a C long.
+		# The smallest one marks empty slots; a key equal to it is
+		# stored as the next one, and so it collides with it.
+		self.__empty = -sys.maxint - 1
+		self.__checking = checking
+		if checking <> self.CHK_IGNORING:
+			self.__collisions = set()
+		self.__keys = array.array(self.TYPECODE)
+		self.__values = array.array(self.TYPECODE)
+		self.__size = 0
+		self.__resize(1 << self.MINBITS)
+		self.update(dictionary)
+
+	def update(self, other):
+		"""Adds the pairs from a mapping or an iterable of pairs, as if
+		they were assigned one by one.  The table is resized once
+		beforehand.  With CHK_SHOUTING, CollisionError is raised after
+		all the pairs are added.  Examples:
+		>>> d = OpenHashIntDict([(0, 0), (1, -1)])
+		>>> d.update({8: -2, 1: 1})
+		>>> sorted(d.iteritems())
+		[(0, 0), (1, 1), (8, -2)]
+		"""
+		if hasattr(other, 'iteritems'):
+			other = other.iteritems()
+		pairs = list(other)
+		capacity = len(self.__keys)
+		while 4 * (self.__size + len(pairs)) > 3 * capacity:
+			capacity *= 2
+		if capacity > len(self.__keys):
+			self.__resize(capacity)
+		collided = False
+		for key, value in pairs:
+			try:
+				self[key] = value
+			except CollisionError:
+				collided = True
+		if collided:
+			raise CollisionError
+
+	def __resize(self, capacity):
+		keys, values = self.__keys, self.__values
+		self.__shift = 64 - (capacity.bit_length() - 1)
+		self.__keys = array.array(self.TYPECODE, [self.__empty]) * capacity
+		self.__values = array.array(self.TYPECODE, [0]) * capacity
+		newKeys, newValues, empty = self.__keys, self.__values, self.__empty
+		mask, shift = capacity - 1, self.__shift
+		for i in xrange(len(keys)):
+			key = keys[i]
+			if key == empty:
+				continue
+			p = ((key * self.FIBONACCI) & 0xFFFFFFFFFFFFFFFF) >> shift
+			while newKeys[p] <> empty:
+				p = (p + 1) & mask
+			newKeys[p] = key
+			newValues[p] = values[i]
+
+	def __prepkey(self, key):
+		if type(key) <> type(1):
+			key = hash(key)
+		if key == self.__empty:
+			key += 1
+		if self.__checking <> self.CHK_IGNORING and key in self.__collisions:
+			if self.__checking == self.CHK_DELETING:
+				return key, True
+			else:
+				raise CollisionError
+		return key, False
+
+	def collisions(self):
+		"""Returns the internal keys found to collide, as a list."""
+		if self.__checking == self.CHK_IGNORING:
+			return []
+		return list(self.__collisions)
+
+	def intkey(self, key):
+		"""Converts the given key to internal key representation
+		and checks for collision.  Examples:
+		>>> d = OpenHashIntDict({0: 0}, OpenHashIntDict.CHK_DELETING)
+		>>> d.intkey(-1)
+		(-1, False)
+		>>> d[0] = 1
+		>>> d.intkey(0)
+		(0, True)
+		"""
+		return self.__prepkey(key)
+
+	def __home(self, key):
+		return ((key * self.FIBONACCI) & 0xFFFFFFFFFFFFFFFF) >> self.__shift
+
+	def __getpos(self, key):
+		"""Returns the slot holding the given key, or the empty slot
+		where it should be inserted.
+		"""
+		keys, empty = self.__keys, self.__empty
+		mask = len(keys) - 1
+		p = ((key * self.FIBONACCI) & 0xFFFFFFFFFFFFFFFF) >> self.__shift
+		while True:
+			k = keys[p]
+			if k == key or k == empty:
+				return p
+			p = (p + 1) & mask
+
+	def get(self, key, default = None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+
+	def containsmany(self, keys):
+		"""Tests which of the given keys are in the dictionary.
+		Returns a list of booleans.  Examples:
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2})
+		>>> d.containsmany([8, 2, 0, 1 << 40])
+		[True, False, True, False]
+		"""
+		return [p is not None for p in self.__findmany(keys)]
+
+	def getmany(self, keys, default = None):
+		"""Gets the values of the given keys, or the default for the
+		missing ones.  Returns a list.  Examples:
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2})
+		>>> d.getmany(array.array('l', [8, 2, 0]))
+		[-2, None, 0]
+		"""
+		values = self.__values
+		return [default if p is None else values[p] for p in self.__findmany(keys)]
+
+	def __findmany(self, keys):
+		table, empty, shift = self.__keys, self.__empty, self.__shift
+		mask = len(table) - 1
+		result = []
+		for key in keys:
+			key, collision = self.__prepkey(key)
+			if collision:
+				result.append(None)
+				continue
+			p = ((key * self.FIBONACCI) & 0xFFFFFFFFFFFFFFFF) >> shift
+			while table[p] <> key and table[p] <> empty:
+				p = (p + 1) & mask
+			result.append(p if table[p] == key else None)
+		return result
+
+	def iteritems(self):
+		keys, values, empty = self.__keys, self.__values, self.__empty
+		for p in xrange(len(keys)):
+			if keys[p] <> empty:
+				yield keys[p], values[p]
+
+	def iterkeys(self):
+		return iter(self)
+
+	def itervalues(self):
+		keys, values, empty = self.__keys, self.__values, self.__empty
+		for p in xrange(len(keys)):
+			if keys[p] <> empty:
+				yield values[p]
+
+	def __contains__(self, key):
+		"""Tests whether a key is in the dictionary.  Examples:
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2})
+		>>> 0 in d
+		True
+		>>> -1 in d
+		False
+		"""
+		key, collision = self.__prepkey(key)
+		if collision:
+			return False
+		return self.__keys[self.__getpos(key)] == key
+
+	def __delitem__(self, key):
+		"""Deletes a key from the dictionary.  The following entries
+		of the probe sequence are shifted back, so no tombstones are
+		left behind.  Examples:
+		>>> d = OpenHashIntDict()
+		>>> for i in xrange(1000): d[i] = i
+		>>> for i in xrange(0, 1000, 3): del d[i]
+		>>> len(d), 3 in d, 4 in d, d[998]
+		(666, False, True, 998)
+		>>> del d[-1]
+		Traceback (most recent call last):
+			...
+		KeyError: -1
+		"""
+		key, _ = self.__prepkey(key)
+		keys, values, empty = self.__keys, self.__values, self.__empty
+		p = self.__getpos(key)
+		if keys[p] <> key:
+			raise KeyError, key
+		mask = len(keys) - 1
+		q = p
+		while True:
+			q = (q + 1) & mask
+			k = keys[q]
+			if k == empty:
+				break
+			h = self.__home(k)
+			if (q > p and (h <= p or h > q)) or (q < p and h <= p and h > q):
+				keys[p] = k
+				values[p] = values[q]
+				p = q
+		keys[p] = empty
+		self.__size -= 1
+
+	def __getitem__(self, key):
+		"""Gets a value from the dictionary.  Examples:
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2, 'Foo': 3})
+		>>> d[8], d['Foo']
+		(-2, 3)
+		>>> d[-1]
+		Traceback (most recent call last):
+			...
+		KeyError: -1
+		"""
+		key, collision = self.__prepkey(key)
+		if collision:
+			return None
+		p = self.__getpos(key)
+		if self.__keys[p] <> key:
+			raise KeyError, key
+		return self.__values[p]
+
+	def __iter__(self):
+		"""Iterates over the keys of the dictionary.  Examples:
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2})
+		>>> s = 0
+		>>> for k in d: s += d[k]
+		>>> s
+		-3
+		>>> d = OpenHashIntDict()
+		>>> for i in xrange(2000): d[i] = i*i
+		>>> sorted([i for i in d if i*i in d]) == range(45)
+		True
+		"""
+		keys, empty = self.__keys, self.__empty
+		for p in xrange(len(keys)):
+			if keys[p] <> empty:
+				yield keys[p]
+
+	def __len__(self):
+		"""Returns the number of pairs in the dictionary.  Examples:
+		>>> d = OpenHashIntDict({0: 0, 1: -1, 8: -2})
+		>>> len(d)
+		3
+		"""
+		return self.__size
+
+	def __sizeof__(self):
+		"""Returns the approximate number of bytes used by the
+		dictionary.  Examples:
+		>>> OpenHashIntDict(zip(xrange(100000), xrange(100000))).__sizeof__() < 100000 * 48
+		True
+		"""
+		size = sys.getsizeof(self.__keys) + sys.getsizeof(self.__values)
+		if self.__checking:
+			size += sys.getsizeof(self.__collisions)
+		return size
+
+	def __repr__(self):
+		"""Returns the "official" string representation of the dictionary."""
+		return 'OpenHashIntDict(' + str(self) + ')'
+
+	def __setitem__(self, key, value):
+		"""Attempts to add a key-value pair to the dictionary.
+		Collisions are handled as in HashIntDict.
+
+		Examples for a dictionary with CHK_IGNORING (default):
+		>>> di = OpenHashIntDict({0: 0, 1: -1, 8: -2, -4: 1, 'Foo': 1})
+		>>> di[1] = 1
+		>>> di[1]
+		1
+
+		Examples for a dictionary with CHK_DELETING:
+		>>> dd = OpenHashIntDict({0: 0, 1: -1, 8: -2}, OpenHashIntDict.CHK_DELETING)
+		>>> dd[8] = -2
+		>>> 8 in dd
+		True
+		>>> dd[1] = 1
+		>>> 1 in dd, len(dd)
+		(False, 2)
+		>>> dd[1] = -1
+		>>> 1 in dd
+		False
+
+		Examples for a dictionary with CHK_SHOUTING; the error carries
+		the internal key and the value removed, when there is one:
+		>>> ds = OpenHashIntDict({0: 0, 1: -1, 8: -2}, OpenHashIntDict.CHK_SHOUTING)
+		>>> ds[1] = 1
+		Traceback (most recent call last):
+			...
+		CollisionError: (1, -1)
+		>>> ds[1] = 2
+		Traceback (most recent call last):
+			...
+		CollisionError
+		"""
+		key, collision = self.__prepkey(key)
+		if collision:
+			return
+		keys, empty = self.__keys, self.__empty
+		mask = len(keys) - 1
+		p = ((key * self.FIBONACCI) & 0xFFFFFFFFFFFFFFFF) >> self.__shift
+		while keys[p] <> key and keys[p] <> empty:
+			p = (p + 1) & mask
+		if keys[p] == key:
+			if self.__checking == self.CHK_IGNORING:
+				self.__values[p] = value
+			elif self.__values[p] <> value:
+				removed = self.__values[p]
+				del self[key]
+				self.__collisions.add(key)
+				if self.__checking == self.CHK_SHOUTING:
+					raise CollisionError(key, removed)
+			return
+		if 4 * (self.__size + 1) > 3 * len(keys):
+			self.__resize(2 * len(keys))
+			p = self.__getpos(key)
+		self.__keys[p] = key
+		self.__values[p] = value
+		self.__size += 1
 
 	def __str__(self):
 		"""Returns an "informal" string representation of the dictionary."""
 		result, count = '', 0
-		for k in self:
+		for k, v in self.iteritems():
 			if count > 0:
 				result += ', '
 			if count == 100:
 				result += '...'
 				break
-			result += str(k) + ': ' + str(self[k])
+			result += str(k) + ': ' + str(v)
 			count += 1
 		return '{' + result + '}'
 
+class MappedIntDict:
+	"""A read-only dictionary-like structure with integers or object
+	hashes as keys and integers as values, stored in a file and
+	accessed through mmap, so that opening it is instant and processes
+	share one copy through the page cache.  The file holds the pairs
+	of an OpenHashIntDict (or any other such map) as two sorted arrays
+	of C longs, followed by the collided keys.  Only every FENCE-th key
+	is kept in memory, to narrow down the binary search.
+
+	The file is a cache in the machine's native byte order.  Keys
+	are converted as in OpenHashIntDict.  Examples:
+	>>> import tempfile
+	>>> path = tempfile.mktemp()
+	>>> d = OpenHashIntDict(checking = OpenHashIntDict.CHK_SHOUTING)
+	>>> for i in xrange(1000): d[i * 7] = i
+	>>> d['Foo'] = 1000
+	>>> d[7] = 0
+	Traceback (most recent call last):
+		...
+	CollisionError: (7, 1)
+	>>> MappedIntDict.save(path, d)
+	>>> m = MappedIntDict(path, MappedIntDict.CHK_SHOUTING)
+	>>> len(m), m[14], m['Foo'], 15 in m, m.get(-1)
+	(1000, 2, 1000, False, None)
+	>>> m[7]
+	Traceback (most recent call last):
+		...
+	CollisionError
+	>>> sorted(m.iteritems()) == sorted(d.iteritems())
+	True
+	>>> m.close()
+	>>> os.remove(path)
+	"""
+
+	MAGIC = 'MIDX0001'
+	HEADER = struct.Struct('@8sili')
+	ITEM = struct.Struct('@l')
+	FENCE = 128
+
+	CHK_IGNORING = HashIntDict.CHK_IGNORING
+	CHK_DELETING = HashIntDict.CHK_DELETING
+	CHK_SHOUTING = HashIntDict.CHK_SHOUTING
+
+	@staticmethod
+	def save(path, dictionary):
+		"""Writes the pairs and the collisions of the given map to a
+		file.  The file is replaced atomically.
+		"""
+		items = sorted(dictionary.iteritems())
+		collisions = sorted(getattr(dictionary, 'collisions', list)())
+		keys = array.array('l', [key for key, _ in items])
+		values = array.array('l', [value for _, value in items])
+		temp = '%s.%d.tmp' % (path, os.getpid())
+		f = open(temp, 'wb')
+		f.write(MappedIntDict.HEADER.pack(MappedIntDict.MAGIC, keys.itemsize, len(keys), len(collisions)))
+		keys.tofile(f)
+		values.tofile(f)
+		array.array('l', collisions).tofile(f)
+		f.close()
+		os.rename(temp, path)
+
+	def __init__(self, path, checking = 0):
+		self.__file = open(path, 'rb')
+		self.__map = mmap.mmap(self.__file.fileno(), 0, access = mmap.ACCESS_READ)
+		magic, itemsize, self.__size, collisions = self.HEADER.unpack_from(self.__map)
+		if magic <> self.MAGIC or itemsize <> self.ITEM.size:
+			raise Exception, 'Incompatible index file: ' + path
+		self.__keysOffset = self.HEADER.size
+		self.__valuesOffset = self.__keysOffset + self.__size * itemsize
+		collisionsOffset = self.__valuesOffset + self.__size * itemsize
+		self.__checking = checking
+		self.__collisions = set(array.array('l', self.__map[collisionsOffset:collisionsOffset + collisions * itemsize]))
+		self.__fences = array.array('l', [self.__key(p) for p in xrange(0, self.__size, self.FENCE)])
+
+	def close(self):
+		self.__map.close()
+		self.__file.close()
+
+	def __key(self, p):
+		return self.ITEM.unpack_from(self.__map, self.__keysOffset + p * self.ITEM.size)[0]
+
+	def __prepkey(self, key):
+		if type(key) <> type(1):
+			key = hash(key)
+		if key == -sys.maxint - 1:
+			key += 1
+		if self.__checking <> self.CHK_IGNORING and key in self.__collisions:
+			if self.__checking == self.CHK_DELETING:
+				return key, True
+			else:
+				raise CollisionError
+		return key, False
+
+	def __getpos(self, key):
+		"""Returns the position of the given key, or None."""
+		f = bisect.bisect_right(self.__fences, key) - 1
+		if f < 0:
+			return None
+		l, r = f * self.FENCE, min((f + 1) * self.FENCE, self.__size)
+		while l < r:
+			m = l + (r - l) // 2
+			t = self.__key(m)
+			if t == key:
+				return m
+			if t < key:
+				l = m + 1
+			else:
+				r = m
+		return None
+
+	def get(self, key, default = None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+
+	def collisions(self):
+		return list(self.__collisions)
+
+	def iteritems(self):
+		for p in xrange(self.__size):
+			yield self.__key(p), self.ITEM.unpack_from(self.__map, self.__valuesOffset + p * self.ITEM.size)[0]
+
+	def __contains__(self, key):
+		key, collision = self.__prepkey(key)
+		if collision:
+			return False
+		return self.__getpos(key) is not None
+
+	def __getitem__(self, key):
+		key, collision = self.__prepkey(key)
+		if collision:
+			return None
+		p = self.__getpos(key)
+		if p is None:
+			raise KeyError, key
+		return self.ITEM.unpack_from(self.__map, self.__valuesOffset + p * self.ITEM.size)[0]
+
+	def __iter__(self):
+		for p in xrange(self.__size):
+			yield self.__key(p)
+
+	def __len__(self):
+		return self.__size
+
 if __name__ == '__main__':
 	import doctest
 	doctest.testmod()
@@ -14,326 +14,341 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import logging, uuid
-
-class BigMemoryPostgresqlRepository:
-
-	def __init__(self, host = None, port = None, database = None, user = None, password = None, cache = False):
-		self.dbHost = host
-		self.dbPort = port
-		self.dbDatabase = database
-		self.dbUser = user
-		self.dbPassword = password
+import array, itertools, logging, time, uuid
+from .repository import PostgresqlRepository, CopyInStream
+from ..memoptpy import OpenHashIntDict
+
+class BigMemoryPostgresqlRepository(PostgresqlRepository):
+	"""Imports the pages, redirects and links into memory, finds the
+	components there and writes the whole network out with COPY when
+	the import finishes.  The pages are kept in columns of typed
+	arrays, with all the titles in one UTF-8 buffer; the links are kept
+	as pairs of page indices and turned into a CSR adjacency for the
+	component pass.
+	"""
+
+	# Tables written when the import finishes, in the order of their
+	# dependencies.
+	COPY_TABLES = (
+		('network_comp', ('key', 'namespace', 'coherent', 'size')),
+		('network_page', ('key', 'lang', 'namespace', 'title', 'redirect_id', 'comp_id')),
+		('network_langlink', ('src_id', 'dst_id', 'comp_id')),
+		('network_categorylink', ('page_id', 'category_id')),
+		('network_pagelink', ('src_id', 'dst_id')),
+	)
+
+	IDBITS = 40
+	NONE = -1
+
+	def __init__(self, host = None, port = None, database = None, user = None, password = None, cache = False, **kwargs):
+		PostgresqlRepository.__init__(self, host, port, database, user, password)
 		self.log = logging.getLogger('BigMemoryPostgresqlRepository')
 
-		self.BLOCK = 16384
-		self.capacity = 1
-		self.size = 1
-		self.keys = [None]
-		self.lnts = [None]
-		self.redirects = [None]
-		self.components = [None]
-		self.langlinks = [None]
-
-		self.byLNT = {}
-		self.byKey = {}
-		self.revRedirects = {}
+		self.langs = []
+		self.langNumbers = {}
+		self.pageLangs = array.array('H')
+		self.pageIds = array.array('l')
+		self.namespaces = array.array('i')
+		self.titles = bytearray()
+		self.titleEnds = array.array('l')
+		self.redirects = array.array('i')
+		self.byKey = OpenHashIntDict()
+		self.byTitle = OpenHashIntDict()
+		self.titleCollisions = {}
+
+		self.links = (array.array('i'), array.array('i'))
+		self.categorylinks = (array.array('i'), array.array('i'))
+		self.pagelinks = (array.array('i'), array.array('i'))
+
+		self.components = None
+		self.compKeys = []
+		self.compRows = []
 
 	def connect(self):
-		args = {}
-		if self.dbHost != None:
-			args['host'] = self.dbHost
-		if self.dbPort != None:
-			args['port'] = self.dbPort
-		if self.dbDatabase != None:
-			args['database'] = self.dbDatabase
-		if self.dbUser != None:
-			args['user'] = self.dbUser
-		if self.dbPassword != None:
-			args['password'] = self.dbPassword
-
-		import psycopg2
-
-		self.conn = psycopg2.connect(**args)
-		self.cursor = self.conn.cursor()
-
-	def disconnect(self):
-		self.cursor.close()
-		self.conn.commit()
-		self.conn.close()
-		(self.cursor, self.conn) = (None, None)
+		PostgresqlRepository.connect(self)
+		self.conn.set_client_encoding('UTF8')
+
+	def flush(self, report = True):
+		pass
+
+	def getFinishedUnits(self):
+		return set()
+
+	def beginUnit(self, table, lang):
+		pass
+
+	def finishUnit(self, table, lang, statements):
+		pass
+
+	def loadCache(self, lang):
+		pass
+
+	def getTitle(self, idx):
+		start = self.titleEnds[idx - 1] if idx else 0
+		return str(self.titles[start:self.titleEnds[idx]])
+
+	def getKey(self, idx):
+		return self.langs[self.pageLangs[idx]] + ':' + str(self.pageIds[idx])
+
+	def findPage(self, key):
+		"""Returns the index of the page with the given key, or None."""
+		lang, id = key.split(':')
+		number = self.langNumbers.get(lang)
+		if number is None:
+			return None
+		return self.byKey.get(number << self.IDBITS | int(id))
+
+	def findTitle(self, number, namespace, title):
+		"""Returns the index of the page with the given language number,
+		namespace and UTF-8 title, or None.  The titles are indexed by
+		their hashes; the few titles whose hashes collide are kept in a
+		side dictionary.
+		"""
+		idx = self.byTitle.get(hash((number, namespace, title)))
+		if idx is not None and self.pageLangs[idx] == number and self.namespaces[idx] == namespace and self.getTitle(idx) == title:
+			return idx
+		return self.titleCollisions.get((number, namespace, title))
 
 	def getPageKey(self, lang, namespace, title):
-		lnt = lang + ":" + namespace + ":" + title.encode('utf-8')
-		if lnt in self.byLNT:
-			idx = self.byLNT[lnt]
-			return self.keys[idx]
-		return None
+		number = self.langNumbers.get(lang)
+		if number is None:
+			return None
+		idx = self.findTitle(number, int(namespace), title.encode('utf-8'))
+		if idx is None:
+			return None
+		return self.getKey(idx)
 
 	def getPage(self, key):
-		if key in self.byKey:
-			idx = self.byKey[key]
-			lnt = self.lnts[idx]
-			lang = key.split(":")[0]
-			namespace = lnt.split(":")[1]
-			title = ":".join(lnt.split(":")[2:])
-			redirect = self.redirects[idx]
-			component = self.components[idx]
-			return {'key': key, 'lang': lang, 'namespace': namespace, 'title': title.decode('utf-8'), 'redirect': redirect, 'component': component}
-		return None
+		idx = self.findPage(key)
+		if idx is None:
+			return None
+		redirect = self.redirects[idx]
+		component = self.compKeys[self.components[idx]] if self.components and self.components[idx] <> self.NONE else None
+		return {'key': key, 'lang': self.langs[self.pageLangs[idx]], 'namespace': str(self.namespaces[idx]), 'title': self.getTitle(idx).decode('utf-8'),
+			'redirect': self.getKey(redirect) if redirect <> self.NONE else None, 'component': component}
 
 	def insertPage(self, lang, id, namespace, title):
-		if self.size == self.capacity:
-			self.keys += self.BLOCK*[None]
-			self.lnts += self.BLOCK*[None]
-			self.redirects += self.BLOCK*[None]
-			self.components += self.BLOCK*[None]
-			self.langlinks += self.BLOCK*[None]
-			self.capacity += self.BLOCK
-
-		key = lang + ':' + id
-		key = intern(key)
-		lnt = lang + ":" + namespace + ":" + title.encode('utf-8')
-		self.byKey[key] = self.size
-		self.byLNT[lnt] = self.size
-
-		self.keys[self.size] = key
-		self.lnts[self.size] = lnt
-		self.redirects[self.size] = None
-		self.components[self.size] = None
-		self.langlinks[self.size] = None
-
-		self.size += 1
+		number = self.langNumbers.get(lang)
+		if number is None:
+			number = self.langNumbers[lang] = len(self.langs)
+			self.langs.append(lang)
+		idx, namespace, title = len(self.pageIds), int(namespace), title.encode('utf-8')
+		self.pageLangs.append(number)
+		self.pageIds.append(int(id))
+		self.namespaces.append(namespace)
+		self.titles.extend(title)
+		self.titleEnds.append(len(self.titles))
+		self.redirects.append(self.NONE)
+		self.byKey[number << self.IDBITS | int(id)] = idx
+
+		titleKey = hash((number, namespace, title))
+		other = self.byTitle.get(titleKey)
+		if other is not None and (self.pageLangs[other] <> number or self.namespaces[other] <> namespace or self.getTitle(other) <> title):
+			self.titleCollisions[(number, namespace, title)] = idx
+		else:
+			self.byTitle[titleKey] = idx
 
 	def insertRedirect(self, fromKey, toKey):
-		if fromKey in self.byKey:
-			idxFrom = self.byKey[fromKey]
-			idxTo = self.byKey[toKey]
-			self.redirects[idxFrom] = toKey
+		idxFrom = self.findPage(fromKey)
+		if idxFrom is not None:
+			self.redirects[idxFrom] = self.findPage(toKey)
 
 	def removeDoubleRedirects(self):
-		sources = {}
-		for i in xrange(1, self.size):
-			if self.redirects[i] != None:
-				sources[self.keys[i]] = True
-		for i in xrange(1, self.size):
-			target = self.redirects[i]
-			if target != None and target in sources:
-				self.redirects[i] = None
-		for i in xrange(1, self.size):
-			if self.redirects[i] != None:
-				j = self.byKey[self.redirects[i]]
-				if not j in self.revRedirects:
-					self.revRedirects[j] = []
-				self.revRedirects[j] += [i]
+		redirects = self.redirects
+		sources = bytearray(len(redirects))
+		for i, target in enumerate(redirects):
+			if target <> self.NONE:
+				sources[i] = 1
+		for i, target in enumerate(redirects):
+			if target <> self.NONE and sources[target]:
+				redirects[i] = self.NONE
+
+	def insertPair(self, pairs, fromKey, toKey):
+		pairs[0].append(self.findPage(fromKey))
+		pairs[1].append(self.findPage(toKey))
 
 	def insertLanglink(self, fromKey, toKey):
-		idxFrom = self.byKey[fromKey]
-		idxTo = self.byKey[toKey]
-		if self.langlinks[idxFrom] == None:
-			self.langlinks[idxFrom] = set()
-		if self.langlinks[idxTo] == None:
-			self.langlinks[idxTo] = set()
-
-		if (-idxTo) in self.langlinks[idxFrom]:
-			self.langlinks[idxFrom] -= set([-idxTo])
-		self.langlinks[idxFrom] |= set([idxTo])
-		if not idxFrom in self.langlinks[idxTo]:
-			self.langlinks[idxTo] |= set([-idxFrom])
+		self.insertPair(self.links, fromKey, toKey)
+
+	def insertPagelink(self, fromKey, toKey):
+		self.insertPair(self.pagelinks, fromKey, toKey)
+
+	def insertCategorylink(self, fromKey, toKey):
+		self.insertPair(self.categorylinks, fromKey, toKey)
+
+	def finishImport(self):
+		self.findConnectedComponents()
+		self.saveNetwork()
+
+	def buildLinks(self):
+		"""Replaces the langlink pairs with their deduplicated compressed
+		sparse row form: the targets of the langlinks of page i are
+		linkTargets[linkOffsets[i]:linkOffsets[i + 1]], sorted.  The
+		links are grouped with a counting sort, and the duplicates are
+		removed page by page, so that only typed arrays span all the
+		links.
+		"""
+		size = len(self.pageIds)
+		sources, targets = self.links
+		offsets = array.array('l', [0]) * (size + 1)
+		for src in sources:
+			offsets[src + 1] += 1
+		for i in xrange(size):
+			offsets[i + 1] += offsets[i]
+		fill = array.array('l', offsets)
+		linkTargets = array.array('i', [0]) * len(sources)
+		for src, dst in itertools.izip(sources, targets):
+			linkTargets[fill[src]] = dst
+			fill[src] += 1
+		self.links = None
+		del fill, sources, targets
+
+		end = 0
+		for i in xrange(size):
+			start, stop = offsets[i], offsets[i + 1]
+			offsets[i] = end
+			if stop - start > 1:
+				neighbours = array.array('i', sorted(set(linkTargets[start:stop])))
+			else:
+				neighbours = linkTargets[start:stop]
+			linkTargets[end:end + len(neighbours)] = neighbours
+			end += len(neighbours)
+		offsets[size] = end
+		del linkTargets[end:]
+		self.linkOffsets, self.linkTargets = offsets, linkTargets
+
+	def iterLinks(self):
+		"""Yields the deduplicated langlinks as (source, target) pairs."""
+		offsets, targets = self.linkOffsets, self.linkTargets
+		for src in xrange(len(offsets) - 1):
+			for j in xrange(offsets[src], offsets[src + 1]):
+				yield src, targets[j]
+
+	def buildAdjacency(self):
+		"""Builds the undirected adjacency of the langlinks and
+		redirects in the compressed sparse row form: the neighbours
+		of page i are adjacency[offsets[i]:offsets[i + 1]].
+		"""
+		size, redirects = len(self.pageIds), self.redirects
+		self.buildLinks()
+
+		offsets = array.array('l', [0]) * (size + 1)
+		for src, dst in self.iterLinks():
+			offsets[src + 1] += 1
+			offsets[dst + 1] += 1
+		for i, target in enumerate(redirects):
+			if target <> self.NONE:
+				offsets[i + 1] += 1
+				offsets[target + 1] += 1
+		for i in xrange(size):
+			offsets[i + 1] += offsets[i]
+
+		fill = array.array('l', offsets)
+		adjacency = array.array('i', [0]) * offsets[size]
+		def connect(a, b):
+			adjacency[fill[a]] = b
+			fill[a] += 1
+			adjacency[fill[b]] = a
+			fill[b] += 1
+		for src, dst in self.iterLinks():
+			connect(src, dst)
+		for i, target in enumerate(redirects):
+			if target <> self.NONE:
+				connect(i, target)
+		return offsets, adjacency
 
 	def findConnectedComponents(self):
-		visited = self.size * [False]
-		for idx in xrange(1, self.size):
-			if visited[idx]:
+		"""Labels the components with one breadth-first pass over the
+		adjacency.  Isolated pages, and components without langlinks,
+		get no component.
+		"""
+		startTime = time.time()
+		size = len(self.pageIds)
+		offsets, adjacency = self.buildAdjacency()
+		labels = array.array('i', [self.NONE]) * size
+		count = 0
+		for start in xrange(size):
+			if labels[start] <> self.NONE or offsets[start] == offsets[start + 1]:
 				continue
-			self.log.debug('start: %s' % self.keys[idx])
-			page = self.getPage(self.keys[idx])
-			cur = self.conn.cursor()
-			if self.langlinks[idx] == None and self.redirects[idx] == None and not idx in self.revRedirects:
-				# This is an isolated page: store it and continue
-				visited[idx] = True
-				cur.execute('INSERT INTO network_page (key, lang, namespace, title, redirect_id, comp_id) VALUES (%s, %s, %s, %s, %s, %s)', (page['key'], page['lang'], page['namespace'], page['title'], page['redirect'], None))
-				cur.close()
+			labels[start] = count
+			queue, head = [start], 0
+			while head < len(queue):
+				node = queue[head]
+				head += 1
+				for j in adjacency[offsets[node]:offsets[node + 1]]:
+					if labels[j] == self.NONE:
+						labels[j] = count
+						queue.append(j)
+			count += 1
+		del offsets, adjacency
+
+		linked = bytearray(count)
+		for src in xrange(size):
+			if self.linkOffsets[src] < self.linkOffsets[src + 1]:
+				linked[labels[src]] = 1
+
+		starts = array.array('l', [0]) * (count + 1)
+		for label in labels:
+			if label <> self.NONE:
+				starts[label + 1] += 1
+		for label in xrange(count):
+			starts[label + 1] += starts[label]
+		fill = array.array('l', starts)
+		members = array.array('i', [0]) * starts[count]
+		for i, label in enumerate(labels):
+			if label <> self.NONE:
+				members[fill[label]] = i
+				fill[label] += 1
+		del fill
+
+		self.compKeys, self.compRows = count * [None], []
+		for label in xrange(count):
+			if not linked[label]:
 				continue
-
-			nodes = set([idx])
-			queue = [idx]
-			links = []
-			while len(queue) > 0:
-				i, queue = queue[0], queue[1:]
-				if self.langlinks[i] != None:
-					for j in self.langlinks[i]:
-						if j > 0:
-							links += [(i, j)]
-						j = abs(j)
-						if j in nodes:
-							continue
-						nodes |= set([j])
-						queue += [j]
-						self.log.debug('through langlink: %s' % self.keys[j])
-				if self.redirects[i] != None:
-					j = self.byKey[self.redirects[i]]
-					if not j in nodes:
-						nodes |= set([j])
-						queue += [j]
-						self.log.debug('through redirect: %s' % self.keys[j])
-				if i in self.revRedirects:
-					for j in self.revRedirects[i]:
-						if not j in nodes:
-							nodes |= set([j])
-							queue += [j]
-							self.log.debug('through rev. redirect: %s' % self.keys[j])
-
-			keys = [self.keys[i] for i in nodes]
-			self.log.debug('keys = %s' % keys)
-			coherent, langs = True, set()
-			for key in keys:
-				p = self.getPage(key)
-				if p['redirect'] != None:
+			nodes = members[starts[label]:starts[label + 1]]
+			keys = [self.getKey(i) for i in nodes]
+			compKey = str(uuid.uuid5(uuid.NAMESPACE_DNS, ''.join(sorted(keys))))
+			coherent, langs, compSize = True, set(), 0
+			for i in nodes:
+				if self.redirects[i] <> self.NONE:
 					continue
-				if p['lang'] in langs:
+				compSize += 1
+				if self.pageLangs[i] in langs:
 					coherent = False
-					break
-				langs |= set([p['lang']])
-
-			comp = None
-			if len(links) > 0:
-				comp = str(uuid.uuid5(uuid.NAMESPACE_DNS, "".join(sorted(keys))))
-
-			for i in nodes:
-				self.components[i] = comp
-
-			size = 0
-			for i in nodes:
-				if self.redirects[i] == None:
-					size += 1
-
-			for i in nodes:
-				visited[i] = True
-
-			# Store the component
-			if comp != None:
-				self.log.info('Storing component %s', comp)
-				cur.execute('INSERT INTO network_comp (key, namespace, coherent, size) VALUES (%s, %s, %s, %s)', (comp, page['namespace'], coherent, size))
-			for i in nodes:
-				p = self.getPage(self.keys[i])
-				key = p['key']
-				lang = p['lang']
-				namespace = p['namespace']
-				title = p['title']
-				redirect = p['redirect']
-				# self.log.debug('page = %s' % p)
-				self.cursor.execute('INSERT INTO network_page (key, lang, namespace, title, redirect_id, comp_id) VALUES (%s, %s, %s, %s, %s, %s)', (key, lang, namespace, title, redirect, comp))
-			for (i, j) in links:
-				fromKey = self.keys[i]
-				toKey = self.keys[j]
-				cur.execute('INSERT INTO network_langlink (src_id, dst_id, comp_id) VALUES (%s, %s, %s)', (fromKey, toKey, comp))
-
-			cur.close()
-			self.conn.commit()
-
-	def insertPagelink(self, fromKey, toKey):
-		self.cursor.execute('INSERT INTO network_pagelink (src_id, dst_id) VALUES (%s, %s)', (fromKey, toKey))
-
-	def insertCategorylink(self, fromKey, toKey):
-		self.cursor.execute('INSERT INTO network_categorylink (page_id, category_id) VALUES (%s, %s)', (fromKey, toKey))
-
-	def getIncoherent(self, lowest = None, highest = None):
-		cur = self.conn.cursor()
-		if not lowest and not highest:
-			cur.execute('SELECT key FROM network_comp WHERE NOT coherent ORDER BY key')
-		elif not highest:
-			cur.execute('SELECT key FROM network_comp WHERE NOT coherent AND size >= %s ORDER BY key', (lowest,))
-		else:
-			cur.execute('SELECT key FROM network_comp WHERE NOT coherent AND size >= %s AND size <= %s ORDER BY key', (lowest,highest))
-		rows = cur.fetchall()
-		cur.close()
-		keys = []
-		if rows == None:
-			return keys
-		for row in rows:
-			keys += [row[0]]
-		return keys
-	
-	def getComponentPages(self, compKey):
-		cur = self.conn.cursor()
-		cur.execute('SELECT key, lang, namespace, title, redirect_id FROM network_page WHERE comp_id = %s', (compKey,))
-		rows = cur.fetchall()
-		cur.close()
-		pages = {}
-		if not rows:
-			return pages
-		for row in rows:
-			pages[row[0]] = {'key': row[0], 'lang': row[1], 'namespace': row[2], 'title': row[3], 'redirect': row[4], 'comp': compKey}
-		return pages
-
-	def getComponentLanglinks(self, compKey):
-		cur = self.conn.cursor()
-		cur.execute('SELECT src_id, dst_id FROM network_langlink WHERE comp_id = %s', (compKey,))
-		rows = cur.fetchall()
-		cur.close()
-		links = []
-		if not rows:
-			return links
-		for row in rows:
-			links += [(row[0], row[1])]
-		return links
-
-	def deletePagePositions(self, compKey):
-		self.cursor.execute('DELETE FROM network_pageposition WHERE comp_id = %s', (compKey,))
-
-	def insertPagePosition(self, pageKey, compKey, position):
-		self.cursor.execute('INSERT INTO network_pageposition (page_id, x, y, z, comp_id) VALUES (%s, %s, %s, %s, %s)', (pageKey, str(position[0]), str(position[1]), str(position[2]), compKey))
-	
-	def getComponentPagePositions(self, compKey):
-		cur = self.conn.cursor()
-		cur.execute('SELECT page_id, x, y, z FROM network_pageposition WHERE comp_id = %s', (compKey,))
-		rows = cur.fetchall()
-		cur.close()
-		pages = {}
-		if not rows:
-			return pages
-		for row in rows:
-			pages[row[0]] = (float(row[1]), float(row[2]), float(row[3]))
-		return pages
-
-	def deletePageMeanings(self, auth, compKey):
-		self.cursor.execute('DELETE FROM network_pagemeaning WHERE comp_id = %s AND auth = %s', (compKey, auth))
-
-	def insertPageMeanings(self, auth, meaningKey, compKey, pageKeys):
-		for pageKey in pageKeys:
-			self.cursor.execute('INSERT INTO network_pagemeaning (auth, page_id, meaning, comp_id) VALUES (%s, %s, %s, %s)', (auth, pageKey, meaningKey, compKey))
-
-	def getComponentPageMeanings(self, compKey, auth):
-		cur = self.conn.cursor()
-		cur.execute('SELECT page_id, meaning FROM network_pagemeaning WHERE comp_id = %s AND auth = %s', (compKey, auth))
-		rows = cur.fetchall()
-		cur.close()
-		pages = {}
-		if not rows:
-			return pages
-		for row in rows:
-			pages[row[0]] = row[1]
-		return pages
-
-	def countCommonCategories(self, aKey, bKey):
-		cur = self.conn.cursor()
-		cur.execute('SELECT COUNT(*) FROM '
-			+ ' ((SELECT dst_id FROM network_langlink WHERE src_id IN (SELECT category_id FROM network_categorylink WHERE page_id = %s))'
-			+ ' INTERSECT (SELECT category_id FROM network_categorylink WHERE page_id = %s)) AS foo',
-			(aKey, bKey))
-		row = cur.fetchone()
-		cur.close()
-		# self.log.debug('Found %s common categories between %s and %s' % (row[0], aKey, bKey))
-		return int(row[0])
-
-	def countCommonLinks(self, aKey, bKey):
-		cur = self.conn.cursor()
-		cur.execute('SELECT COUNT(*) FROM '
-			+ ' ((SELECT dst_id FROM network_langlink WHERE src_id IN (SELECT dst_id FROM network_pagelink WHERE src_id = %s))'
-			+ ' INTERSECT (SELECT dst_id FROM network_pagelink WHERE src_id = %s)) AS foo',
-			(aKey, bKey))
-		row = cur.fetchone()
-		cur.close()
-		# self.log.debug('Found %s common links between %s and %s' % (row[0], aKey, bKey))
-		return int(row[0])
+				langs.add(self.pageLangs[i])
+			self.compKeys[label] = compKey
+			self.compRows.append((compKey, self.namespaces[nodes[0]], coherent, compSize))
+		self.components = labels
+		self.log.info('Found %d components in %.1f s' % (len(self.compRows), time.time() - startTime))
+
+	def iterPageRows(self):
+		for i in xrange(len(self.pageIds)):
+			redirect, label = self.redirects[i], self.components[i]
+			yield (self.getKey(i), self.langs[self.pageLangs[i]], self.namespaces[i], self.getTitle(i),
+				self.getKey(redirect) if redirect <> self.NONE else None, self.compKeys[label] if label <> self.NONE else None)
+
+	def iterLinkRows(self):
+		for src, dst in self.iterLinks():
+			yield self.getKey(src), self.getKey(dst), self.compKeys[self.components[src]]
+
+	def iterPairRows(self, pairs):
+		for src, dst in itertools.izip(*pairs):
+			yield self.getKey(src), self.getKey(dst)
+
+	def copyRows(self, table, rows):
+		startTime = time.time()
+		stream = CopyInStream(rows, self.copyValue)
+		self.cursor.copy_from(stream, table, columns = dict(self.COPY_TABLES)[table])
+		seconds = time.time() - startTime
+		self.log.info('Copied %d rows into %s (%.0f rows/s)' % (stream.count, table, stream.count / seconds if seconds > 0 else 0.0))
+
+	def saveNetwork(self):
+		"""Writes out the whole network in one transaction, so that the
+		deferred foreign keys are checked once, at the end.
+		"""
+		self.copyRows('network_comp', self.compRows)
+		self.copyRows('network_page', self.iterPageRows())
+		self.copyRows('network_langlink', self.iterLinkRows())
+		self.copyRows('network_categorylink', self.iterPairRows(self.categorylinks))
+		self.copyRows('network_pagelink', self.iterPairRows(self.pagelinks))
+		self.commit()
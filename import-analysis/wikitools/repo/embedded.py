@@ -0,0 +1,256 @@
+# Interwiki analysis tools
+# Copyright (C) 2007-2011  Lukasz Bolikowski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging, re, sqlite3, time
+from .repository import PostgresqlRepository, CopyOutStream
+
+class SqliteCursor:
+	"""A cursor accepting the %s parameter markers of psycopg2, so that
+	the queries of PostgresqlRepository can be run on SQLite.
+	"""
+
+	def __init__(self, cursor):
+		self.cursor = cursor
+
+	def execute(self, query, params = ()):
+		self.cursor.execute(query.replace('%s', '?'), params)
+
+	def executemany(self, query, rows):
+		self.cursor.executemany(query.replace('%s', '?'), rows)
+
+	def fetchone(self):
+		return self.cursor.fetchone()
+
+	def fetchmany(self, size):
+		return self.cursor.fetchmany(size)
+
+	def fetchall(self):
+		return self.cursor.fetchall()
+
+	def __iter__(self):
+		return iter(self.cursor)
+
+	@property
+	def rowcount(self):
+		return self.cursor.rowcount
+
+	def close(self):
+		self.cursor.close()
+
+class SqliteConnection:
+	"""A connection handing out SqliteCursors.  Cursor names, which ask
+	psycopg2 for server-side cursors, are ignored.
+	"""
+
+	def __init__(self, conn):
+		self.conn = conn
+
+	def cursor(self, name = None):
+		return SqliteCursor(self.conn.cursor())
+
+	def commit(self):
+		self.conn.commit()
+
+	def close(self):
+		self.conn.close()
+
+class SqliteRepository(PostgresqlRepository):
+	"""A repository in a single SQLite file, for batch runs on one
+	machine without a database server.  The schema is the one of
+	schema.sql, with 'lang:id' page keys, and is created on the first
+	connection.  The file is kept in WAL mode, so that the analysis
+	can read it while another process writes.  The staging tables
+	and the index deferral of the fast PostgreSQL imports are not
+	supported.
+	"""
+
+	SCHEMA = (
+		'CREATE TABLE IF NOT EXISTS network_comp (key varchar(36) NOT NULL PRIMARY KEY, namespace integer NOT NULL, coherent boolean NULL, size integer NULL)',
+		'CREATE TABLE IF NOT EXISTS network_page (key varchar(32) NOT NULL PRIMARY KEY, lang varchar(16) NOT NULL, namespace integer NOT NULL, '
+			+ ' title varchar(1024) NOT NULL, redirect_id varchar(32) NULL, comp_id varchar(36) NULL)',
+		'CREATE TABLE IF NOT EXISTS network_langlink (id integer PRIMARY KEY, src_id varchar(32) NOT NULL, dst_id varchar(32) NOT NULL, comp_id varchar(36) NULL)',
+		'CREATE TABLE IF NOT EXISTS network_pagelink (id integer PRIMARY KEY, src_id varchar(32) NOT NULL, dst_id varchar(32) NOT NULL)',
+		'CREATE TABLE IF NOT EXISTS network_categorylink (id integer PRIMARY KEY, page_id varchar(32) NOT NULL, category_id varchar(32) NOT NULL)',
+		'CREATE TABLE IF NOT EXISTS network_path (id integer PRIMARY KEY, src_id varchar(32) NOT NULL, dst_id varchar(32) NOT NULL, length integer NOT NULL, '
+			+ ' serialized text NOT NULL, comp_id varchar(36) NOT NULL)',
+		'CREATE TABLE IF NOT EXISTS network_pageposition (id integer PRIMARY KEY, page_id varchar(32) NOT NULL, x double precision NULL, y double precision NULL, '
+			+ ' z double precision NULL, comp_id varchar(36) NOT NULL)',
+		'CREATE TABLE IF NOT EXISTS network_pagemeaning (id integer PRIMARY KEY, auth varchar(30) NOT NULL, page_id varchar(32) NOT NULL, meaning varchar(36) NOT NULL, '
+			+ ' comp_id varchar(36) NOT NULL)',
+		'CREATE TABLE IF NOT EXISTS network_import_progress (tbl varchar(32) NOT NULL, lang varchar(16) NOT NULL, status varchar(16) NOT NULL, '
+			+ ' statements integer NOT NULL, started timestamp NULL, finished timestamp NULL, PRIMARY KEY (tbl, lang))',
+		'CREATE INDEX IF NOT EXISTS network_page_redirect_id ON network_page (redirect_id)',
+		'CREATE INDEX IF NOT EXISTS network_page_comp_id ON network_page (comp_id)',
+		'CREATE INDEX IF NOT EXISTS network_page_lang_title ON network_page (lang, title)',
+		'CREATE INDEX IF NOT EXISTS network_langlink_src_id ON network_langlink (src_id)',
+		'CREATE INDEX IF NOT EXISTS network_langlink_dst_id ON network_langlink (dst_id)',
+		'CREATE INDEX IF NOT EXISTS network_langlink_comp_id ON network_langlink (comp_id)',
+		'CREATE INDEX IF NOT EXISTS network_pagelink_src_id ON network_pagelink (src_id)',
+		'CREATE INDEX IF NOT EXISTS network_categorylink_page_id ON network_categorylink (page_id)',
+		'CREATE INDEX IF NOT EXISTS network_pageposition_comp_id ON network_pageposition (comp_id)',
+		'CREATE INDEX IF NOT EXISTS network_pagemeaning_comp_id ON network_pagemeaning (comp_id, auth)',
+	)
+
+	# Tables copied by importFrom, in the order of their dependencies.
+	MIGRATED_TABLES = (
+		('network_comp', ('key', 'namespace', 'coherent', 'size')),
+		('network_page', ('key', 'lang', 'namespace', 'title', 'redirect_id', 'comp_id')),
+		('network_langlink', ('src_id', 'dst_id', 'comp_id')),
+		('network_pagelink', ('src_id', 'dst_id')),
+		('network_categorylink', ('page_id', 'category_id')),
+		('network_path', ('src_id', 'dst_id', 'length', 'serialized', 'comp_id')),
+		('network_pageposition', ('page_id', 'x', 'y', 'z', 'comp_id')),
+		('network_pagemeaning', ('auth', 'page_id', 'meaning', 'comp_id')),
+	)
+
+	# Columns of the migrated tables holding page keys, besides the key
+	# of network_page.
+	PAGE_KEY_COLUMNS = ('redirect_id', 'src_id', 'dst_id', 'page_id', 'category_id')
+
+	# Parameters per statement, below the default limit of SQLite.
+	MAX_VARIABLES = 900
+
+	EXPORT_PAGES = 'SELECT substr(key, 1, instr(key, \':\') - 1), substr(key, instr(key, \':\') + 1) FROM network_page'
+	EXPORT_REDIRECTS = ('SELECT substr(key, 1, instr(key, \':\') - 1), substr(key, instr(key, \':\') + 1), '
+		+ ' substr(redirect_id, 1, instr(redirect_id, \':\') - 1), substr(redirect_id, instr(redirect_id, \':\') + 1) '
+		+ ' FROM network_page WHERE redirect_id IS NOT NULL')
+	EXPORT_LANGLINKS = ('SELECT substr(src_id, 1, instr(src_id, \':\') - 1), substr(src_id, instr(src_id, \':\') + 1), '
+		+ ' substr(dst_id, 1, instr(dst_id, \':\') - 1), substr(dst_id, instr(dst_id, \':\') + 1) '
+		+ ' FROM network_langlink')
+
+	def __init__(self, path, cache = False, acFreq = 32768, bulk = False, bulkChunk = 65536, indexDir = None, timeout = 60.0):
+		PostgresqlRepository.__init__(self, cache = cache, acFreq = acFreq, bulk = bulk, bulkChunk = bulkChunk, indexDir = indexDir)
+		self.log = logging.getLogger('SqliteRepository')
+		self.path = path
+		self.timeout = timeout
+
+	def connect(self):
+		startTime = time.time()
+		conn = sqlite3.connect(self.path, self.timeout)
+		conn.text_factory = str
+		conn.create_function('now', 0, lambda: time.strftime('%Y-%m-%d %H:%M:%S'))
+		conn.execute('PRAGMA journal_mode = WAL')
+		conn.execute('PRAGMA synchronous = NORMAL')
+		for statement in self.SCHEMA:
+			conn.execute(statement)
+		conn.commit()
+		self.conn = SqliteConnection(conn)
+		self.cursor = self.conn.cursor()
+		self.addTime('connect', startTime)
+
+	# Messages of the sqlite3.OperationalErrors worth retrying; the
+	# others, e.g. syntax errors or missing tables, are not transient.
+	TRANSIENT_ERRORS = ('database is locked', 'disk I/O error')
+
+	def isConnectionError(self, error):
+		if not isinstance(error, sqlite3.OperationalError):
+			return False
+		message = str(error)
+		return any([transient in message for transient in self.TRANSIENT_ERRORS])
+
+	def getTitles(self, keys):
+		"""Returns the (key, title) pairs of the pages with the given
+		keys.  SQLite has no arrays, so the keys are passed in chunks of
+		at most MAX_VARIABLES parameters.
+
+		>>> repo = SqliteRepository(':memory:', cache = True)
+		>>> repo.connect()
+		>>> repo.insertPage('en', '1', 0, 'Cat')
+		>>> repo.insertPage('en', '2', 0, 'Cat')
+		>>> repo.insertPage('en', '3', 0, 'Dog')
+		>>> repo.getPageKey('en', 0, 'Cat') in ('en:1', 'en:2'), repo.getPageKey('en', 0, 'Dog')
+		(True, 'en:3')
+		>>> sorted(repo.getTitles(['en:%d' % id for id in xrange(1, 2000)]))
+		[('en:1', 'Cat'), ('en:2', 'Cat'), ('en:3', 'Dog')]
+		"""
+		rows = []
+		for start in xrange(0, len(keys), self.MAX_VARIABLES):
+			chunk = keys[start:start + self.MAX_VARIABLES]
+			self.cursor.execute('SELECT key, title FROM network_page WHERE key IN (%s)' % ', '.join(['%s'] * len(chunk)), chunk)
+			rows.extend(self.cursor.fetchall())
+		return rows
+
+	def prepare(self, cursor, name):
+		"""Returns the query itself; the sqlite3 module keeps the
+		compiled statements of the recent queries.
+		"""
+		return re.sub(r'\$\d+', '%s', self.PREPARED[name][0])
+
+	def loadRows(self, table, rows):
+		if table == 'network_redirect_load':
+			self.cursor.executemany('UPDATE network_page SET redirect_id = %s WHERE key = %s', [(toKey, fromKey) for fromKey, toKey in rows])
+			return
+		columns = dict(self.BULK_TABLES + self.LABEL_TABLES)[table]
+		self.cursor.executemany('INSERT INTO %s (%s) VALUES (%s)' % (table, ', '.join(columns), ', '.join(['%s'] * len(columns))), rows)
+
+	def export(self, query, callback):
+		stream = CopyOutStream(self, callback, self.EXPORT_BUFFER)
+		self.cursor.execute(query)
+		while True:
+			rows = self.cursor.fetchmany(self.bulkChunk)
+			if not rows:
+				break
+			stream.write(''.join(['\t'.join(map(str, row)) + '\n' for row in rows]))
+		stream.flush()
+
+	def insertPageMeanings(self, auth, meaningKey, compKey, pageKeys):
+		self.cursor.executemany('INSERT INTO network_pagemeaning (auth, page_id, meaning, comp_id) VALUES (%s, %s, %s, %s)',
+			[(auth, pageKey, meaningKey, compKey) for pageKey in pageKeys])
+		self.checkAutoCommit()
+
+	def buildIndexes(self):
+		"""Updates the statistics of the query planner; the indexes of
+		SQLite are never deferred.
+		"""
+		self.cursor.execute('ANALYZE')
+		self.commit()
+
+	def importFrom(self, source):
+		"""Replaces the contents of this repository with the network
+		tables of a connected PostgreSQL repository, e.g. to compare the
+		results of both backends.  Page keys and languages are
+		converted to the 'lang:id' form and language codes.
+		"""
+		for table, _ in reversed(self.MIGRATED_TABLES):
+			self.cursor.execute('DELETE FROM ' + table)
+		self.commit()
+		for table, columns in self.MIGRATED_TABLES:
+			startTime = time.time()
+			converters = []
+			for column in columns:
+				if column in self.PAGE_KEY_COLUMNS or (table == 'network_page' and column == 'key'):
+					converters.append(source.formatKey)
+				elif column == 'lang':
+					converters.append(source.pyLang)
+				else:
+					converters.append(None)
+			cursor = source.conn.cursor('migrate_' + table)
+			cursor.execute('SELECT %s FROM %s' % (', '.join(columns), table))
+			insert = 'INSERT INTO %s (%s) VALUES (%s)' % (table, ', '.join(columns), ', '.join(['%s'] * len(columns)))
+			count = 0
+			while True:
+				rows = cursor.fetchmany(self.bulkChunk)
+				if not rows:
+					break
+				self.cursor.executemany(insert, [tuple([convert(value) if convert else value for convert, value in zip(converters, row)]) for row in rows])
+				count += len(rows)
+			cursor.close()
+			self.commit()
+			self.log.info('Copied %d rows of %s in %.1f s' % (count, table, time.time() - startTime))
+
+if __name__ == '__main__':
+	import doctest
+	doctest.testmod()
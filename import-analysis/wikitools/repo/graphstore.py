@@ -0,0 +1,349 @@
+# Interwiki analysis tools
+# Copyright (C) 2007-2011  Lukasz Bolikowski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import array, bisect, logging, mmap, os, struct, time
+
+class GraphStore:
+	"""The components of the network in a directory of column files,
+	accessed through mmap.  The pages of every component are stored
+	contiguously, and the langlinks as a CSR adjacency: the links of
+	page i are the entries page-links[i] to page-links[i + 1] of
+	link-targets.  Redirects and link targets are page indexes within
+	the component.  The meta file is written last and marks the store
+	as complete.  The files are in the machine's native byte order.
+	"""
+
+	MAGIC = 'GRPH0001'
+	HEADER = struct.Struct('@8sll')
+	COMP_KEY_SIZE = 36
+
+	# Column files and their array typecodes.  The offset columns
+	# (comp-pages, page-titles, page-links) have one more entry than
+	# their table.
+	COLUMNS = (
+		('comp-keys', 'c'),
+		('comp-sizes', 'i'),
+		('comp-coherent', 'B'),
+		('comp-pages', 'l'),
+		('comp-order', 'i'),
+		('page-langs', 'H'),
+		('page-ids', 'I'),
+		('page-namespaces', 'i'),
+		('page-redirects', 'i'),
+		('page-titles', 'l'),
+		('page-links', 'l'),
+		('link-targets', 'i'),
+		('titles', 'c'),
+	)
+
+	@staticmethod
+	def columnPath(directory, name):
+		return os.path.join(directory, name + '.bin')
+
+	@staticmethod
+	def metaPath(directory):
+		return os.path.join(directory, 'graph.meta')
+
+	def __init__(self, directory):
+		if not os.path.exists(self.metaPath(directory)):
+			raise Exception, 'No complete graph store in ' + directory
+		f = open(self.metaPath(directory), 'rb')
+		magic, self.compCount, self.pageCount = self.HEADER.unpack(f.read(self.HEADER.size))
+		self.langs = f.read().split('\n')
+		f.close()
+		if magic <> self.MAGIC:
+			raise Exception, 'Incompatible graph store: ' + directory
+		self.typecodes = dict(self.COLUMNS)
+		self.files, self.maps = {}, {}
+		for name, _ in self.COLUMNS:
+			self.files[name] = open(self.columnPath(directory, name), 'rb')
+			if os.path.getsize(self.columnPath(directory, name)) > 0:
+				self.maps[name] = mmap.mmap(self.files[name].fileno(), 0, access = mmap.ACCESS_READ)
+			else:
+				self.maps[name] = ''
+		self.order = self.column('comp-order', 0, self.compCount)
+
+	def close(self):
+		for name, _ in self.COLUMNS:
+			if self.maps[name]:
+				self.maps[name].close()
+			self.files[name].close()
+
+	def column(self, name, start, end):
+		"""Returns the entries start to end of a column as an array,
+		copied from the mapping in one piece.
+		"""
+		typecode = self.typecodes[name]
+		size = array.array(typecode).itemsize
+		return array.array(typecode, self.maps[name][start * size:end * size])
+
+	def compKey(self, comp):
+		return self.maps['comp-keys'][comp * self.COMP_KEY_SIZE:(comp + 1) * self.COMP_KEY_SIZE].rstrip()
+
+	def __len__(self):
+		return self.compCount
+
+	def __getitem__(self, i):
+		"""Returns the i-th component key in sorted order, see findComponent."""
+		return self.compKey(self.order[i])
+
+	def findComponent(self, compKey):
+		"""Returns the number of the component with the given key, or None."""
+		i = bisect.bisect_left(self, compKey)
+		if i == self.compCount or self[i] <> compKey:
+			return None
+		return self.order[i]
+
+class GraphStoreWriter:
+	"""Writes a graph store, one component at a time, buffering every
+	column in an array.
+	"""
+
+	REPORT = 100000
+
+	def __init__(self, directory, bufferSize = 65536):
+		self.log = logging.getLogger('GraphStoreWriter')
+		self.directory = directory
+		self.bufferSize = bufferSize
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		if os.path.exists(GraphStore.metaPath(directory)):
+			os.remove(GraphStore.metaPath(directory))
+		self.files, self.buffers = {}, {}
+		for name, typecode in GraphStore.COLUMNS:
+			self.files[name] = open(GraphStore.columnPath(directory, name), 'wb')
+			self.buffers[name] = array.array(typecode)
+		self.langs, self.langNumbers = [], {}
+		self.compKeys = []
+		self.pageCount, self.linkCount, self.titleEnd = 0, 0, 0
+		for name in ('comp-pages', 'page-titles', 'page-links'):
+			self.append(name, 0)
+
+	def append(self, name, value):
+		buffer = self.buffers[name]
+		buffer.append(value)
+		if len(buffer) >= self.bufferSize:
+			self.flushColumn(name)
+
+	def flushColumn(self, name):
+		self.buffers[name].tofile(self.files[name])
+		del self.buffers[name][:]
+
+	def splitKey(self, key):
+		"""Returns the language code and the id of a 'lang:id' page key;
+		writeRepository replaces it with the one of the repository.
+		"""
+		lang, id = key.split(':')
+		return lang, int(id)
+
+	def langNumber(self, lang):
+		if not lang in self.langNumbers:
+			self.langNumbers[lang] = len(self.langs)
+			self.langs.append(lang)
+		return self.langNumbers[lang]
+
+	def addComponent(self, compKey, coherent, size, pages, links):
+		"""Appends a component.  The pages are (key, lang, namespace,
+		title, redirect) tuples, the links (source, target) key pairs.
+		"""
+		if len(compKey) > GraphStore.COMP_KEY_SIZE:
+			raise Exception, 'Component key too long: ' + compKey
+		indexes = {}
+		for i, page in enumerate(pages):
+			indexes[page[0]] = i
+		targets = [[] for page in pages]
+		for fromKey, toKey in links:
+			targets[indexes[fromKey]].append(indexes[toKey])
+		self.buffers['comp-keys'].fromstring(compKey.ljust(GraphStore.COMP_KEY_SIZE))
+		self.append('comp-sizes', size)
+		self.append('comp-coherent', 1 if coherent else 0)
+		for i, (key, lang, namespace, title, redirect) in enumerate(pages):
+			if isinstance(title, unicode):
+				title = title.encode('utf-8')
+			self.append('page-langs', self.langNumber(lang))
+			self.append('page-ids', self.splitKey(key)[1])
+			self.append('page-namespaces', int(namespace))
+			self.append('page-redirects', indexes[redirect] if redirect is not None else -1)
+			self.buffers['titles'].fromstring(title)
+			self.titleEnd += len(title)
+			self.append('page-titles', self.titleEnd)
+			for target in targets[i]:
+				self.append('link-targets', target)
+			self.linkCount += len(targets[i])
+			self.append('page-links', self.linkCount)
+		self.pageCount += len(pages)
+		self.append('comp-pages', self.pageCount)
+		self.compKeys.append(compKey)
+		for name in ('comp-keys', 'titles'):
+			if len(self.buffers[name]) >= self.bufferSize:
+				self.flushColumn(name)
+
+	def close(self):
+		"""Writes the sorted order of the component keys and, last,
+		the meta file.
+		"""
+		order = sorted(xrange(len(self.compKeys)), key = self.compKeys.__getitem__)
+		self.buffers['comp-order'].extend(order)
+		for name, _ in GraphStore.COLUMNS:
+			self.flushColumn(name)
+			self.files[name].close()
+		temp = '%s.%d.tmp' % (GraphStore.metaPath(self.directory), os.getpid())
+		f = open(temp, 'wb')
+		f.write(GraphStore.HEADER.pack(GraphStore.MAGIC, len(self.compKeys), self.pageCount))
+		f.write('\n'.join(self.langs))
+		f.close()
+		os.rename(temp, GraphStore.metaPath(self.directory))
+
+	def writeRepository(self, repository):
+		"""Copies all the components of a connected repository.  The
+		components, pages and langlinks are read in three streams
+		ordered by the component key, and merged.
+		"""
+		startTime = time.time()
+		self.splitKey = repository.splitKey
+		pages = repository.getAllComponentPages()
+		links = repository.getAllComponentLanglinks()
+		page, link = next(pages, None), next(links, None)
+		for compKey, coherent, size in repository.getAllComponents():
+			compPages, compLinks = [], []
+			while page is not None and page[0] == compKey:
+				compPages.append(page[1:])
+				page = next(pages, None)
+			while link is not None and link[0] == compKey:
+				compLinks.append(link[1:])
+				link = next(links, None)
+			self.addComponent(compKey, coherent, size, compPages, compLinks)
+			if len(self.compKeys) % self.REPORT == 0:
+				self.log.info('Stored %d components with %d pages and %d links' % (len(self.compKeys), self.pageCount, self.linkCount))
+		self.close()
+		self.log.info('Stored %d components with %d pages and %d links in %.1f s' % (len(self.compKeys), self.pageCount, self.linkCount, time.time() - startTime))
+
+class GraphStoreRepository:
+	"""Serves the pages and langlinks of the components to the analysis
+	engines from a graph store, without querying the database.  The
+	results (meanings, positions) and the category and link counts
+	are passed on to the given repository.
+	"""
+
+	def __init__(self, directory, repository):
+		self.log = logging.getLogger('GraphStoreRepository')
+		self.store = GraphStore(directory)
+		self.repository = repository
+		self.timeStats = repository.timeStats if repository else None
+
+	def connect(self):
+		self.repository.connect()
+
+	def disconnect(self):
+		self.repository.disconnect()
+
+	def commit(self):
+		self.repository.commit()
+
+	def reconnect(self):
+		self.repository.reconnect()
+
+	def isConnectionError(self, error):
+		return self.repository.isConnectionError(error)
+
+	def formatKey(self, key):
+		return self.repository.formatKey(key)
+
+	def getIncoherent(self, lowest = None, highest = None):
+		"""Filters the components like the queries of the database
+		repositories, where a missing lowest size given with a highest
+		one compares with NULL and matches nothing.
+		"""
+		store = self.store
+		if highest and lowest is None:
+			return []
+		sizes = store.column('comp-sizes', 0, len(store))
+		coherent = store.column('comp-coherent', 0, len(store))
+		keys = []
+		for comp in store.order:
+			if coherent[comp]:
+				continue
+			if not lowest and not highest:
+				pass
+			elif not highest:
+				if sizes[comp] < lowest:
+					continue
+			elif sizes[comp] < lowest or sizes[comp] > highest:
+				continue
+			keys.append(store.compKey(comp))
+		return keys
+
+	def getComponentRange(self, compKey):
+		"""Returns the first and the end page index of a component."""
+		comp = self.store.findComponent(compKey)
+		if comp is None:
+			return 0, 0
+		return tuple(self.store.column('comp-pages', comp, comp + 2))
+
+	def getComponentPages(self, compKey):
+		store, makeKey = self.store, self.repository.makeKey
+		start, end = self.getComponentRange(compKey)
+		langs = store.column('page-langs', start, end)
+		ids = store.column('page-ids', start, end)
+		namespaces = store.column('page-namespaces', start, end)
+		redirects = store.column('page-redirects', start, end)
+		titleEnds = store.column('page-titles', start, end + 1)
+		titles = store.maps['titles'][titleEnds[0]:titleEnds[-1]] if end > start else ''
+		keys = [makeKey(store.langs[langs[i]], ids[i]) for i in xrange(end - start)]
+		pages = {}
+		for i, key in enumerate(keys):
+			pages[key] = {'key': key, 'lang': store.langs[langs[i]], 'namespace': namespaces[i],
+				'title': titles[titleEnds[i] - titleEnds[0]:titleEnds[i + 1] - titleEnds[0]],
+				'redirect': keys[redirects[i]] if redirects[i] >= 0 else None, 'comp': compKey}
+		return pages
+
+	def getComponentLanglinks(self, compKey):
+		store, makeKey = self.store, self.repository.makeKey
+		start, end = self.getComponentRange(compKey)
+		langs = store.column('page-langs', start, end)
+		ids = store.column('page-ids', start, end)
+		linkEnds = store.column('page-links', start, end + 1)
+		targets = store.column('link-targets', linkEnds[0], linkEnds[-1]) if end > start else []
+		keys = [makeKey(store.langs[langs[i]], ids[i]) for i in xrange(end - start)]
+		links = []
+		for i, key in enumerate(keys):
+			for j in xrange(linkEnds[i] - linkEnds[0], linkEnds[i + 1] - linkEnds[0]):
+				links.append((key, keys[targets[j]]))
+		return links
+
+	def deletePagePositions(self, compKey):
+		self.repository.deletePagePositions(compKey)
+
+	def insertPagePosition(self, pageKey, compKey, position):
+		self.repository.insertPagePosition(pageKey, compKey, position)
+
+	def getComponentPagePositions(self, compKey):
+		return self.repository.getComponentPagePositions(compKey)
+
+	def deletePageMeanings(self, auth, compKey):
+		self.repository.deletePageMeanings(auth, compKey)
+
+	def insertPageMeanings(self, auth, meaningKey, compKey, pageKeys):
+		self.repository.insertPageMeanings(auth, meaningKey, compKey, pageKeys)
+
+	def getComponentPageMeanings(self, compKey, auth):
+		return self.repository.getComponentPageMeanings(compKey, auth)
+
+	def countCommonCategories(self, aKey, bKey):
+		return self.repository.countCommonCategories(aKey, bKey)
+
+	def countCommonLinks(self, aKey, bKey):
+		return self.repository.countCommonLinks(aKey, bKey)
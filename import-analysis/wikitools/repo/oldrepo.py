@@ -107,6 +107,18 @@ class OldRepository:
         pass
     def insertCategorylink(self, fromKey, toKey):
         pass
+    def flush(self):
+        pass
+    def getFinishedUnits(self):
+        return set()
+    def beginUnit(self, table, lang):
+        pass
+    def finishUnit(self, table, lang, statements):
+        pass
+    def loadCache(self, lang):
+        pass
+    def finishImport(self):
+        pass
     def deletePagePositions(self, compKey):
         pass
     def insertPagePosition(self, pageKey, compKey, position):
@@ -14,11 +14,119 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import logging, uuid
-from ..memoptpy import HashIntDict, CollisionError
+import array, cPickle, cStringIO, logging, os, time, uuid
+from ..memoptpy import OpenHashIntDict, MappedIntDict, CollisionError
+
+class CopyOutStream:
+	"""A file object receiving the rows of a COPY ... TO STDOUT.  The
+	rows are collected into large buffers, which are handed over to the
+	repository for parsing.
+	"""
+
+	def __init__(self, repository, callback, bufferSize):
+		self.repository = repository
+		self.callback = callback
+		self.bufferSize = bufferSize
+		self.parts, self.size = [], 0
+
+	def write(self, data):
+		self.parts.append(data)
+		self.size += len(data)
+		if self.size >= self.bufferSize:
+			self.flush()
+
+	def flush(self):
+		data = ''.join(self.parts)
+		self.parts, self.size = [], 0
+		if data:
+			self.repository.parseExport(data, self.callback)
+
+class CopyInStream:
+	"""A file object producing the data of a COPY ... FROM STDIN from
+	an iterable of rows, so that whole tables can be copied without
+	buffering them.
+	"""
+
+	def __init__(self, rows, copyValue):
+		self.rows = iter(rows)
+		self.copyValue = copyValue
+		self.buffer = ''
+		self.count = 0
+
+	def read(self, size = -1):
+		parts, length = [self.buffer], len(self.buffer)
+		for row in self.rows:
+			line = '\t'.join([self.copyValue(value) for value in row]) + '\n'
+			parts.append(line)
+			length += len(line)
+			self.count += 1
+			if size >= 0 and length >= size:
+				break
+		data = ''.join(parts)
+		if size < 0:
+			size = len(data)
+		self.buffer = data[size:]
+		return data[:size]
 
 class PostgresqlRepository:
-	def __init__(self, host = None, port = None, database = None, user = None, password = None, cache = False, acFreq = 32768):
+	# Target tables of the bulk loader, in the order they are flushed.
+	# Redirects are copied to a temporary table and applied with a join.
+	BULK_TABLES = (
+		('network_page', ('key', 'lang', 'namespace', 'title')),
+		('network_redirect_load', ('src_id', 'dst_id')),
+		('network_langlink', ('src_id', 'dst_id')),
+		('network_categorylink', ('page_id', 'category_id')),
+		('network_pagelink', ('src_id', 'dst_id')),
+	)
+
+	# Unlogged tables holding raw dump rows for set-based resolution.
+	STAGING_TABLES = (
+		('network_stage_redirect', ('lang', 'src_id', 'namespace', 'title')),
+		('network_stage_langlink', ('lang', 'src_id', 'dst_lang', 'title')),
+		('network_stage_categorylink', ('lang', 'page_id', 'title')),
+	)
+
+	# Temporary tables of the bulk component labeling, see beginComponents.
+	LABEL_TABLES = (
+		('network_comp_load', ('key', 'page_id', 'coherent', 'size')),
+		('network_comp_label_load', ('page_id', 'comp_id')),
+	)
+
+	# Tables of the network schema, in the order of their dependencies.
+	NETWORK_TABLES = ('network_comp', 'network_page', 'network_langlink', 'network_pagelink',
+		'network_categorylink', 'network_path', 'network_pageposition', 'network_pagemeaning')
+
+	# Secondary indexes kept during fast loading, because the import
+	# and the component finder look rows up by them.
+	FAST_LOAD_KEEP = ('network_page_lang_title', 'network_langlink_src_id')
+
+	# Column types of page keys and languages, see IntKeyPostgresqlRepository.
+	KEY_TYPE = 'varchar(32)'
+	LANG_TYPE = 'varchar(16)'
+	COMP_TYPE = 'varchar(36)'
+
+	# Bulk exports of the component finder's input.  Every page key is
+	# exported as two columns, its language and its page id.
+	EXPORT_PAGES = 'SELECT split_part(key, \':\', 1), split_part(key, \':\', 2) FROM network_page'
+	EXPORT_REDIRECTS = ('SELECT split_part(key, \':\', 1), split_part(key, \':\', 2), split_part(redirect_id, \':\', 1), split_part(redirect_id, \':\', 2) '
+		+ ' FROM network_page WHERE redirect_id IS NOT NULL')
+	EXPORT_LANGLINKS = ('SELECT split_part(src_id, \':\', 1), split_part(src_id, \':\', 2), split_part(dst_id, \':\', 1), split_part(dst_id, \':\', 2) '
+		+ ' FROM network_langlink')
+	EXPORT_BUFFER = 1 << 22
+
+	# Number of labeled pages between the progress reports.
+	LABEL_REPORT = 1000000
+
+	# Per-component queries of the analysis, prepared once per
+	# connection, with the types of their parameters.
+	PREPARED = {
+		'network_component_pages': ('SELECT key, lang, namespace, title, redirect_id FROM network_page WHERE comp_id = $1', ('%(comp)s',)),
+		'network_component_langlinks': ('SELECT src_id, dst_id FROM network_langlink WHERE comp_id = $1', ('%(comp)s',)),
+		'network_component_positions': ('SELECT page_id, x, y, z FROM network_pageposition WHERE comp_id = $1', ('%(comp)s',)),
+		'network_component_meanings': ('SELECT page_id, meaning FROM network_pagemeaning WHERE comp_id = $1 AND auth = $2', ('%(comp)s', 'varchar(30)')),
+	}
+
+	def __init__(self, host = None, port = None, database = None, user = None, password = None, cache = False, acFreq = 32768, bulk = False, bulkChunk = 65536, indexDir = None):
 		self.dbHost = host
 		self.dbPort = port
 		self.dbDatabase = database
@@ -26,14 +134,28 @@ class PostgresqlRepository:
 		self.dbPassword = password
 		self.log = logging.getLogger('PostgresqlRepository')
 		self.cache = cache
-		if self.cache:
-			self.keyCache = {}
-			self.redirectCache = {}
-			self.namespaceCache = {}
+		self.keyCache = {}
+		self.redirectCache = {}
+		self.namespaceCache = {}
+		self.indexDir = indexDir
+		self.indexMisses = set()
+		self.collidedTitles = {}
+		self.collidedPending = {}
+		self.cacheStats = {'collided titles': 0, 'fallback hits': 0, 'database fallbacks': 0}
 		self.acCounter = 0
 		self.acFreq = acFreq
+		self.bulk = bulk
+		self.bulkChunk = bulkChunk
+		self.buffers = {}
+		self.loadStats = {}
+		self.exportLangs = []
+		self.exportLangNumbers = {}
+		self.labelStats = None
+		self.prepared = set()
+		self.timeStats = {'connect': [0, 0.0], 'query': [0, 0.0]}
 
-	def connect(self):
+	def openConnection(self):
+		"""Opens a new connection to the database of the repository."""
 		args = {}
 		if self.dbHost != None:
 			args['host'] = self.dbHost
@@ -48,37 +170,177 @@ class PostgresqlRepository:
 
 		import psycopg2
 
-		self.conn = psycopg2.connect(**args)
+		return psycopg2.connect(**args)
+
+	def connect(self):
+		startTime = time.time()
+		self.conn = self.openConnection()
 		self.cursor = self.conn.cursor()
+		if self.bulk:
+			self.conn.set_client_encoding('UTF8')
+			self.cursor.execute('CREATE TEMPORARY TABLE network_redirect_load (src_id %s, dst_id %s) ON COMMIT DELETE ROWS' % (self.KEY_TYPE, self.KEY_TYPE))
+		self.prepared = set()
+		self.addTime('connect', startTime)
+
+	def reconnect(self):
+		"""Drops a broken connection, with its uncommitted work, and
+		opens a new one.
+		"""
+		try:
+			self.conn.close()
+		except Exception:
+			pass
+		(self.cursor, self.conn) = (None, None)
+		self.buffers = {}
+		self.connect()
+
+	def isConnectionError(self, error):
+		"""Tells whether the error means a lost connection, after which
+		the work can be repeated on a new one.
+		"""
+		import psycopg2
+		return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+	def addTime(self, kind, startTime):
+		stats = self.timeStats[kind]
+		stats[0] += 1
+		stats[1] += time.time() - startTime
+
+	def prepare(self, cursor, name):
+		"""Prepares one of the PREPARED queries on first use in this
+		connection, and returns the statement executing it.
+		"""
+		query, types = self.PREPARED[name]
+		if not name in self.prepared:
+			cursor.execute('PREPARE %s (%s) AS %s' % (name, ', '.join(types) % {'comp': self.COMP_TYPE}, query))
+			self.prepared.add(name)
+		return 'EXECUTE %s (%s)' % (name, ', '.join(['%s'] * len(types)))
+
+	def queryPrepared(self, name, params):
+		cur = self.conn.cursor()
+		statement = self.prepare(cur, name)
+		startTime = time.time()
+		cur.execute(statement, params)
+		rows = cur.fetchall()
+		cur.close()
+		self.addTime('query', startTime)
+		return rows
 
 	def disconnect(self):
+		self.flush(False)
 		self.cursor.close()
 		self.conn.commit()
 		self.conn.close()
 		(self.cursor, self.conn) = (None, None)
 
-	def checkAutoCommit(self):
-		self.acCounter += 1
-		if self.acCounter < self.acFreq:
-			return
+	def commit(self):
 		self.acCounter = 0
 		self.cursor.close()
 		self.conn.commit()
 		self.cursor = self.conn.cursor()
 
+	def checkAutoCommit(self):
+		self.acCounter += 1
+		if self.acCounter < self.acFreq:
+			return
+		self.commit()
+
+	def makeKey(self, lang, id):
+		"""Returns the key of a page, in the form stored in the database."""
+		return lang + ':' + str(id)
+
+	def splitKey(self, key):
+		"""Returns the language code and the id of a page key."""
+		lang, id = key.split(':')
+		return lang, int(id)
+
+	def formatKey(self, key):
+		"""Returns a page key in the 'lang:id' form of the output files."""
+		return key
+
+	def dbLang(self, lang, create = False):
+		"""Converts a language code to its database representation."""
+		return lang
+
+	def pyLang(self, value):
+		"""Converts a language read from the database to its code."""
+		return value
+
+	def copyValue(self, value):
+		if value is None:
+			return '\\N'
+		if isinstance(value, unicode):
+			value = value.encode('utf-8')
+		else:
+			value = str(value)
+		return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+	def bufferRow(self, table, row):
+		"""Queues a row for the bulk loader, flushing the table's buffer
+		when it reaches the chunk size.
+		"""
+		buffer = self.buffers.setdefault(table, [])
+		buffer.append(row)
+		if len(buffer) >= self.bulkChunk:
+			self.flushTable(table)
+
+	def flushTable(self, table):
+		rows = self.buffers.pop(table, None)
+		if not rows:
+			return
+		startTime = time.time()
+		self.loadRows(table, rows)
+		self.commit()
+		stats = self.loadStats.setdefault(table, [0, 0.0])
+		stats[0] += len(rows)
+		stats[1] += time.time() - startTime
+
+	def loadRows(self, table, rows):
+		data = cStringIO.StringIO()
+		for row in rows:
+			data.write('\t'.join([self.copyValue(value) for value in row]) + '\n')
+		data.seek(0)
+		self.cursor.copy_from(data, table, columns = dict(self.BULK_TABLES + self.STAGING_TABLES + self.LABEL_TABLES)[table])
+		if table == 'network_redirect_load':
+			self.cursor.execute('UPDATE network_page SET redirect_id = r.dst_id FROM network_redirect_load AS r WHERE network_page.key = r.src_id')
+
+	def flush(self, report = True):
+		"""Writes out all the rows queued by the bulk loader and, if
+		requested, logs the loading speed of every table so far.
+		"""
+		for table, _ in self.BULK_TABLES + self.STAGING_TABLES:
+			self.flushTable(table)
+		if not report:
+			return
+		for table, _ in self.BULK_TABLES + self.STAGING_TABLES:
+			if table in self.loadStats:
+				rows, seconds = self.loadStats[table]
+				self.log.info('Bulk loaded %d rows into %s (%.0f rows/s)' % (rows, table, rows / seconds if seconds > 0 else 0.0))
+		if self.cacheStats['collided titles']:
+			self.log.info('Title cache: %(collided titles)d collided titles, %(fallback hits)d fallback hits, %(database fallbacks)d database fallbacks' % self.cacheStats)
+
 	def getPageKey(self, lang, namespace, title):
-		if self.cache:
+		if not self.cache and self.indexDir and not lang in self.namespaceCache and not lang in self.indexMisses:
+			if not self.openIndex(lang):
+				self.indexMisses.add(lang)
+		if self.cache or lang in self.namespaceCache:
 			dict = lang + '#' + str(namespace)
 			if not dict in self.keyCache:
 				return None
 			try:
-				return lang + ':' + str(self.keyCache[dict][title.encode('utf-8')])
+				return self.makeKey(lang, self.keyCache[dict][title.encode('utf-8')])
 			except KeyError:
 				return None
 			except CollisionError:
 				pass
+			try:
+				id = self.getCollidedPage(dict, title.encode('utf-8'))
+				self.cacheStats['fallback hits'] += 1
+				return None if id is None else self.makeKey(lang, id)
+			except KeyError:
+				self.cacheStats['database fallbacks'] += 1
 		cur = self.conn.cursor()
-		cur.execute('SELECT key FROM network_page WHERE lang = %s AND namespace = %s AND title = %s', (lang, namespace, title))
+		cur.execute('SELECT key FROM network_page WHERE lang = %s AND namespace = %s AND title = %s', (self.dbLang(lang), namespace, title))
 		row = cur.fetchone()
 		cur.close()
 		if not row:
@@ -87,14 +349,14 @@ class PostgresqlRepository:
 
 	def getPage(self, key):
 		if self.cache:
-			lang, id = key.split(':')
+			lang, id = self.splitKey(key)
 			if not lang in self.namespaceCache:
 				return None
 			try:
-				namespace = self.namespaceCache[lang][int(id)]
-				redirect = self.redirectCache[lang].get(int(id))
+				namespace = self.namespaceCache[lang][id]
+				redirect = self.redirectCache[lang].get(id)
 				if redirect is not None:
-					redirect = lang + ':' + str(redirect)
+					redirect = self.makeKey(lang, redirect)
 				return {'key': key, 'lang': lang, 'namespace': namespace, 'title': None, 'redirect': redirect}
 			except KeyError:
 				return None
@@ -106,37 +368,195 @@ class PostgresqlRepository:
 		cur.close()
 		if not row:
 			return None
-		return {'key': key, 'lang': row[0], 'namespace': row[1], 'title': row[2], 'redirect': row[3]}
+		return {'key': key, 'lang': self.pyLang(row[0]), 'namespace': row[1], 'title': row[2], 'redirect': row[3]}
 
-	def insertPage(self, lang, id, namespace, title):
-		if self.cache:
-			dict = lang + '#' + str(namespace)
-			if not dict in self.keyCache:
-				self.keyCache[dict] = HashIntDict(checking = HashIntDict.CHK_SHOUTING)
-				self.namespaceCache[lang] = HashIntDict(checking = HashIntDict.CHK_IGNORING)
-				self.redirectCache[lang] = HashIntDict(checking = HashIntDict.CHK_IGNORING)
+	def cachePage(self, lang, id, namespace, title):
+		dict = lang + '#' + str(namespace)
+		if not dict in self.keyCache:
+			self.keyCache[dict] = OpenHashIntDict(checking = OpenHashIntDict.CHK_SHOUTING)
+		if not lang in self.namespaceCache:
+			self.namespaceCache[lang] = OpenHashIntDict(checking = OpenHashIntDict.CHK_IGNORING)
+			self.redirectCache[lang] = OpenHashIntDict(checking = OpenHashIntDict.CHK_IGNORING)
+
+		## Alternative:
+		# h = hash(title.encode('utf-8')) & ((1 << 31) - 1)
+		# if int(namespace) == 0:
+		# 	h &= -2
+		# else:
+		# 	h |= 1
+
+		try:
+			self.keyCache[dict][title.encode('utf-8')] = int(id)
+		except CollisionError, e:
+			self.addCollision(dict, title.encode('utf-8'), int(id), e.args[1] if e.args else None)
+		self.namespaceCache[lang][int(id)] = int(namespace)
+
+	def addCollision(self, dict, title, id, removedId = None):
+		"""Records a title whose hash collides in the given title map,
+		together with the page whose entry was removed from the map
+		because of it.  The title of that page is read later, see
+		resolveCollisions.
+		"""
+		self.collidedTitles.setdefault(dict, {})[title] = id
+		self.cacheStats['collided titles'] += 1
+		if removedId is not None:
+			self.collidedPending.setdefault(dict, set()).add(removedId)
+
+	def resolveCollisions(self, dict):
+		"""Reads the titles of the pages pending in the given map's
+		collisions, with a single query.
+		"""
+		ids = self.collidedPending.pop(dict, None)
+		if not ids:
+			return
+		lang = dict.split('#')[0]
+		self.flush(False)
+		for key, title in self.getTitles([self.makeKey(lang, id) for id in ids]):
+			if isinstance(title, unicode):
+				title = title.encode('utf-8')
+			self.addCollision(dict, title, self.splitKey(key)[1])
+
+	def getTitles(self, keys):
+		"""Returns the (key, title) pairs of the pages with the given keys."""
+		cur = self.conn.cursor()
+		cur.execute('SELECT key, title FROM network_page WHERE key = ANY(%s)', (keys,))
+		rows = cur.fetchall()
+		cur.close()
+		return rows
 
-			## Alternative:
-			# h = hash(title.encode('utf-8')) & ((1 << 31) - 1)
-			# if int(namespace) == 0:
-			# 	h &= -2
-			# else:
-			# 	h |= 1
+	def getCollidedPage(self, dict, title):
+		"""Returns the id of a page whose title hash collides, or None
+		if there is no such page.  Since all the titles with a collided
+		hash are recorded, the database is consulted only if the
+		collisions of the map are not known (KeyError is raised then).
+		"""
+		self.resolveCollisions(dict)
+		if not dict in self.collidedTitles:
+			raise KeyError, dict
+		return self.collidedTitles[dict].get(title)
 
+	def loadCache(self, lang):
+		"""Fills the caches with the pages of the given language already
+		in the database, e.g. when their import is not repeated.  The
+		title and namespace maps are opened from the index directory if
+		they were saved there, and read from the database otherwise.
+		"""
+		if not self.cache:
+			return
+		if self.indexDir and self.openIndex(lang):
+			self.readCache(lang, True)
+			return
+		self.readCache(lang)
+		if self.indexDir:
+			self.saveIndex(lang)
+
+	def readCache(self, lang, redirectsOnly = False):
+		"""Reads the pages of the given language from the database into
+		the caches, one bulk update per map.
+		"""
+		titles, namespaces, redirects = {}, [], []
+		cursor = self.conn.cursor('cache')
+		if redirectsOnly:
+			cursor.execute('SELECT key, namespace, title, redirect_id FROM network_page WHERE lang = %s AND redirect_id IS NOT NULL', (self.dbLang(lang),))
+		else:
+			cursor.execute('SELECT key, namespace, title, redirect_id FROM network_page WHERE lang = %s', (self.dbLang(lang),))
+		for key, namespace, title, redirect in cursor:
+			id = self.splitKey(key)[1]
+			if redirect is not None:
+				redirects.append((id, self.splitKey(redirect)[1]))
+			if redirectsOnly:
+				continue
+			if isinstance(title, unicode):
+				title = title.encode('utf-8')
+			titles.setdefault(int(namespace), []).append((title, id))
+			namespaces.append((id, int(namespace)))
+		cursor.close()
+		for namespace, pairs in titles.iteritems():
+			dict = lang + '#' + str(namespace)
+			if not dict in self.keyCache:
+				self.keyCache[dict] = OpenHashIntDict(checking = OpenHashIntDict.CHK_SHOUTING)
 			try:
-				self.keyCache[dict][title.encode('utf-8')] = int(id)
-				self.namespaceCache[lang][int(id)] = int(namespace)
+				self.keyCache[dict].update(pairs)
 			except CollisionError:
-				pass
-		key = lang + ':' + id
-		self.cursor.execute('INSERT INTO network_page (key, lang, namespace, title) VALUES (%s, %s, %s, %s)', (key, lang, namespace, title))
+				for title, id in pairs:
+					try:
+						self.keyCache[dict].intkey(title)
+					except CollisionError:
+						self.addCollision(dict, title, id)
+		if not lang in self.namespaceCache:
+			self.namespaceCache[lang] = OpenHashIntDict(checking = OpenHashIntDict.CHK_IGNORING)
+		if not lang in self.redirectCache:
+			self.redirectCache[lang] = OpenHashIntDict(checking = OpenHashIntDict.CHK_IGNORING)
+		if not redirectsOnly:
+			self.namespaceCache[lang].update(namespaces)
+		self.redirectCache[lang].update(redirects)
+		self.log.info('Loaded %d cached pages of %s' % (len(namespaces) or len(redirects), lang))
+
+	def indexPath(self, name):
+		return os.path.join(self.indexDir, name + '.idx')
+
+	def saveIndex(self, lang):
+		"""Writes the title and namespace maps of the given language to
+		the index directory, and replaces them with memory-mapped copies.
+		The collided titles of every title map are pickled beside it.
+		Without caches, the maps are read from the database first.  The
+		namespace map is written last and marks the index as complete.
+		"""
+		startTime = time.time()
+		if not lang in self.namespaceCache:
+			self.readCache(lang)
+		for dict in [d for d in self.keyCache if d.startswith(lang + '#')]:
+			MappedIntDict.save(self.indexPath(dict), self.keyCache[dict])
+			self.keyCache[dict] = MappedIntDict(self.indexPath(dict), MappedIntDict.CHK_SHOUTING)
+			self.resolveCollisions(dict)
+			f = open(os.path.join(self.indexDir, dict + '.collisions'), 'wb')
+			cPickle.dump(self.collidedTitles.get(dict, {}), f, 2)
+			f.close()
+		MappedIntDict.save(self.indexPath(lang), self.namespaceCache[lang])
+		self.namespaceCache[lang] = MappedIntDict(self.indexPath(lang), MappedIntDict.CHK_IGNORING)
+		self.log.info('Saved the index of %d pages of %s in %.1f s' % (len(self.namespaceCache[lang]), lang, time.time() - startTime))
+
+	def openIndex(self, lang):
+		"""Opens the saved title and namespace maps of the given language.
+		Returns False if there is no complete index.
+		"""
+		if not os.path.exists(self.indexPath(lang)):
+			return False
+		for filename in os.listdir(self.indexDir):
+			if filename.startswith(lang + '#') and filename.endswith('.idx'):
+				self.keyCache[filename[:-4]] = MappedIntDict(os.path.join(self.indexDir, filename), MappedIntDict.CHK_SHOUTING)
+			if filename.startswith(lang + '#') and filename.endswith('.collisions'):
+				f = open(os.path.join(self.indexDir, filename), 'rb')
+				self.collidedTitles[filename[:-11]] = cPickle.load(f)
+				f.close()
+		self.namespaceCache[lang] = MappedIntDict(self.indexPath(lang), MappedIntDict.CHK_IGNORING)
+		return True
+
+	def removeIndex(self, lang):
+		if os.path.exists(self.indexPath(lang)):
+			os.remove(self.indexPath(lang))
+		for filename in os.listdir(self.indexDir):
+			if filename.startswith(lang + '#') and (filename.endswith('.idx') or filename.endswith('.collisions')):
+				os.remove(os.path.join(self.indexDir, filename))
+
+	def insertPage(self, lang, id, namespace, title):
+		if self.cache:
+			self.cachePage(lang, id, namespace, title)
+		dbLang = self.dbLang(lang, True)
+		key = self.makeKey(lang, id)
+		if self.bulk:
+			self.bufferRow('network_page', (key, dbLang, namespace, title))
+			return
+		self.cursor.execute('INSERT INTO network_page (key, lang, namespace, title) VALUES (%s, %s, %s, %s)', (key, dbLang, namespace, title))
 		self.checkAutoCommit()
 
 	def insertRedirect(self, fromKey, toKey):
 		if self.cache:
-			fromLang, fromId = fromKey.split(':')
-			toLang, toId = toKey.split(':')
-			self.redirectCache[fromLang][int(fromId)] = int(toId)
+			fromLang, fromId = self.splitKey(fromKey)
+			self.redirectCache[fromLang][fromId] = self.splitKey(toKey)[1]
+		if self.bulk:
+			self.bufferRow('network_redirect_load', (fromKey, toKey))
+			return
 		self.cursor.execute('UPDATE network_page SET redirect_id = %s WHERE key = %s', (toKey, fromKey))
 		self.checkAutoCommit()
 
@@ -150,10 +570,197 @@ class PostgresqlRepository:
 						toRemove += [fromId]
 				for id in toRemove:
 					del curCache[id]
+		self.flush(False)
 		self.cursor.execute('UPDATE network_page SET redirect_id = NULL WHERE key IN (SELECT DISTINCT a.redirect_id AS r FROM (SELECT * FROM network_page WHERE redirect_id IS NOT NULL) AS a JOIN network_page AS b ON (a.redirect_id = b.key) WHERE b.redirect_id IS NOT NULL)')
 		self.checkAutoCommit()
 
+	def finishImport(self):
+		"""Called once all the units of an import are done."""
+		pass
+
+	def getFinishedUnits(self):
+		"""Returns the (table, language) units of the import recorded as
+		finished in network_import_progress.  Units spanning all the
+		languages have None as the language.
+		"""
+		self.cursor.execute('SELECT tbl, lang FROM network_import_progress WHERE status = %s', ('done',))
+		return set([(table, lang or None) for table, lang in self.cursor.fetchall()])
+
+	def beginUnit(self, table, lang):
+		"""Records the start of an import unit.  If a previous run left
+		the unit unfinished, its rows are removed first, so that it can
+		be repeated from the beginning.
+		"""
+		self.flush(False)
+		if table == 'page' and self.indexDir:
+			self.removeIndex(lang)
+		self.cursor.execute('SELECT status FROM network_import_progress WHERE tbl = %s AND lang = %s', (table, lang or ''))
+		row = self.cursor.fetchone()
+		if row and row[0] != 'done':
+			startTime = time.time()
+			self.cleanUnit(table, lang)
+			self.log.info('Removed %d rows of the unfinished %s %s in %.1f s' % (self.cursor.rowcount, table, lang or '', time.time() - startTime))
+		self.cursor.execute('INSERT INTO network_import_progress (tbl, lang, status, statements, started) VALUES (%s, %s, %s, 0, now()) '
+			+ ' ON CONFLICT (tbl, lang) DO UPDATE SET status = EXCLUDED.status, statements = 0, started = now(), finished = NULL',
+			(table, lang or '', 'started'))
+		self.commit()
+
+	def cleanUnit(self, table, lang):
+		if table == 'page':
+			for dict in [d for d in self.keyCache if d.startswith(lang + '#')]:
+				del self.keyCache[dict]
+				self.collidedTitles.pop(dict, None)
+				self.collidedPending.pop(dict, None)
+			self.namespaceCache.pop(lang, None)
+			self.redirectCache.pop(lang, None)
+			self.cursor.execute('DELETE FROM network_page WHERE lang = %s', (self.dbLang(lang),))
+		elif table == 'redirect':
+			if self.cache and lang in self.redirectCache:
+				self.redirectCache[lang] = OpenHashIntDict(checking = OpenHashIntDict.CHK_IGNORING)
+			if lang:
+				self.cursor.execute('UPDATE network_page SET redirect_id = NULL WHERE lang = %s AND redirect_id IS NOT NULL', (self.dbLang(lang),))
+			else:
+				self.cursor.execute('UPDATE network_page SET redirect_id = NULL WHERE redirect_id IS NOT NULL')
+		elif table in ('langlinks', 'categorylinks', 'pagelinks'):
+			linkTable, column = {'langlinks': ('network_langlink', 'src_id'), 'categorylinks': ('network_categorylink', 'page_id'),
+				'pagelinks': ('network_pagelink', 'src_id')}[table]
+			if lang:
+				self.cursor.execute('DELETE FROM %s WHERE %s IN (SELECT key FROM network_page WHERE lang = %%s)' % (linkTable, column), (self.dbLang(lang),))
+			else:
+				self.cursor.execute('DELETE FROM %s' % linkTable)
+
+	def finishUnit(self, table, lang, statements):
+		"""Records an import unit as finished, together with the number
+		of dump statements it consumed.  The pages of a language are
+		then saved in the index directory, if there is one.
+		"""
+		self.flush(False)
+		self.cursor.execute('UPDATE network_import_progress SET status = %s, statements = %s, finished = now() WHERE tbl = %s AND lang = %s',
+			('done', statements, table, lang or ''))
+		self.commit()
+		if table == 'page' and self.indexDir:
+			self.saveIndex(lang)
+
+	def deferIndexes(self, unlogged = False):
+		"""Prepares the network tables for fast loading: drops their
+		foreign keys and secondary indexes (except FAST_LOAD_KEEP), and
+		optionally makes the tables unlogged.  The definitions of the
+		dropped objects are saved in network_deferred_ddl, so that
+		buildIndexes can restore them even from another process.
+		"""
+		self.cursor.execute('CREATE TABLE IF NOT EXISTS network_deferred_ddl (name varchar(128) PRIMARY KEY, kind varchar(16) NOT NULL, tbl varchar(64) NOT NULL, ddl text NOT NULL)')
+		self.cursor.execute('SELECT c.conname, r.relname, pg_get_constraintdef(c.oid) FROM pg_constraint AS c JOIN pg_class AS r ON (r.oid = c.conrelid) '
+			+ ' WHERE c.contype = \'f\' AND r.relname = ANY(%s)', (list(self.NETWORK_TABLES),))
+		for name, table, ddl in self.cursor.fetchall():
+			self.cursor.execute('INSERT INTO network_deferred_ddl (name, kind, tbl, ddl) VALUES (%s, %s, %s, %s)', (name, 'fkey', table, ddl))
+			self.cursor.execute('ALTER TABLE %s DROP CONSTRAINT %s' % (table, name))
+		self.cursor.execute('SELECT indexname, tablename, indexdef FROM pg_indexes WHERE tablename = ANY(%s) AND NOT indexname = ANY(%s) '
+			+ ' AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE contype IN (\'p\', \'u\'))',
+			(list(self.NETWORK_TABLES), list(self.FAST_LOAD_KEEP)))
+		for name, table, ddl in self.cursor.fetchall():
+			self.cursor.execute('INSERT INTO network_deferred_ddl (name, kind, tbl, ddl) VALUES (%s, %s, %s, %s)', (name, 'index', table, ddl))
+			self.cursor.execute('DROP INDEX %s' % name)
+		if unlogged:
+			for table in reversed(self.NETWORK_TABLES):
+				self.cursor.execute('ALTER TABLE %s SET UNLOGGED' % table)
+		self.commit()
+		self.log.info('Deferred the secondary indexes and foreign keys')
+
+	def buildIndexes(self):
+		"""Makes the network tables logged again, rebuilds the indexes
+		saved by deferIndexes and adds and validates the foreign keys.
+		"""
+		self.cursor.execute('SELECT relname FROM pg_class WHERE relpersistence = \'u\' AND relkind = \'r\' AND relname = ANY(%s)', (list(self.NETWORK_TABLES),))
+		unlogged = set([row[0] for row in self.cursor.fetchall()])
+		for table in self.NETWORK_TABLES:
+			if table in unlogged:
+				self.log.info('Making %s logged' % table)
+				self.cursor.execute('ALTER TABLE %s SET LOGGED' % table)
+				self.commit()
+		self.cursor.execute('SELECT name, kind, tbl, ddl FROM network_deferred_ddl ORDER BY kind DESC, tbl, name')
+		rows = self.cursor.fetchall()
+		for i, (name, kind, table, ddl) in enumerate(rows):
+			startTime = time.time()
+			if kind == 'index':
+				self.cursor.execute(ddl)
+			else:
+				self.cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s %s NOT VALID' % (table, name, ddl))
+				self.cursor.execute('ALTER TABLE %s VALIDATE CONSTRAINT %s' % (table, name))
+			self.cursor.execute('DELETE FROM network_deferred_ddl WHERE name = %s', (name,))
+			self.commit()
+			self.log.info('Built %s %s (%d/%d) in %.1f s' % (kind, name, i + 1, len(rows), time.time() - startTime))
+
+	def createStagingTables(self):
+		types = {'key': self.KEY_TYPE, 'lang': self.LANG_TYPE}
+		self.cursor.execute('CREATE UNLOGGED TABLE IF NOT EXISTS network_stage_redirect (lang %(lang)s, src_id %(key)s, namespace integer, title varchar(1024))' % types)
+		self.cursor.execute('CREATE UNLOGGED TABLE IF NOT EXISTS network_stage_langlink (lang %(lang)s, src_id %(key)s, dst_lang %(lang)s, title varchar(1024))' % types)
+		self.cursor.execute('CREATE UNLOGGED TABLE IF NOT EXISTS network_stage_categorylink (lang %(lang)s, page_id %(key)s, title varchar(1024))' % types)
+		for table, _ in self.STAGING_TABLES:
+			self.cursor.execute('TRUNCATE ' + table)
+		self.commit()
+
+	def dropStagingTables(self):
+		for table, _ in self.STAGING_TABLES:
+			self.cursor.execute('DROP TABLE IF EXISTS ' + table)
+		self.commit()
+
+	def stageRedirect(self, lang, fromKey, namespace, title):
+		self.bufferRow('network_stage_redirect', (self.dbLang(lang), fromKey, namespace, title))
+
+	def stageLanglink(self, lang, fromKey, toLang, title):
+		self.bufferRow('network_stage_langlink', (self.dbLang(lang), fromKey, self.dbLang(toLang), title))
+
+	def stageCategorylink(self, lang, fromKey, title):
+		self.bufferRow('network_stage_categorylink', (self.dbLang(lang), fromKey, title))
+
+	def resolveStaged(self, table, sql):
+		self.flush(False)
+		self.cursor.execute('SELECT COUNT(*) FROM ' + table)
+		staged = self.cursor.fetchone()[0]
+		self.cursor.execute('ANALYZE ' + table)
+		self.cursor.execute(sql)
+		self.log.info('Resolved %d of %d rows from %s' % (self.cursor.rowcount, staged, table))
+		self.cursor.execute('TRUNCATE ' + table)
+		self.commit()
+
+	def resolveRedirects(self):
+		"""Applies the staged redirects whose source and target exist
+		in the same namespace.
+		"""
+		self.resolveStaged('network_stage_redirect', 'UPDATE network_page SET redirect_id = t.key '
+			+ ' FROM network_stage_redirect AS s '
+			+ ' JOIN network_page AS f ON (f.key = s.src_id AND f.namespace = s.namespace) '
+			+ ' JOIN network_page AS t ON (t.lang = s.lang AND t.namespace = s.namespace AND t.title = s.title) '
+			+ ' WHERE network_page.key = s.src_id')
+
+	def resolveLanglinks(self):
+		"""Inserts the staged langlinks between existing pages of
+		the same namespace, skipping the ones from redirects and within
+		a language.  Outside the main namespace, the namespace prefix
+		of the target title is dropped.
+		"""
+		self.resolveStaged('network_stage_langlink', 'INSERT INTO network_langlink (src_id, dst_id) '
+			+ ' SELECT f.key, t.key FROM network_stage_langlink AS s '
+			+ ' JOIN network_page AS f ON (f.key = s.src_id AND f.redirect_id IS NULL) '
+			+ ' JOIN network_page AS t ON (t.lang = s.dst_lang AND t.namespace = f.namespace AND t.title = '
+			+ '   CASE WHEN f.namespace = 0 THEN s.title '
+			+ "   WHEN position(':' IN s.title) = 0 THEN '' "
+			+ "   ELSE substr(s.title, position(':' IN s.title) + 1) END) "
+			+ ' WHERE s.dst_lang <> s.lang')
+
+	def resolveCategorylinks(self):
+		"""Inserts the staged categorylinks from existing pages
+		to existing categories.
+		"""
+		self.resolveStaged('network_stage_categorylink', 'INSERT INTO network_categorylink (page_id, category_id) '
+			+ ' SELECT s.page_id, t.key FROM network_stage_categorylink AS s '
+			+ ' JOIN network_page AS f ON (f.key = s.page_id) '
+			+ ' JOIN network_page AS t ON (t.lang = s.lang AND t.namespace = 14 AND t.title = s.title)')
+
 	def insertLanglink(self, fromKey, toKey):
+		if self.bulk:
+			self.bufferRow('network_langlink', (fromKey, toKey))
+			return
 		self.cursor.execute('INSERT INTO network_langlink (src_id, dst_id) VALUES (%s, %s)', (fromKey, toKey))
 		self.checkAutoCommit()
 
@@ -178,7 +785,127 @@ class PostgresqlRepository:
 			yield row
 		cursor.close()
 
+	def getAllComponents(self):
+		"""Yields the key, coherence and size of every component, ordered
+		by the key, like getAllComponentPages and getAllComponentLanglinks.
+		"""
+		cursor = self.conn.cursor('allcomps')
+		cursor.execute('SELECT key, coherent, size FROM network_comp ORDER BY key')
+		for row in cursor:
+			yield str(row[0]), row[1], row[2]
+		cursor.close()
+
+	def getAllComponentPages(self):
+		cursor = self.conn.cursor('allcomppages')
+		cursor.execute('SELECT comp_id, key, lang, namespace, title, redirect_id FROM network_page WHERE comp_id IS NOT NULL ORDER BY comp_id')
+		for row in cursor:
+			yield str(row[0]), row[1], self.pyLang(row[2]), row[3], row[4], row[5]
+		cursor.close()
+
+	def getAllComponentLanglinks(self):
+		cursor = self.conn.cursor('allcomplinks')
+		cursor.execute('SELECT comp_id, src_id, dst_id FROM network_langlink WHERE comp_id IS NOT NULL ORDER BY comp_id')
+		for row in cursor:
+			yield str(row[0]), row[1], row[2]
+		cursor.close()
+
+	def exportPageKeys(self, callback):
+		"""Exports the keys of all the pages with COPY, and passes them
+		to the callback in chunks.  See parseExport.
+		"""
+		self.export(self.EXPORT_PAGES, callback)
+
+	def exportRedirects(self, callback):
+		"""Exports the (source, target) key pairs of all the redirects."""
+		self.export(self.EXPORT_REDIRECTS, callback)
+
+	def exportLangLinks(self, callback):
+		"""Exports the (source, target) key pairs of all the langlinks."""
+		self.export(self.EXPORT_LANGLINKS, callback)
+
+	def export(self, query, callback):
+		stream = CopyOutStream(self, callback, self.EXPORT_BUFFER)
+		self.cursor.copy_expert('COPY (%s) TO STDOUT' % query, stream)
+		stream.flush()
+
+	def parseExport(self, data, callback):
+		"""Parses complete rows of (language, id) column pairs into
+		columns: an array('i') of language numbers, then an array('l')
+		of page ids, and so on.  The callback gets the columns and the
+		list of language codes that the numbers refer to.
+		"""
+		count = data[:data.index('\n')].count('\t') + 1
+		fields = data.replace('\n', '\t').split('\t')
+		fields.pop()
+		columns = []
+		for i in xrange(count):
+			if i % 2 == 0:
+				columns.append(array.array('i', self.exportLangColumn(fields[i::count])))
+			else:
+				columns.append(array.array('l', map(int, fields[i::count])))
+		callback(columns, self.exportLangs)
+
+	def exportLangColumn(self, fields):
+		numbers = self.exportLangNumbers
+		try:
+			return map(numbers.__getitem__, fields)
+		except KeyError:
+			for field in set(fields):
+				if field not in numbers:
+					numbers[field] = len(self.exportLangs)
+					self.exportLangs.append(self.exportLang(field))
+			return map(numbers.__getitem__, fields)
+
+	def exportLang(self, field):
+		"""Converts an exported language column to its code."""
+		return field
+
+	def beginComponents(self):
+		"""Switches saveComponent to bulk labeling: the components and
+		the (page, component) labels are copied to temporary tables and
+		applied by finishComponents with one join per table.
+		"""
+		self.cursor.execute('CREATE TEMPORARY TABLE network_comp_load (key %s, page_id %s, coherent boolean, size integer)' % (self.COMP_TYPE, self.KEY_TYPE))
+		self.cursor.execute('CREATE TEMPORARY TABLE network_comp_label_load (page_id %s, comp_id %s)' % (self.KEY_TYPE, self.COMP_TYPE))
+		self.labelStats = {'components': 0, 'pages': 0, 'reported': 0, 'started': time.time()}
+
+	def finishComponents(self):
+		for table, _ in self.LABEL_TABLES:
+			self.flushTable(table)
+		self.reportLabels()
+		statements = (
+			('network_comp', 'INSERT INTO network_comp (key, namespace, coherent, size) '
+				+ ' SELECT c.key, p.namespace, c.coherent, c.size FROM network_comp_load AS c JOIN network_page AS p ON (p.key = c.page_id)'),
+			('network_page', 'UPDATE network_page SET comp_id = l.comp_id FROM network_comp_label_load AS l WHERE network_page.key = l.page_id'),
+			('network_langlink', 'UPDATE network_langlink SET comp_id = l.comp_id FROM network_comp_label_load AS l WHERE network_langlink.src_id = l.page_id'),
+		)
+		self.cursor.execute('ANALYZE network_comp_load')
+		self.cursor.execute('ANALYZE network_comp_label_load')
+		for table, statement in statements:
+			startTime = time.time()
+			self.cursor.execute(statement)
+			self.log.info('Labeled %d rows of %s in %.1f s' % (self.cursor.rowcount, table, time.time() - startTime))
+		for table, _ in self.LABEL_TABLES:
+			self.cursor.execute('DROP TABLE ' + table)
+		self.commit()
+		self.labelStats = None
+
+	def reportLabels(self):
+		stats = self.labelStats
+		seconds = time.time() - stats['started']
+		self.log.info('Saved %d components with %d pages (%.0f pages/s)' % (stats['components'], stats['pages'], stats['pages'] / seconds if seconds > 0 else 0.0))
+		stats['reported'] = stats['pages']
+
 	def saveComponent(self, compKey, pageKeys, coherent, size):
+		if self.labelStats is not None:
+			self.bufferRow('network_comp_load', (compKey, pageKeys[0], coherent, size))
+			for pageKey in pageKeys:
+				self.bufferRow('network_comp_label_load', (pageKey, compKey))
+			self.labelStats['components'] += 1
+			self.labelStats['pages'] += len(pageKeys)
+			if self.labelStats['pages'] - self.labelStats['reported'] >= self.LABEL_REPORT:
+				self.reportLabels()
+			return
 		namespace = int(self.getPage(pageKeys[0])['namespace'])
 		self.cursor.execute('INSERT INTO network_comp (key, namespace, coherent, size) VALUES (%s, %s, %s, %s)', (compKey, namespace, coherent, size))
 		self.log.debug('Component: %s (size: %d, coherent: %s)' % (compKey, size, str(coherent)))
@@ -240,10 +967,16 @@ class PostgresqlRepository:
 
 
 	def insertPagelink(self, fromKey, toKey):
+		if self.bulk:
+			self.bufferRow('network_pagelink', (fromKey, toKey))
+			return
 		self.cursor.execute('INSERT INTO network_pagelink (src_id, dst_id) VALUES (%s, %s)', (fromKey, toKey))
 		self.checkAutoCommit()
 
 	def insertCategorylink(self, fromKey, toKey):
+		if self.bulk:
+			self.bufferRow('network_categorylink', (fromKey, toKey))
+			return
 		self.cursor.execute('INSERT INTO network_categorylink (page_id, category_id) VALUES (%s, %s)', (fromKey, toKey))
 		self.checkAutoCommit()
 
@@ -265,22 +998,16 @@ class PostgresqlRepository:
 		return keys
 	
 	def getComponentPages(self, compKey):
-		cur = self.conn.cursor()
-		cur.execute('SELECT key, lang, namespace, title, redirect_id FROM network_page WHERE comp_id = %s', (compKey,))
-		rows = cur.fetchall()
-		cur.close()
+		rows = self.queryPrepared('network_component_pages', (compKey,))
 		pages = {}
 		if not rows:
 			return pages
 		for row in rows:
-			pages[row[0]] = {'key': row[0], 'lang': row[1], 'namespace': row[2], 'title': row[3], 'redirect': row[4], 'comp': compKey}
+			pages[row[0]] = {'key': row[0], 'lang': self.pyLang(row[1]), 'namespace': row[2], 'title': row[3], 'redirect': row[4], 'comp': compKey}
 		return pages
 
 	def getComponentLanglinks(self, compKey):
-		cur = self.conn.cursor()
-		cur.execute('SELECT src_id, dst_id FROM network_langlink WHERE comp_id = %s', (compKey,))
-		rows = cur.fetchall()
-		cur.close()
+		rows = self.queryPrepared('network_component_langlinks', (compKey,))
 		links = []
 		if not rows:
 			return links
@@ -297,10 +1024,7 @@ class PostgresqlRepository:
 		self.checkAutoCommit()
 	
 	def getComponentPagePositions(self, compKey):
-		cur = self.conn.cursor()
-		cur.execute('SELECT page_id, x, y, z FROM network_pageposition WHERE comp_id = %s', (compKey,))
-		rows = cur.fetchall()
-		cur.close()
+		rows = self.queryPrepared('network_component_positions', (compKey,))
 		pages = {}
 		if not rows:
 			return pages
@@ -318,10 +1042,7 @@ class PostgresqlRepository:
 			self.checkAutoCommit()
 
 	def getComponentPageMeanings(self, compKey, auth):
-		cur = self.conn.cursor()
-		cur.execute('SELECT page_id, meaning FROM network_pagemeaning WHERE comp_id = %s AND auth = %s', (compKey, auth))
-		rows = cur.fetchall()
-		cur.close()
+		rows = self.queryPrepared('network_component_meanings', (compKey, auth))
 		pages = {}
 		if not rows:
 			return pages
@@ -332,8 +1053,8 @@ class PostgresqlRepository:
 	def countCommonCategories(self, aKey, bKey):
 		cur = self.conn.cursor()
 		cur.execute('SELECT COUNT(*) FROM '
-			+ ' ((SELECT dst_id FROM network_langlink WHERE src_id IN (SELECT category_id FROM network_categorylink WHERE page_id = %s))'
-			+ ' INTERSECT (SELECT category_id FROM network_categorylink WHERE page_id = %s)) AS foo',
+			+ ' (SELECT dst_id FROM network_langlink WHERE src_id IN (SELECT category_id FROM network_categorylink WHERE page_id = %s)'
+			+ ' INTERSECT SELECT category_id FROM network_categorylink WHERE page_id = %s) AS foo',
 			(aKey, bKey))
 		row = cur.fetchone()
 		cur.close()
@@ -343,10 +1064,111 @@ class PostgresqlRepository:
 	def countCommonLinks(self, aKey, bKey):
 		cur = self.conn.cursor()
 		cur.execute('SELECT COUNT(*) FROM '
-			+ ' ((SELECT dst_id FROM network_langlink WHERE src_id IN (SELECT dst_id FROM network_pagelink WHERE src_id = %s))'
-			+ ' INTERSECT (SELECT dst_id FROM network_pagelink WHERE src_id = %s)) AS foo',
+			+ ' (SELECT dst_id FROM network_langlink WHERE src_id IN (SELECT dst_id FROM network_pagelink WHERE src_id = %s)'
+			+ ' INTERSECT SELECT dst_id FROM network_pagelink WHERE src_id = %s) AS foo',
 			(aKey, bKey))
 		row = cur.fetchone()
 		cur.close()
 		# self.log.debug('Found %s common links between %s and %s' % (row[0], aKey, bKey))
 		return int(row[0])
+
+class IntKeyPostgresqlRepository(PostgresqlRepository):
+	"""A repository for the schema in schema-intkeys.sql.  Pages are
+	identified there by 64-bit integers (the language's id in the high
+	32 bits, the page id in the low ones), languages by small integers
+	listed in network_lang, and components and meanings by UUIDs.
+	The integer keys are passed through the importer, the component
+	finders and the analysis as they are; the 'lang:id' form is made
+	only for the output, see formatKey.  Component and meaning keys are
+	therefore derived from the integer keys, and differ from those of a
+	repository with 'lang:id' keys.
+	"""
+
+	KEY_TYPE = 'bigint'
+	LANG_TYPE = 'smallint'
+	COMP_TYPE = 'uuid'
+	NETWORK_TABLES = ('network_lang',) + PostgresqlRepository.NETWORK_TABLES
+
+	EXPORT_PAGES = 'SELECT key >> 32, key & 4294967295 FROM network_page'
+	EXPORT_REDIRECTS = 'SELECT key >> 32, key & 4294967295, redirect_id >> 32, redirect_id & 4294967295 FROM network_page WHERE redirect_id IS NOT NULL'
+	EXPORT_LANGLINKS = 'SELECT src_id >> 32, src_id & 4294967295, dst_id >> 32, dst_id & 4294967295 FROM network_langlink'
+
+	def __init__(self, *args, **kwargs):
+		PostgresqlRepository.__init__(self, *args, **kwargs)
+		self.langIds = {}
+		self.langCodes = {}
+		self.langMisses = set()
+
+	def connect(self):
+		PostgresqlRepository.connect(self)
+		self.loadLangs()
+
+	def commit(self):
+		PostgresqlRepository.commit(self)
+		self.langMisses = set()
+
+	def loadLangs(self):
+		cur = self.conn.cursor()
+		cur.execute('SELECT id, code FROM network_lang')
+		for id, code in cur.fetchall():
+			self.langIds[code] = id
+			self.langCodes[id] = code
+		cur.close()
+
+	def registerLang(self, lang):
+		"""Registers a language on a connection of its own, so that the
+		transaction in progress is not committed with it.  The new row
+		is visible to the next statements of that transaction.
+		"""
+		conn = self.openConnection()
+		try:
+			cur = conn.cursor()
+			cur.execute('INSERT INTO network_lang (code) VALUES (%s) ON CONFLICT (code) DO NOTHING', (lang,))
+			cur.close()
+			conn.commit()
+		finally:
+			conn.close()
+
+	def dbLang(self, lang, create = False):
+		"""Returns the id of the given language, or None if it is not
+		known.  Languages are registered on request, and the mapping is
+		reloaded on a miss, since other processes may register languages
+		concurrently.
+		"""
+		if lang in self.langIds:
+			return self.langIds[lang]
+		if lang in self.langMisses and not create:
+			return None
+		if create:
+			self.registerLang(lang)
+		self.loadLangs()
+		if lang not in self.langIds:
+			self.langMisses.add(lang)
+			return None
+		return self.langIds[lang]
+
+	def pyLang(self, value):
+		if value is None:
+			return None
+		if value not in self.langCodes:
+			self.loadLangs()
+		return self.langCodes[value]
+
+	def makeKey(self, lang, id):
+		langId = self.langIds.get(lang)
+		if langId is None:
+			langId = self.dbLang(lang)
+			if langId is None:
+				return None
+		return (langId << 32) | int(id)
+
+	def splitKey(self, key):
+		return self.pyLang(key >> 32), key & 0xffffffff
+
+	def formatKey(self, key):
+		if key is None:
+			return None
+		return self.pyLang(key >> 32) + ':' + str(key & 0xffffffff)
+
+	def exportLang(self, field):
+		return self.pyLang(int(field))